@@ -0,0 +1,29 @@
+"""Make DocumentChunk IDs AUTOINCREMENT
+
+Revision ID: a3f1d8c6b270
+Revises: e7b2c5a9d013
+Create Date: 2026-10-18 23:52:40.318205
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a3f1d8c6b270'
+down_revision: Union[str, None] = 'e7b2c5a9d013'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # SQLite can only add AUTOINCREMENT by recreating the table; other databases never reuse IDs.
+    with op.batch_alter_table('document_chunks', recreate='always', table_kwargs={'sqlite_autoincrement': True}) as batch_op:
+        pass
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('document_chunks', recreate='always', table_kwargs={'sqlite_autoincrement': False}) as batch_op:
+        pass
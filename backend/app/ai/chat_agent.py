@@ -1,6 +1,7 @@
 import logging
-from typing import List
+from typing import AsyncIterator, List, Optional
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 from backend.app.rag.pipeline import RAGPipeline
 from backend.app.models.chat import ChatSession, ChatMessage
 from backend.app.ai.llm_service import LLMService
@@ -27,30 +28,11 @@ class ChatAgent:
     def get_history(self, session_id: int) -> List[ChatMessage]:
         return self.db.query(ChatMessage).filter(ChatMessage.session_id == session_id).order_by(ChatMessage.created_at).all()
 
-    def send_message(self, session_id: int, message: str) -> str:
-        # Save user message
-        user_msg = ChatMessage(session_id=session_id, role="user", content=message)
-        self.db.add(user_msg)
+    def _save_message(self, session_id: int, role: str, content: str) -> None:
+        self.db.add(ChatMessage(session_id=session_id, role=role, content=content))
         self.db.commit()
 
-        # Retrieve RAG context
-        query_embedding = self.rag.embedding_service.generate_embedding(message)
-        results = self.rag.vector_store.search(query_embedding, top_k=self.rag.vector_store.dimension) # using default k from settings inside RAG usually, but let's just search
-        # Wait, pipeline already has `answer_question`, but we want to customize the prompt to include chat history.
-        
-        # Manually perform RAG steps
-        from backend.app.core.config import get_settings
-        settings = get_settings()
-        
-        results = self.rag.vector_store.search(query_embedding, top_k=settings.TOP_K_RETRIEVAL)
-        context_texts = []
-        if results:
-            from backend.app.models.document import DocumentChunk
-            for chunk_id, score in results:
-                db_chunk = self.db.query(DocumentChunk).filter(DocumentChunk.id == chunk_id).first()
-                if db_chunk:
-                    context_texts.append(db_chunk.text)
-                    
+    def _build_prompt(self, session_id: int, message: str, context_texts: List[str]) -> str:
         context_str = "\n\n---\n\n".join(context_texts) if context_texts else "No relevant context found."
 
         # Fetch history (last 5 messages to avoid token overflow)
@@ -61,7 +43,7 @@ class ChatAgent:
             role_label = "Student" if h.role == "user" else "Tutor"
             history_str += f"{role_label}: {h.content}\n"
 
-        prompt = (
+        return (
             f"You are AI Study Pal, an intelligent and encouraging tutor.\n"
             f"Use the following conversation history and retrieved context to answer the student's question.\n\n"
             f"[Context from Course Materials]\n{context_str}\n\n"
@@ -70,12 +52,72 @@ class ChatAgent:
             f"Tutor:"
         )
 
+    def _prepare_prompt(self, session_id: int, message: str, document_id: Optional[int], subject: Optional[str]) -> str:
+        """Save the user message, retrieve context and build the prompt: the blocking part of a turn."""
+        self._save_message(session_id, "user", message)
+        context_texts = self.rag.retrieve_context(message, document_id=document_id, subject=subject)
+        return self._build_prompt(session_id, message, context_texts)
+
+    def session_exists(self, session_id: int) -> bool:
+        return self.db.query(ChatSession.id).filter(ChatSession.id == session_id).first() is not None
+
+    def send_message(
+        self,
+        session_id: int,
+        message: str,
+        document_id: Optional[int] = None,
+        subject: Optional[str] = None
+    ) -> str:
+        """
+        Answer a student message using the session history and retrieved course material.
+        Retrieval can be restricted to one document and/or one subject.
+        """
+        # Save user message, retrieve RAG context
+        prompt = self._prepare_prompt(session_id, message, document_id, subject)
+
         logger.info(f"Generating answer for session {session_id}")
         answer = self.llm.generate(prompt)
 
         # Save AI response
-        ai_msg = ChatMessage(session_id=session_id, role="assistant", content=answer)
-        self.db.add(ai_msg)
-        self.db.commit()
+        self._save_message(session_id, "assistant", answer)
+        return answer
 
+    async def send_message_async(
+        self,
+        session_id: int,
+        message: str,
+        document_id: Optional[int] = None,
+        subject: Optional[str] = None
+    ) -> str:
+        """
+        Same as `send_message` for async routes: database work and retrieval run in the threadpool
+        and the LLM call is awaited.
+        """
+        prompt = await run_in_threadpool(self._prepare_prompt, session_id, message, document_id, subject)
+
+        logger.info(f"Generating answer for session {session_id}")
+        answer = await self.llm.generate_async(prompt)
+
+        await run_in_threadpool(self._save_message, session_id, "assistant", answer)
         return answer
+
+    async def stream_message_async(
+        self,
+        session_id: int,
+        message: str,
+        document_id: Optional[int] = None,
+        subject: Optional[str] = None
+    ) -> AsyncIterator[str]:
+        """
+        Streaming variant of `send_message_async`: yields the answer token by token and saves the
+        assistant message once the stream has completed.
+        """
+        prompt = await run_in_threadpool(self._prepare_prompt, session_id, message, document_id, subject)
+
+        logger.info(f"Streaming answer for session {session_id}")
+        parts = []
+        async for token in self.llm.stream_async(prompt):
+            parts.append(token)
+            yield token
+
+        await run_in_threadpool(self._save_message, session_id, "assistant", "".join(parts).strip())
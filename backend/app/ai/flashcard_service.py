@@ -1,9 +1,11 @@
 import logging
 import json
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, selectinload
+from starlette.concurrency import run_in_threadpool
 from backend.app.models.flashcard import FlashcardDeck, Flashcard
 from backend.app.models.document import Document
 from backend.app.ai.llm_service import LLMService
+from backend.app.core.singleflight import generation_flights
 
 logger = logging.getLogger("ai_study_pal")
 
@@ -15,10 +17,7 @@ class FlashcardService:
         self.db = db
         self.llm = LLMService()
 
-    def generate_flashcards(self, document_id: int, num_cards: int = 10) -> FlashcardDeck:
-        """
-        Generate flashcards for a specific document.
-        """
+    def _build_prompt(self, document_id: int, num_cards: int):
         doc = self.db.query(Document).filter(Document.id == document_id).first()
         if not doc:
             raise ValueError(f"Document {document_id} not found.")
@@ -34,11 +33,44 @@ class FlashcardService:
             f"'back' (the definition or answer).\n"
             f"Do not include any markdown formatting, just the raw JSON array."
         )
+        return doc, prompt
 
+    def generate_flashcards(self, document_id: int, num_cards: int = 10) -> FlashcardDeck:
+        """
+        Generate flashcards for a specific document.
+        """
+        # Identical concurrent requests share one generation; each caller loads the result in its own session
+        deck_id = generation_flights.do(
+            ("flashcards", document_id, num_cards),
+            lambda: self._generate_flashcards(document_id, num_cards).id
+        )
+        return self.get_deck(deck_id)
+
+    async def generate_flashcards_async(self, document_id: int, num_cards: int = 10) -> FlashcardDeck:
+        """
+        Same as `generate_flashcards`, awaiting the LLM instead of blocking on it.
+        Database work runs in the threadpool so it never stalls the event loop.
+        """
+        async def run():
+            return (await self._generate_flashcards_async(document_id, num_cards)).id
+
+        deck_id = await generation_flights.do_async(("flashcards", document_id, num_cards), run)
+        return await run_in_threadpool(self.get_deck, deck_id)
+
+    def _generate_flashcards(self, document_id: int, num_cards: int = 10) -> FlashcardDeck:
+        doc, prompt = self._build_prompt(document_id, num_cards)
+        logger.info(f"Generating flashcards for Document {document_id}")
+        response_text = self.llm.generate(prompt, max_new_tokens=800, temperature=0.3)
+        return self._save_deck(doc, response_text)
+
+    async def _generate_flashcards_async(self, document_id: int, num_cards: int = 10) -> FlashcardDeck:
+        doc, prompt = await run_in_threadpool(self._build_prompt, document_id, num_cards)
+        logger.info(f"Generating flashcards for Document {document_id}")
+        response_text = await self.llm.generate_async(prompt, max_new_tokens=800, temperature=0.3)
+        return await run_in_threadpool(self._save_deck, doc, response_text)
+
+    def _save_deck(self, doc: Document, response_text: str) -> FlashcardDeck:
         try:
-            logger.info(f"Generating flashcards for Document {document_id}")
-            response_text = self.llm.generate(prompt, max_new_tokens=800, temperature=0.3)
-            
             # Simple cleanup of possible markdown block ticks
             if response_text.startswith("```json"):
                 response_text = response_text[7:]
@@ -49,7 +81,7 @@ class FlashcardService:
             
             # Create Deck
             deck = FlashcardDeck(
-                document_id=document_id,
+                document_id=doc.id,
                 title=f"Flashcards: {doc.title}"
             )
             self.db.add(deck)
@@ -77,4 +109,5 @@ class FlashcardService:
             raise ValueError("An error occurred while generating flashcards.")
 
     def get_deck(self, deck_id: int) -> FlashcardDeck:
-        return self.db.query(FlashcardDeck).filter(FlashcardDeck.id == deck_id).first()
+        # Cards are loaded up front so serializing the deck runs no further queries
+        return self.db.query(FlashcardDeck).options(selectinload(FlashcardDeck.cards)).filter(FlashcardDeck.id == deck_id).first()
@@ -1,25 +1,26 @@
 import logging
 import json
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 from backend.app.models.insight import LearningInsight
 from backend.app.models.quiz import Quiz, Question
 from backend.app.models.study_plan import StudyPlan, StudyMilestone
 from backend.app.ai.llm_service import LLMService
+from backend.app.core.scheduler import BATCH
+from backend.app.core.singleflight import generation_flights
 
 logger = logging.getLogger("ai_study_pal")
 
 class InsightService:
     """
     Analyzes learning data to generate insights and recommendations.
+    Runs as batch work in the LLM scheduler, behind interactive chat and Q&A.
     """
     def __init__(self, db: Session):
         self.db = db
         self.llm = LLMService()
 
-    def generate_insights(self) -> LearningInsight:
-        """
-        Gathers data and asks LLM to analyze user's strong/weak concepts and recommendations.
-        """
+    def _build_prompt(self) -> str:
         # Gather data
         quizzes = self.db.query(Quiz).all()
         plans = self.db.query(StudyPlan).all()
@@ -43,11 +44,44 @@ class InsightService:
             f"'strong_concepts' (string), 'weak_concepts' (string), and 'recommendations' (string).\n"
             f"Do not include any markdown formatting, just the raw JSON."
         )
+        return prompt
 
+    def generate_insights(self) -> LearningInsight:
+        """
+        Gathers data and asks LLM to analyze user's strong/weak concepts and recommendations.
+        """
+        # Identical concurrent requests share one generation; each caller loads the result in its own session
+        insight_id = generation_flights.do(
+            ("insights",),
+            lambda: self._generate_insights().id
+        )
+        return self.db.get(LearningInsight, insight_id)
+
+    async def generate_insights_async(self) -> LearningInsight:
+        """
+        Same as `generate_insights`, awaiting the LLM instead of blocking on it.
+        Database work runs in the threadpool so it never stalls the event loop.
+        """
+        async def run():
+            return (await self._generate_insights_async()).id
+
+        insight_id = await generation_flights.do_async(("insights",), run)
+        return await run_in_threadpool(self.db.get, LearningInsight, insight_id)
+
+    def _generate_insights(self) -> LearningInsight:
+        prompt = self._build_prompt()
+        logger.info("Generating learning insights.")
+        response_text = self.llm.generate(prompt, max_new_tokens=400, temperature=0.5, priority=BATCH)
+        return self._save_insight(response_text)
+
+    async def _generate_insights_async(self) -> LearningInsight:
+        prompt = await run_in_threadpool(self._build_prompt)
+        logger.info("Generating learning insights.")
+        response_text = await self.llm.generate_async(prompt, max_new_tokens=400, temperature=0.5, priority=BATCH)
+        return await run_in_threadpool(self._save_insight, response_text)
+
+    def _save_insight(self, response_text: str) -> LearningInsight:
         try:
-            logger.info("Generating learning insights.")
-            response_text = self.llm.generate(prompt, max_new_tokens=400, temperature=0.5)
-            
             if response_text.startswith("```json"):
                 response_text = response_text[7:]
             if response_text.endswith("```"):
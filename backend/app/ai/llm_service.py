@@ -1,19 +1,41 @@
+import hashlib
+import json
 import logging
-import requests
+from typing import Any, AsyncIterator, Optional
+from backend.app.core.cache import LRUCache
 from backend.app.core.config import get_settings
+from backend.app.core.http import async_http_timeout, get_async_http_client, get_http_session, http_timeout
+from backend.app.core.scheduler import INTERACTIVE, llm_scheduler
+from backend.app.core.singleflight import SingleFlight
 
 settings = get_settings()
 logger = logging.getLogger("ai_study_pal")
 
+OFFLINE_ANSWER = "I apologize, but I am currently offline or unable to reach my language model."
+SUMMARY_UNAVAILABLE = "Summarization unavailable at the moment."
+
+# Completed generations keyed by (model, sha256(prompt), max_new_tokens, temperature)
+response_cache = LRUCache(max_size=settings.LLM_CACHE_MAX_SIZE, ttl_seconds=settings.LLM_CACHE_TTL_SECONDS)
+# Identical generations in flight at the same time share one upstream request
+llm_flights = SingleFlight()
+
 class LLMService:
     """
     Service layer for Language Model generation.
-    Connects to the Hugging Face text-generation API.
+    Connects to the Hugging Face text-generation API over the shared keep-alive session.
+    The `*_async` variants use the shared httpx.AsyncClient, so async routes can hold many
+    generations in flight without tying up a worker thread each; `stream_async` yields tokens as
+    the text-generation server produces them.
+    Responses are cached by (model, prompt hash, max_new_tokens, temperature) unless the temperature is
+    above LLM_CACHE_MAX_TEMPERATURE or the caller passes use_cache=False. Fallback messages are never cached.
+    Identical calls that are in flight at the same time are coalesced into one request.
+    Upstream requests take a slot from the global llm_scheduler under the caller's priority class
+    (interactive or batch); SchedulerBusyError is raised when the queue is full.
     """
 
     @classmethod
     def _get_api_url(cls, model: str) -> str:
-        return f"https://api-inference.huggingface.co/models/{model}"
+        return f"{settings.HF_API_BASE_URL.rstrip('/')}/models/{model}"
 
     @classmethod
     def _get_headers(cls) -> dict:
@@ -22,54 +44,227 @@ class LLMService:
         return {"Authorization": f"Bearer {settings.HF_API_KEY}"}
 
     @classmethod
-    def generate(cls, prompt: str, max_new_tokens: int = 150, temperature: float = 0.7) -> str:
+    def _generation_payload(cls, prompt: str, max_new_tokens: int, temperature: float) -> dict:
+        return {
+            "inputs": prompt,
+            "parameters": {
+                "max_new_tokens": max_new_tokens,
+                "temperature": temperature,
+                "return_full_text": False
+            },
+            "options": {"wait_for_model": True}
+        }
+
+    @classmethod
+    def _parse_generation(cls, result: Any) -> Optional[str]:
+        if isinstance(result, list) and len(result) > 0 and "generated_text" in result[0]:
+            return result[0]["generated_text"].strip()
+        return None
+
+    @classmethod
+    def _summarization_payload(cls, text: str) -> dict:
+        return {
+            "inputs": text,
+            "options": {"wait_for_model": True}
+        }
+
+    @classmethod
+    def _parse_summary(cls, result: Any) -> Optional[str]:
+        if isinstance(result, list) and len(result) > 0 and "summary_text" in result[0]:
+            return result[0]["summary_text"].strip()
+        return None
+
+    @classmethod
+    def _cache_key(cls, model: str, prompt: str, max_new_tokens: Optional[int], temperature: float, use_cache: bool) -> Optional[tuple]:
+        if not (use_cache and settings.LLM_CACHE_ENABLED) or temperature > settings.LLM_CACHE_MAX_TEMPERATURE:
+            return None
+        return cls._flight_key(model, prompt, max_new_tokens, temperature)
+
+    @classmethod
+    def _cached(cls, key: Optional[tuple]) -> Optional[str]:
+        return response_cache.get(key) if key is not None else None
+
+    @classmethod
+    def _finish(cls, key: Optional[tuple], text: Optional[str], result: Any) -> str:
+        """Cache a successfully parsed response; unexpected payloads are returned verbatim and not cached."""
+        if text is None:
+            return str(result)
+        if key is not None:
+            response_cache.set(key, text)
+        return text
+
+    @classmethod
+    def _flight_key(cls, model: str, prompt: str, max_new_tokens: Optional[int], temperature: float) -> tuple:
+        return (model, hashlib.sha256(prompt.encode("utf-8")).hexdigest(), max_new_tokens, temperature)
+
+    @classmethod
+    def generate(cls, prompt: str, max_new_tokens: int = 150, temperature: float = 0.7, use_cache: bool = True, priority: str = INTERACTIVE) -> str:
         """
         Generate text using the configured LLM model via HF API.
+        Concurrent identical calls share one upstream request unless use_cache=False.
         """
-        try:
-            response = requests.post(
-                cls._get_api_url(settings.LLM_MODEL),
-                headers=cls._get_headers(),
-                json={
-                    "inputs": prompt,
-                    "parameters": {
-                        "max_new_tokens": max_new_tokens,
-                        "temperature": temperature,
-                        "return_full_text": False
-                    },
-                    "options": {"wait_for_model": True}
-                },
-                timeout=30
-            )
-            response.raise_for_status()
-            result = response.json()
-            if isinstance(result, list) and len(result) > 0 and "generated_text" in result[0]:
-                return result[0]["generated_text"].strip()
-            return str(result)
-        except Exception as e:
-            logger.error(f"LLM Generation Error: {e}")
-            return "I apologize, but I am currently offline or unable to reach my language model."
+        key = cls._cache_key(settings.LLM_MODEL, prompt, max_new_tokens, temperature, use_cache)
+        cached = cls._cached(key)
+        if cached is not None:
+            return cached
+        call = lambda: cls._request_generation(prompt, max_new_tokens, temperature, key, priority)
+        if not use_cache:
+            return call()
+        return llm_flights.do(cls._flight_key(settings.LLM_MODEL, prompt, max_new_tokens, temperature), call)
 
     @classmethod
-    def summarize(cls, text: str) -> str:
+    def _request_generation(cls, prompt: str, max_new_tokens: int, temperature: float, key: Optional[tuple], priority: str) -> str:
+        with llm_scheduler.slot(priority):
+            try:
+                response = get_http_session().post(
+                    cls._get_api_url(settings.LLM_MODEL),
+                    headers=cls._get_headers(),
+                    json=cls._generation_payload(prompt, max_new_tokens, temperature),
+                    timeout=http_timeout(settings.LLM_TIMEOUT_SECONDS)
+                )
+                response.raise_for_status()
+                result = response.json()
+                return cls._finish(key, cls._parse_generation(result), result)
+            except Exception as e:
+                logger.error(f"LLM Generation Error: {e}")
+                return OFFLINE_ANSWER
+
+    @classmethod
+    async def generate_async(cls, prompt: str, max_new_tokens: int = 150, temperature: float = 0.7, use_cache: bool = True, priority: str = INTERACTIVE) -> str:
+        """
+        Non-blocking variant of `generate`.
+        """
+        key = cls._cache_key(settings.LLM_MODEL, prompt, max_new_tokens, temperature, use_cache)
+        cached = cls._cached(key)
+        if cached is not None:
+            return cached
+        call = lambda: cls._request_generation_async(prompt, max_new_tokens, temperature, key, priority)
+        if not use_cache:
+            return await call()
+        return await llm_flights.do_async(cls._flight_key(settings.LLM_MODEL, prompt, max_new_tokens, temperature), call)
+
+    @classmethod
+    async def _request_generation_async(cls, prompt: str, max_new_tokens: int, temperature: float, key: Optional[tuple], priority: str) -> str:
+        async with llm_scheduler.slot_async(priority):
+            try:
+                response = await get_async_http_client().post(
+                    cls._get_api_url(settings.LLM_MODEL),
+                    headers=cls._get_headers(),
+                    json=cls._generation_payload(prompt, max_new_tokens, temperature),
+                    timeout=async_http_timeout(settings.LLM_TIMEOUT_SECONDS)
+                )
+                response.raise_for_status()
+                result = response.json()
+                return cls._finish(key, cls._parse_generation(result), result)
+            except Exception as e:
+                logger.error(f"LLM Generation Error: {e}")
+                return OFFLINE_ANSWER
+
+    @classmethod
+    async def stream_async(cls, prompt: str, max_new_tokens: int = 150, temperature: float = 0.7, use_cache: bool = True, priority: str = INTERACTIVE) -> AsyncIterator[str]:
+        """
+        Stream the generation token by token (TGI-style server-sent events with `"stream": true`).
+        If the model cannot be reached before the first token, the offline answer is yielded instead.
+        A cached response is yielded as a single chunk; a completed stream is added to the cache.
+        """
+        key = cls._cache_key(settings.LLM_MODEL, prompt, max_new_tokens, temperature, use_cache)
+        cached = cls._cached(key)
+        if cached is not None:
+            yield cached
+            return
+        parts = []
+        payload = cls._generation_payload(prompt, max_new_tokens, temperature)
+        payload["stream"] = True
+        async with llm_scheduler.slot_async(priority):
+            try:
+                async with get_async_http_client().stream(
+                    "POST",
+                    cls._get_api_url(settings.LLM_MODEL),
+                    headers=cls._get_headers(),
+                    json=payload,
+                    timeout=async_http_timeout(settings.LLM_TIMEOUT_SECONDS)
+                ) as response:
+                    response.raise_for_status()
+                    async for line in response.aiter_lines():
+                        if not line.startswith("data:"):
+                            continue
+                        data = line[len("data:"):].strip()
+                        if not data or data == "[DONE]":
+                            continue
+                        event = json.loads(data)
+                        if "error" in event:
+                            raise RuntimeError(event["error"])
+                        token = event.get("token") or {}
+                        if token.get("special") or not token.get("text"):
+                            continue
+                        parts.append(token["text"])
+                        yield token["text"]
+            except Exception as e:
+                logger.error(f"LLM Streaming Error: {e}")
+                if not parts:
+                    yield OFFLINE_ANSWER
+                return
+        if key is not None and parts:
+            response_cache.set(key, "".join(parts).strip())
+
+    @classmethod
+    def summarize(cls, text: str, use_cache: bool = True, priority: str = INTERACTIVE) -> str:
         """
         Summarize text using a dedicated summarization model.
         """
-        try:
-            response = requests.post(
-                cls._get_api_url(settings.SUMMARIZATION_MODEL),
-                headers=cls._get_headers(),
-                json={
-                    "inputs": text,
-                    "options": {"wait_for_model": True}
-                },
-                timeout=30
-            )
-            response.raise_for_status()
-            result = response.json()
-            if isinstance(result, list) and len(result) > 0 and "summary_text" in result[0]:
-                return result[0]["summary_text"].strip()
-            return str(result)
-        except Exception as e:
-            logger.error(f"Summarization Error: {e}")
-            return "Summarization unavailable at the moment."
+        key = cls._cache_key(settings.SUMMARIZATION_MODEL, text, None, 0.0, use_cache)
+        cached = cls._cached(key)
+        if cached is not None:
+            return cached
+        call = lambda: cls._request_summary(text, key, priority)
+        if not use_cache:
+            return call()
+        return llm_flights.do(cls._flight_key(settings.SUMMARIZATION_MODEL, text, None, 0.0), call)
+
+    @classmethod
+    def _request_summary(cls, text: str, key: Optional[tuple], priority: str) -> str:
+        with llm_scheduler.slot(priority):
+            try:
+                response = get_http_session().post(
+                    cls._get_api_url(settings.SUMMARIZATION_MODEL),
+                    headers=cls._get_headers(),
+                    json=cls._summarization_payload(text),
+                    timeout=http_timeout(settings.LLM_TIMEOUT_SECONDS)
+                )
+                response.raise_for_status()
+                result = response.json()
+                return cls._finish(key, cls._parse_summary(result), result)
+            except Exception as e:
+                logger.error(f"Summarization Error: {e}")
+                return SUMMARY_UNAVAILABLE
+
+    @classmethod
+    async def summarize_async(cls, text: str, use_cache: bool = True, priority: str = INTERACTIVE) -> str:
+        """
+        Non-blocking variant of `summarize`.
+        """
+        key = cls._cache_key(settings.SUMMARIZATION_MODEL, text, None, 0.0, use_cache)
+        cached = cls._cached(key)
+        if cached is not None:
+            return cached
+        call = lambda: cls._request_summary_async(text, key, priority)
+        if not use_cache:
+            return await call()
+        return await llm_flights.do_async(cls._flight_key(settings.SUMMARIZATION_MODEL, text, None, 0.0), call)
+
+    @classmethod
+    async def _request_summary_async(cls, text: str, key: Optional[tuple], priority: str) -> str:
+        async with llm_scheduler.slot_async(priority):
+            try:
+                response = await get_async_http_client().post(
+                    cls._get_api_url(settings.SUMMARIZATION_MODEL),
+                    headers=cls._get_headers(),
+                    json=cls._summarization_payload(text),
+                    timeout=async_http_timeout(settings.LLM_TIMEOUT_SECONDS)
+                )
+                response.raise_for_status()
+                result = response.json()
+                return cls._finish(key, cls._parse_summary(result), result)
+            except Exception as e:
+                logger.error(f"Summarization Error: {e}")
+                return SUMMARY_UNAVAILABLE
@@ -1,9 +1,11 @@
 import logging
 import json
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, selectinload
+from starlette.concurrency import run_in_threadpool
 from backend.app.models.quiz import Quiz, Question
 from backend.app.models.document import Document
 from backend.app.ai.llm_service import LLMService
+from backend.app.core.singleflight import generation_flights
 
 logger = logging.getLogger("ai_study_pal")
 
@@ -15,10 +17,7 @@ class QuizService:
         self.db = db
         self.llm = LLMService()
 
-    def generate_quiz(self, document_id: int, num_questions: int = 5, difficulty: str = "Medium") -> Quiz:
-        """
-        Generate a quiz for a specific document.
-        """
+    def _build_prompt(self, document_id: int, num_questions: int, difficulty: str):
         doc = self.db.query(Document).filter(Document.id == document_id).first()
         if not doc:
             raise ValueError(f"Document {document_id} not found.")
@@ -35,11 +34,44 @@ class QuizService:
             f"and 'explanation' (why the answer is correct).\n"
             f"Do not include any markdown formatting, just the raw JSON array."
         )
+        return doc, prompt
 
+    def generate_quiz(self, document_id: int, num_questions: int = 5, difficulty: str = "Medium") -> Quiz:
+        """
+        Generate a quiz for a specific document.
+        """
+        # Identical concurrent requests share one generation; each caller loads the result in its own session
+        quiz_id = generation_flights.do(
+            ("quiz", document_id, num_questions, difficulty),
+            lambda: self._generate_quiz(document_id, num_questions, difficulty).id
+        )
+        return self.get_quiz(quiz_id)
+
+    async def generate_quiz_async(self, document_id: int, num_questions: int = 5, difficulty: str = "Medium") -> Quiz:
+        """
+        Same as `generate_quiz`, awaiting the LLM instead of blocking on it.
+        Database work runs in the threadpool so it never stalls the event loop.
+        """
+        async def run():
+            return (await self._generate_quiz_async(document_id, num_questions, difficulty)).id
+
+        quiz_id = await generation_flights.do_async(("quiz", document_id, num_questions, difficulty), run)
+        return await run_in_threadpool(self.get_quiz, quiz_id)
+
+    def _generate_quiz(self, document_id: int, num_questions: int = 5, difficulty: str = "Medium") -> Quiz:
+        doc, prompt = self._build_prompt(document_id, num_questions, difficulty)
+        logger.info(f"Generating quiz for Document {document_id}")
+        response_text = self.llm.generate(prompt, max_new_tokens=800, temperature=0.3)
+        return self._save_quiz(doc, difficulty, response_text)
+
+    async def _generate_quiz_async(self, document_id: int, num_questions: int = 5, difficulty: str = "Medium") -> Quiz:
+        doc, prompt = await run_in_threadpool(self._build_prompt, document_id, num_questions, difficulty)
+        logger.info(f"Generating quiz for Document {document_id}")
+        response_text = await self.llm.generate_async(prompt, max_new_tokens=800, temperature=0.3)
+        return await run_in_threadpool(self._save_quiz, doc, difficulty, response_text)
+
+    def _save_quiz(self, doc: Document, difficulty: str, response_text: str) -> Quiz:
         try:
-            logger.info(f"Generating quiz for Document {document_id}")
-            response_text = self.llm.generate(prompt, max_new_tokens=800, temperature=0.3)
-            
             # Simple cleanup of possible markdown block ticks
             if response_text.startswith("```json"):
                 response_text = response_text[7:]
@@ -50,7 +82,7 @@ class QuizService:
             
             # Create Quiz
             quiz = Quiz(
-                document_id=document_id,
+                document_id=doc.id,
                 title=f"Quiz: {doc.title}",
                 difficulty=difficulty
             )
@@ -82,4 +114,5 @@ class QuizService:
             raise ValueError("An error occurred while generating the quiz.")
 
     def get_quiz(self, quiz_id: int) -> Quiz:
-        return self.db.query(Quiz).filter(Quiz.id == quiz_id).first()
+        # Questions are loaded up front so serializing the quiz runs no further queries
+        return self.db.query(Quiz).options(selectinload(Quiz.questions)).filter(Quiz.id == quiz_id).first()
@@ -1,9 +1,11 @@
 import logging
 import json
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, selectinload
+from starlette.concurrency import run_in_threadpool
 from backend.app.models.study_plan import StudyPlan, StudyMilestone
 from backend.app.models.document import Document
 from backend.app.ai.llm_service import LLMService
+from backend.app.core.singleflight import generation_flights
 
 logger = logging.getLogger("ai_study_pal")
 
@@ -15,10 +17,7 @@ class StudyPlanService:
         self.db = db
         self.llm = LLMService()
 
-    def generate_study_plan(self, document_id: int, num_days: int = 7) -> StudyPlan:
-        """
-        Generate a study plan breaking down the document content into daily milestones.
-        """
+    def _build_prompt(self, document_id: int, num_days: int):
         doc = self.db.query(Document).filter(Document.id == document_id).first()
         if not doc:
             raise ValueError(f"Document {document_id} not found.")
@@ -35,11 +34,44 @@ class StudyPlanService:
             f"'description' (string, brief instructions on what to read or do).\n"
             f"Do not include any markdown formatting, just the raw JSON array."
         )
+        return doc, prompt
 
+    def generate_study_plan(self, document_id: int, num_days: int = 7) -> StudyPlan:
+        """
+        Generate a study plan breaking down the document content into daily milestones.
+        """
+        # Identical concurrent requests share one generation; each caller loads the result in its own session
+        plan_id = generation_flights.do(
+            ("study_plan", document_id, num_days),
+            lambda: self._generate_study_plan(document_id, num_days).id
+        )
+        return self.get_plan(plan_id)
+
+    async def generate_study_plan_async(self, document_id: int, num_days: int = 7) -> StudyPlan:
+        """
+        Same as `generate_study_plan`, awaiting the LLM instead of blocking on it.
+        Database work runs in the threadpool so it never stalls the event loop.
+        """
+        async def run():
+            return (await self._generate_study_plan_async(document_id, num_days)).id
+
+        plan_id = await generation_flights.do_async(("study_plan", document_id, num_days), run)
+        return await run_in_threadpool(self.get_plan, plan_id)
+
+    def _generate_study_plan(self, document_id: int, num_days: int = 7) -> StudyPlan:
+        doc, prompt = self._build_prompt(document_id, num_days)
+        logger.info(f"Generating {num_days}-day study plan for Document {document_id}")
+        response_text = self.llm.generate(prompt, max_new_tokens=800, temperature=0.4)
+        return self._save_plan(doc, num_days, response_text)
+
+    async def _generate_study_plan_async(self, document_id: int, num_days: int = 7) -> StudyPlan:
+        doc, prompt = await run_in_threadpool(self._build_prompt, document_id, num_days)
+        logger.info(f"Generating {num_days}-day study plan for Document {document_id}")
+        response_text = await self.llm.generate_async(prompt, max_new_tokens=800, temperature=0.4)
+        return await run_in_threadpool(self._save_plan, doc, num_days, response_text)
+
+    def _save_plan(self, doc: Document, num_days: int, response_text: str) -> StudyPlan:
         try:
-            logger.info(f"Generating {num_days}-day study plan for Document {document_id}")
-            response_text = self.llm.generate(prompt, max_new_tokens=800, temperature=0.4)
-            
             # Simple cleanup of possible markdown block ticks
             if response_text.startswith("```json"):
                 response_text = response_text[7:]
@@ -50,7 +82,7 @@ class StudyPlanService:
             
             # Create Plan
             plan = StudyPlan(
-                document_id=document_id,
+                document_id=doc.id,
                 title=f"{num_days}-Day Study Plan: {doc.title}"
             )
             self.db.add(plan)
@@ -79,4 +111,5 @@ class StudyPlanService:
             raise ValueError("An error occurred while generating the study plan.")
 
     def get_plan(self, plan_id: int) -> StudyPlan:
-        return self.db.query(StudyPlan).filter(StudyPlan.id == plan_id).first()
+        # Milestones are loaded up front so serializing the plan runs no further queries
+        return self.db.query(StudyPlan).options(selectinload(StudyPlan.milestones)).filter(StudyPlan.id == plan_id).first()
@@ -1,11 +1,14 @@
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 
-from backend.app.database.session import get_db
+from backend.app.core.scheduler import SchedulerBusyError
+from backend.app.database.session import SessionLocal, get_db
 from backend.app.ai.chat_agent import ChatAgent
-from backend.app.models.chat import ChatSession
+from backend.app.utils.sse import sse_token_stream
 
 router = APIRouter()
 
@@ -15,6 +18,8 @@ class SessionResponse(BaseModel):
 
 class ChatMessageRequest(BaseModel):
     message: str
+    document_id: Optional[int] = None
+    subject: Optional[str] = None
 
 class ChatMessageResponse(BaseModel):
     role: str
@@ -33,18 +38,54 @@ def get_history(session_id: int, db: Session = Depends(get_db)):
     return [{"role": h.role, "content": h.content} for h in history]
 
 @router.post("/sessions/{session_id}/message", response_model=ChatMessageResponse, summary="Send a message to AI Tutor")
-def send_message(session_id: int, request: ChatMessageRequest, db: Session = Depends(get_db)):
+async def send_message(session_id: int, request: ChatMessageRequest, db: Session = Depends(get_db)):
     if not request.message.strip():
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Message cannot be empty.")
     
     # Verify session
-    session = db.query(ChatSession).filter(ChatSession.id == session_id).first()
-    if not session:
+    agent = ChatAgent(db)
+    if not await run_in_threadpool(agent.session_exists, session_id):
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Session not found.")
 
-    agent = ChatAgent(db)
     try:
-        answer = agent.send_message(session_id, request.message)
+        answer = await agent.send_message_async(
+            session_id,
+            request.message,
+            document_id=request.document_id,
+            subject=request.subject
+        )
         return {"role": "assistant", "content": answer}
+    except SchedulerBusyError as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Error generating response: {str(e)}")
+
+@router.post("/sessions/{session_id}/message/stream", summary="Send a message to AI Tutor, streaming the reply")
+async def send_message_stream(session_id: int, request: ChatMessageRequest, db: Session = Depends(get_db)):
+    """
+    Server-Sent Events variant of `/message`. Emits `data: {"token": ...}` events, then an `event: done`
+    with the full reply, which is saved to the session history once the stream completes.
+    """
+    if not request.message.strip():
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Message cannot be empty.")
+
+    if not await run_in_threadpool(ChatAgent(db).session_exists, session_id):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Session not found.")
+
+    async def events():
+        # The stream outlives the request's dependencies, so it uses its own session
+        stream_db = SessionLocal()
+        try:
+            agent = ChatAgent(stream_db)
+            tokens = agent.stream_message_async(
+                session_id,
+                request.message,
+                document_id=request.document_id,
+                subject=request.subject
+            )
+            async for event in sse_token_stream(tokens):
+                yield event
+        finally:
+            stream_db.close()
+
+    return StreamingResponse(events(), media_type="text/event-stream")
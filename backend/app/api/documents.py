@@ -91,16 +91,37 @@ def get_document_summary(doc_id: int, db: Session = Depends(get_db)):
         
     # Generate summary
     from backend.app.ai.llm_service import LLMService
+    from backend.app.core.scheduler import BATCH, SchedulerBusyError
     llm = LLMService()
     
     # Simple strategy: summarize the first 2000 chars to avoid exceeding context window
     # A robust strategy would chunk and map-reduce.
     text_to_summarize = doc.content[:2000]
     
-    summary = llm.summarize(text_to_summarize)
+    try:
+        # Generated once per document and stored, so it queues behind chat and quiz requests
+        summary = llm.summarize(text_to_summarize, priority=BATCH)
+    except SchedulerBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e))
     
     # Save to DB
     doc.summary = summary
     db.commit()
     
     return {"id": doc.id, "summary": doc.summary}
+
+@router.delete("/{doc_id}", summary="Delete a document")
+def delete_document(doc_id: int, db: Session = Depends(get_db)):
+    """
+    Delete a document, its chunks, and their vectors in the search index.
+    """
+    from backend.app.rag.pipeline import RAGPipeline
+    pipeline = RAGPipeline(db)
+    try:
+        deleted = pipeline.delete_document(doc_id)
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+    if not deleted:
+        raise HTTPException(status_code=404, detail="Document not found")
+    return {"id": doc_id, "message": "Document deleted successfully."}
@@ -3,6 +3,7 @@ from sqlalchemy.orm import Session
 from pydantic import BaseModel
 from typing import List, Optional
 
+from backend.app.core.scheduler import SchedulerBusyError
 from backend.app.database.session import get_db
 from backend.app.ai.flashcard_service import FlashcardService
 
@@ -26,11 +27,13 @@ class FlashcardDeckResponse(BaseModel):
         from_attributes = True
 
 @router.post("/generate/{document_id}", response_model=FlashcardDeckResponse, summary="Generate flashcards from a document")
-def generate_flashcards(document_id: int, num_cards: int = 10, db: Session = Depends(get_db)):
+async def generate_flashcards(document_id: int, num_cards: int = 10, db: Session = Depends(get_db)):
     service = FlashcardService(db)
     try:
-        deck = service.generate_flashcards(document_id, num_cards)
+        deck = await service.generate_flashcards_async(document_id, num_cards)
         return deck
+    except SchedulerBusyError as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
@@ -1,6 +1,12 @@
 from fastapi import APIRouter
 from pydantic import BaseModel
 from typing import Dict, Any
+from backend.app.ai.llm_service import llm_flights, response_cache
+from backend.app.core.scheduler import llm_scheduler
+from backend.app.core.singleflight import generation_flights
+from backend.app.embeddings.batcher import peek_embedding_batcher
+from backend.app.embeddings.cache import get_embedding_cache
+from backend.app.rag.pipeline import chunk_cache
 
 router = APIRouter()
 
@@ -20,3 +26,20 @@ async def health_check() -> Dict[str, Any]:
         "message": "AI Study Pal backend is running",
         "version": "0.1.0"
     }
+
+@router.get("/metrics")
+def metrics() -> Dict[str, Any]:
+    """
+    In-process cache and batching statistics for this worker.
+    """
+    # Reported only once the batcher is running; looking must not start it
+    batcher = peek_embedding_batcher()
+    return {
+        "embedding_cache": get_embedding_cache().stats(),
+        "embedding_batcher": batcher.stats() if batcher else None,
+        "chunk_cache": chunk_cache.stats(),
+        "llm_response_cache": response_cache.stats(),
+        "llm_single_flight": llm_flights.stats(),
+        "generation_single_flight": generation_flights.stats(),
+        "llm_scheduler": llm_scheduler.stats()
+    }
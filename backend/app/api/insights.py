@@ -4,6 +4,7 @@ from pydantic import BaseModel
 from typing import Optional
 from datetime import datetime
 
+from backend.app.core.scheduler import SchedulerBusyError
 from backend.app.database.session import get_db
 from backend.app.ai.insight_service import InsightService
 
@@ -22,7 +23,7 @@ class InsightResponse(BaseModel):
 from backend.app.core.cache import cache
 
 @router.post("/generate", response_model=InsightResponse, summary="Generate new learning insights")
-def generate_insights(db: Session = Depends(get_db)):
+async def generate_insights(db: Session = Depends(get_db)):
     # Check cache to avoid expensive LLM calls if generated recently
     cached_insight = cache.get("latest_insight")
     if cached_insight:
@@ -30,9 +31,11 @@ def generate_insights(db: Session = Depends(get_db)):
 
     service = InsightService(db)
     try:
-        insight = service.generate_insights()
+        insight = await service.generate_insights_async()
         cache.set("latest_insight", insight, ttl_seconds=3600) # Cache for 1 hour
         return insight
+    except SchedulerBusyError as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
@@ -1,43 +1,193 @@
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
+from datetime import datetime
 
-from backend.app.database.session import get_db
+from backend.app.core.config import get_settings
+from backend.app.core.scheduler import SchedulerBusyError
+from backend.app.database.session import SessionLocal, get_db
+from backend.app.rag.index_training import IndexTrainingService
+from backend.app.rag.indexing_job import IndexingJobService
 from backend.app.rag.pipeline import RAGPipeline
+from backend.app.rag.vector_store import get_vector_store
+from backend.app.utils.sse import sse_token_stream
 
+settings = get_settings()
 router = APIRouter()
 
+def _require_writable_index():
+    if get_vector_store().read_only:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="The vector index is read-only on this worker. Run indexing on the writer process."
+        )
+
 class QuestionRequest(BaseModel):
     question: str
+    document_id: Optional[int] = None
+    subject: Optional[str] = None
 
 class QuestionResponse(BaseModel):
     answer: str
 
+class RetrieveBatchRequest(BaseModel):
+    questions: List[str]
+    top_k: int = settings.TOP_K_RETRIEVAL
+    document_id: Optional[int] = None
+    subject: Optional[str] = None
+
+class RetrievedChunk(BaseModel):
+    chunk_id: int
+    document_id: int
+    score: float
+    text: str
+
+class RetrieveBatchResponse(BaseModel):
+    results: List[List[RetrievedChunk]]
+
+class IndexingJobResponse(BaseModel):
+    id: int
+    status: str
+    total_documents: int
+    indexed_documents: int
+    failed_documents: int
+    checkpoint_document_id: int
+    error: Optional[str] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+class IndexTrainingResponse(BaseModel):
+    status: str
+    index_type: Optional[str] = None
+    vectors: Optional[int] = None
+    error: Optional[str] = None
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
 @router.post("/ask", response_model=QuestionResponse, summary="Ask a question using RAG")
-def ask_question(request: QuestionRequest, db: Session = Depends(get_db)):
+async def ask_question(request: QuestionRequest, db: Session = Depends(get_db)):
     """
     Submit a question to the AI Tutor. The system will retrieve relevant context
     from the uploaded documents and generate an answer using the LLM.
+    Set `document_id` and/or `subject` to only search those materials.
     """
     if not request.question.strip():
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Question cannot be empty.")
         
     try:
         pipeline = RAGPipeline(db)
-        answer = pipeline.answer_question(request.question)
+        answer = await pipeline.answer_question_async(request.question, document_id=request.document_id, subject=request.subject)
         return {"answer": answer}
+    except SchedulerBusyError as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Error generating answer: {str(e)}")
 
-@router.post("/index-all", summary="Re-index all unindexed documents")
+@router.post("/ask/stream", summary="Ask a question using RAG, streaming the answer")
+async def ask_question_stream(request: QuestionRequest):
+    """
+    Server-Sent Events variant of `/ask`. Emits `data: {"token": ...}` events as the answer is generated,
+    then an `event: done` with the full answer.
+    """
+    if not request.question.strip():
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Question cannot be empty.")
+
+    async def events():
+        # The stream outlives the request's dependencies, so it uses its own session
+        db = SessionLocal()
+        try:
+            pipeline = RAGPipeline(db)
+            tokens = pipeline.stream_answer_async(request.question, document_id=request.document_id, subject=request.subject)
+            async for event in sse_token_stream(tokens):
+                yield event
+        finally:
+            db.close()
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+@router.post("/retrieve-batch", response_model=RetrieveBatchResponse, summary="Retrieve context for many questions at once")
+def retrieve_batch(request: RetrieveBatchRequest, db: Session = Depends(get_db)):
+    """
+    Retrieval-only endpoint for evaluation and bulk generation jobs. Embeds all questions in one request
+    and searches the vector index with a single batched call, returning the top_k chunks for each question
+    in the order the questions were given. No answer is generated.
+    """
+    if not request.questions or any(not q.strip() for q in request.questions):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Questions cannot be empty.")
+    if len(request.questions) > settings.RETRIEVE_BATCH_MAX_QUESTIONS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {settings.RETRIEVE_BATCH_MAX_QUESTIONS} questions can be retrieved per request."
+        )
+    if not 1 <= request.top_k <= settings.RETRIEVE_MAX_TOP_K:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"top_k must be between 1 and {settings.RETRIEVE_MAX_TOP_K}.")
+
+    try:
+        pipeline = RAGPipeline(db)
+        results = pipeline.retrieve_batch(
+            request.questions,
+            top_k=request.top_k,
+            document_id=request.document_id,
+            subject=request.subject
+        )
+        return {"results": results}
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Error retrieving context: {str(e)}")
+
+@router.post("/index-all", response_model=IndexingJobResponse, status_code=status.HTTP_202_ACCEPTED, summary="Index all unindexed documents in the background")
 def index_all(db: Session = Depends(get_db)):
     """
-    Admin endpoint to trigger indexing of all uploaded documents that haven't been chunked and embedded yet.
+    Admin endpoint to index all uploaded documents that haven't been chunked and embedded yet.
+    Returns immediately with the background job; poll `/index-jobs/{job_id}` for progress.
+    An interrupted or failed job is resumed from its last checkpoint, and a job that is
+    still running, in this or another worker, is returned as is.
+    """
+    _require_writable_index()
+    try:
+        return IndexingJobService.start(db)
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Indexing failed to start: {str(e)}")
+
+@router.get("/index-jobs/{job_id}", response_model=IndexingJobResponse, summary="Get the progress of an indexing job")
+def get_indexing_job(job_id: int, db: Session = Depends(get_db)):
+    job = IndexingJobService.get(db, job_id)
+    if not job:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Indexing job not found")
+    return job
+
+@router.post("/reindex/{document_id}", summary="Re-index a single document")
+def reindex_document(document_id: int, db: Session = Depends(get_db)):
+    """
+    Admin endpoint to replace a document's chunks and vectors, e.g. after its content was edited.
+    The old vectors are tombstoned and dropped by the next index compaction.
     """
+    _require_writable_index()
     try:
         pipeline = RAGPipeline(db)
-        pipeline.index_all_unindexed_documents()
-        return {"message": "Indexing complete."}
+        pipeline.reindex_document(document_id)
+        return {"message": f"Document {document_id} re-indexed."}
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Re-indexing failed: {str(e)}")
+
+@router.post("/train-index", response_model=IndexTrainingResponse, status_code=status.HTTP_202_ACCEPTED, summary="Train the vector index with the configured index type")
+def train_index():
+    """
+    Admin endpoint to rebuild the vector index as the configured approximate type (IVF / HNSW / PQ),
+    training it on the vectors that are already indexed. Training runs in the background while
+    searches keep using the current index; poll `GET /train-index` for the outcome.
+    """
+    _require_writable_index()
+    try:
+        return IndexTrainingService.start()
     except Exception as e:
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Indexing failed: {str(e)}")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Training failed to start: {str(e)}")
+
+@router.get("/train-index", response_model=IndexTrainingResponse, summary="Get the outcome of the last index training")
+def get_index_training():
+    return IndexTrainingService.get()
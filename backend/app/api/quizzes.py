@@ -3,6 +3,7 @@ from sqlalchemy.orm import Session
 from pydantic import BaseModel
 from typing import List, Optional
 
+from backend.app.core.scheduler import SchedulerBusyError
 from backend.app.database.session import get_db
 from backend.app.ai.quiz_service import QuizService
 
@@ -29,11 +30,13 @@ class QuizResponse(BaseModel):
         from_attributes = True
 
 @router.post("/generate/{document_id}", response_model=QuizResponse, summary="Generate a quiz from a document")
-def generate_quiz(document_id: int, num_questions: int = 5, difficulty: str = "Medium", db: Session = Depends(get_db)):
+async def generate_quiz(document_id: int, num_questions: int = 5, difficulty: str = "Medium", db: Session = Depends(get_db)):
     service = QuizService(db)
     try:
-        quiz = service.generate_quiz(document_id, num_questions, difficulty)
+        quiz = await service.generate_quiz_async(document_id, num_questions, difficulty)
         return quiz
+    except SchedulerBusyError as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
@@ -3,6 +3,7 @@ from sqlalchemy.orm import Session
 from pydantic import BaseModel
 from typing import List, Optional
 
+from backend.app.core.scheduler import SchedulerBusyError
 from backend.app.database.session import get_db
 from backend.app.ai.study_planner_service import StudyPlanService
 
@@ -28,11 +29,13 @@ class StudyPlanResponse(BaseModel):
         from_attributes = True
 
 @router.post("/generate/{document_id}", response_model=StudyPlanResponse, summary="Generate a study plan from a document")
-def generate_study_plan(document_id: int, num_days: int = 7, db: Session = Depends(get_db)):
+async def generate_study_plan(document_id: int, num_days: int = 7, db: Session = Depends(get_db)):
     service = StudyPlanService(db)
     try:
-        plan = service.generate_study_plan(document_id, num_days)
+        plan = await service.generate_study_plan_async(document_id, num_days)
         return plan
+    except SchedulerBusyError as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
@@ -29,16 +29,80 @@ class Settings(BaseSettings):
     GEMINI_API_KEY: str | None = None
     ANTHROPIC_API_KEY: str | None = None
     HF_API_KEY: str | None = None
+    HF_API_BASE_URL: str = "https://api-inference.huggingface.co"  # e.g. http://127.0.0.1:8001 for scripts/mock_hf_server.py
+    LLM_TIMEOUT_SECONDS: float = 30.0
+    LLM_CACHE_ENABLED: bool = True
+    LLM_CACHE_MAX_SIZE: int = 1000
+    LLM_CACHE_TTL_SECONDS: float = 3600.0
+    LLM_CACHE_MAX_TEMPERATURE: float = 0.7  # Generations sampled hotter than this are never cached
+    LLM_MAX_CONCURRENCY: int = 8  # Upstream LLM calls in flight per process
+    LLM_BATCH_MAX_CONCURRENCY: int = 2  # Share of those slots batch work (insights, summaries) may hold
+    LLM_MAX_QUEUE_DEPTH: int = 100  # Waiters per priority class before requests are turned away with 503
+    LLM_QUEUE_TIMEOUT_SECONDS: float = 30.0  # 0 waits indefinitely
+
+    # HTTP client (shared, keep-alive connection pool for model API calls)
+    HTTP_POOL_CONNECTIONS: int = 4  # Distinct hosts to keep pools for
+    HTTP_POOL_MAXSIZE: int = 32  # Keep-alive connections per host
+    HTTP_POOL_BLOCK: bool = False  # Wait for a free connection instead of opening a throwaway one
+    HTTP_CONNECT_TIMEOUT_SECONDS: float = 5.0
+    HTTP_ASYNC_MAX_CONNECTIONS: int = 200  # In-flight requests from the async LLM client
     
     # RAG Settings
     EMBEDDING_MODEL: str = "sentence-transformers/all-MiniLM-L6-v2"
-    CHUNK_SIZE: int = 500
+    EMBEDDING_DIMENSION: int = 384
+    EMBEDDING_BACKEND: str = "api"  # Options: api, local
+    EMBEDDING_LOCAL_RUNTIME: str = "torch"  # Options: torch, onnx
+    EMBEDDING_BATCH_SIZE: int = 32
+    EMBEDDING_NUM_THREADS: int = 0  # 0 lets the runtime decide
+    EMBEDDING_TIMEOUT_SECONDS: float = 10.0
+    EMBEDDING_CACHE_ENABLED: bool = True
+    EMBEDDING_CACHE_MEMORY_SIZE: int = 10000  # Vectors kept in the in-process LRU in front of the database table
+    EMBEDDING_REQUEST_BATCH_SIZE: int = 64  # Texts per backend call when embedding many texts
+    EMBEDDING_MAX_CONCURRENCY: int = 4  # Sub-batches in flight at once (API backend)
+    EMBEDDING_MAX_RETRIES: int = 2
+    EMBEDDING_RETRY_BACKOFF_SECONDS: float = 0.5  # Doubled on each retry
+    EMBEDDING_MICRO_BATCHING: bool = True  # Coalesce concurrent single-query embeddings into one backend call
+    EMBEDDING_MICRO_BATCH_MAX_SIZE: int = 32
+    EMBEDDING_MICRO_BATCH_MAX_WAIT_MS: float = 5.0
+    CHUNK_STRATEGY: str = "auto"  # auto (by file type), sentence, paragraph or fixed
+    CHUNK_MAX_TOKENS: int = 200  # Token budget per chunk, measured by the embedding model's tokenizer
+    CHUNK_OVERLAP_TOKENS: int = 30  # Whole sentences carried over between consecutive chunks
+    CHUNK_TOKENIZER: str = "model"  # model (embedding model tokenizer) or regex (approximation)
+    CHUNK_INDEX_BATCH_SIZE: int = 256  # Chunks saved and embedded together while indexing a document
+    INDEX_JOB_WORKERS: int = 4  # Documents indexed in parallel by the background indexing job
+    INDEX_JOB_PAGE_SIZE: int = 50  # Documents per checkpoint
+    INDEX_JOB_LEASE_SECONDS: float = 60.0  # A job whose worker stopped renewing its claim this long ago may be taken over
+    CHUNK_SIZE: int = 500  # Characters per chunk (fixed strategy)
     CHUNK_OVERLAP: int = 50
     TOP_K_RETRIEVAL: int = 3
+    RETRIEVAL_FILTER_MAX_IDS: int = 50000  # Broader document/subject filters are applied to over-fetched hits
+    RETRIEVE_BATCH_MAX_QUESTIONS: int = 256  # FAISS allocates questions x top_k results per request
+    RETRIEVE_MAX_TOP_K: int = 100
+    CHUNK_CACHE_MAX_SIZE: int = 10000  # Chunk texts kept in memory for retrieval (0 disables)
+    CHUNK_CACHE_TTL_SECONDS: float = 600.0  # Bounds staleness when another process deletes chunks
     SIMILARITY_THRESHOLD: float = 0.75
     MAX_CONTEXT_LENGTH: int = 2048
     UPLOAD_SIZE_LIMIT_MB: int = 10
 
+    # Vector Store Settings
+    VECTOR_INDEX_PATH: str = "faiss_index.bin"
+    VECTOR_INDEX_TYPE: str = "flat"  # Options: flat, ivf_flat, ivf_pq, hnsw, sq8, sq_fp16, ivf_sq8
+    VECTOR_IVF_NLIST: int = 1024
+    VECTOR_IVF_NPROBE: int = 16
+    VECTOR_PQ_M: int = 48
+    VECTOR_HNSW_M: int = 32
+    VECTOR_HNSW_EF_SEARCH: int = 64
+    VECTOR_EXACT_FILTER_MAX_IDS: int = 10000  # Filtered IVF/HNSW searches over fewer chunks score them exactly
+    VECTOR_SQ_MIN_TRAINING_VECTORS: int = 1000
+    VECTOR_TRAIN_SAMPLE_SIZE: int = 100000
+    VECTOR_WRITE_BEHIND: bool = False
+    VECTOR_FLUSH_MAX_PENDING: int = 10000
+    VECTOR_FLUSH_INTERVAL_SECONDS: float = 30.0
+    VECTOR_COMPACTION_THRESHOLD: float = 0.2
+    VECTOR_NUM_SHARDS: int = 1
+    VECTOR_SHARD_BY: str = "document"  # Options: document, subject
+    VECTOR_INDEX_MMAP: bool = False  # Read-only, memory-mapped serving; indexing must run in a writer process
+
     model_config = SettingsConfigDict(
         env_file=".env", 
         env_file_encoding="utf-8",
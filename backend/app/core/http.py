@@ -0,0 +1,74 @@
+import asyncio
+import threading
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from typing import Optional, Tuple
+from backend.app.core.config import get_settings
+
+settings = get_settings()
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+_async_client: Optional[httpx.AsyncClient] = None
+_async_client_loop: Optional[asyncio.AbstractEventLoop] = None
+
+def get_http_session() -> requests.Session:
+    """
+    Return the process-wide HTTP session used for model API calls.
+    Connections are kept alive and pooled per host (HTTP_POOL_MAXSIZE each), so steady-state
+    requests to the inference endpoints skip the TCP and TLS handshakes.
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(
+                    pool_connections=settings.HTTP_POOL_CONNECTIONS,
+                    pool_maxsize=settings.HTTP_POOL_MAXSIZE,
+                    pool_block=settings.HTTP_POOL_BLOCK
+                )
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _session = session
+    return _session
+
+def http_timeout(read_seconds: float) -> Tuple[float, float]:
+    """(connect, read) timeout tuple for requests."""
+    return (settings.HTTP_CONNECT_TIMEOUT_SECONDS, read_seconds)
+
+def close_http_session() -> None:
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+            _session = None
+
+def get_async_http_client() -> httpx.AsyncClient:
+    """
+    Return the shared httpx.AsyncClient for async model API calls. Must be called from a running event loop.
+    The client's pool is bound to the loop that created it, so a client from an earlier loop is replaced.
+    """
+    global _async_client, _async_client_loop
+    loop = asyncio.get_running_loop()
+    if _async_client is None or _async_client_loop is not loop:
+        _async_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=settings.HTTP_ASYNC_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.HTTP_POOL_MAXSIZE
+            ),
+            timeout=httpx.Timeout(settings.LLM_TIMEOUT_SECONDS, connect=settings.HTTP_CONNECT_TIMEOUT_SECONDS)
+        )
+        _async_client_loop = loop
+    return _async_client
+
+def async_http_timeout(read_seconds: float) -> httpx.Timeout:
+    return httpx.Timeout(read_seconds, connect=settings.HTTP_CONNECT_TIMEOUT_SECONDS)
+
+async def close_async_http_client() -> None:
+    global _async_client, _async_client_loop
+    if _async_client is not None and _async_client_loop is asyncio.get_running_loop():
+        await _async_client.aclose()
+    _async_client = None
+    _async_client_loop = None
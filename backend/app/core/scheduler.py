@@ -0,0 +1,169 @@
+import asyncio
+import threading
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import Deque, Dict, Optional, Union
+from backend.app.core.config import get_settings
+
+settings = get_settings()
+
+INTERACTIVE = "interactive"
+BATCH = "batch"
+# Highest priority first
+PRIORITIES = [INTERACTIVE, BATCH]
+
+class SchedulerBusyError(RuntimeError):
+    """Raised when the queue for a priority class is full or a waiter timed out. API routes map it to 503."""
+
+class _Waiter:
+    __slots__ = ("priority", "event", "loop", "future", "granted")
+
+    def __init__(self, priority: str, loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.priority = priority
+        self.loop = loop
+        self.event = None if loop else threading.Event()
+        self.future = loop.create_future() if loop else None
+        self.granted = False
+
+    def wake(self) -> None:
+        self.granted = True
+        if self.loop is None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(_resolve, self.future)
+
+def _resolve(future: asyncio.Future) -> None:
+    if not future.done():
+        future.set_result(None)
+
+class PriorityScheduler:
+    """
+    A global counting semaphore with priority classes, shared by threads and event-loop tasks.
+    At most `max_concurrency` slots are held at once and at most `class_limits[c]` by class c.
+    When a slot frees up it goes to the oldest waiter of the highest-priority class that is under
+    its cap, so queued interactive requests always overtake queued batch work. Each class queues
+    at most `max_queue_depth` waiters; beyond that, or after `queue_timeout` seconds of waiting,
+    callers get SchedulerBusyError instead of piling up.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int,
+        class_limits: Dict[str, int],
+        max_queue_depth: int,
+        queue_timeout: Optional[float] = None
+    ):
+        self.max_concurrency = max(1, max_concurrency)
+        self.class_limits = class_limits
+        self.max_queue_depth = max_queue_depth
+        self.queue_timeout = queue_timeout
+        self._lock = threading.Lock()
+        self._queues: Dict[str, Deque[_Waiter]] = {priority: deque() for priority in PRIORITIES}
+        self._running: Dict[str, int] = {priority: 0 for priority in PRIORITIES}
+        self._rejected: Dict[str, int] = {priority: 0 for priority in PRIORITIES}
+        self._max_depth: Dict[str, int] = {priority: 0 for priority in PRIORITIES}
+
+    def _enqueue(self, waiter: _Waiter) -> None:
+        """
+        Queue the waiter and hand out any free slots. Raises if the waiter would have to wait
+        while its class queue is full; a waiter that gets a slot straight away is never rejected.
+        """
+        if waiter.priority not in self._queues:
+            raise ValueError(f"Unknown priority '{waiter.priority}'. Expected one of {PRIORITIES}.")
+        with self._lock:
+            queue = self._queues[waiter.priority]
+            full = len(queue) >= self.max_queue_depth
+            queue.append(waiter)
+            self._dispatch()
+            if waiter.granted:
+                return
+            if full:
+                queue.remove(waiter)
+                self._rejected[waiter.priority] += 1
+                raise SchedulerBusyError(f"The language model is busy ({waiter.priority} queue is full). Please retry shortly.")
+            self._max_depth[waiter.priority] = max(self._max_depth[waiter.priority], len(queue))
+
+    def _dispatch(self) -> None:
+        # Caller holds self._lock
+        while sum(self._running.values()) < self.max_concurrency:
+            for priority in PRIORITIES:
+                queue = self._queues[priority]
+                if queue and self._running[priority] < self.class_limits.get(priority, self.max_concurrency):
+                    self._running[priority] += 1
+                    queue.popleft().wake()
+                    break
+            else:
+                return
+
+    def _withdraw(self, waiter: _Waiter, timed_out: bool) -> bool:
+        """
+        Remove a waiter that gave up. Returns False if it was granted a slot in the meantime,
+        in which case the caller owns that slot.
+        """
+        with self._lock:
+            if waiter.granted:
+                return False
+            self._queues[waiter.priority].remove(waiter)
+            if timed_out:
+                self._rejected[waiter.priority] += 1
+            return True
+
+    def release(self, priority: str) -> None:
+        with self._lock:
+            self._running[priority] -= 1
+            self._dispatch()
+
+    def acquire(self, priority: str = INTERACTIVE) -> None:
+        waiter = _Waiter(priority)
+        self._enqueue(waiter)
+        if not waiter.event.wait(self.queue_timeout) and self._withdraw(waiter, timed_out=True):
+            raise SchedulerBusyError("Timed out waiting for the language model. Please retry shortly.")
+
+    async def acquire_async(self, priority: str = INTERACTIVE) -> None:
+        waiter = _Waiter(priority, loop=asyncio.get_running_loop())
+        self._enqueue(waiter)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), self.queue_timeout)
+        except asyncio.TimeoutError:
+            if self._withdraw(waiter, timed_out=True):
+                raise SchedulerBusyError("Timed out waiting for the language model. Please retry shortly.")
+        except asyncio.CancelledError:
+            if not self._withdraw(waiter, timed_out=False):
+                self.release(priority)
+            raise
+
+    @contextmanager
+    def slot(self, priority: str = INTERACTIVE):
+        self.acquire(priority)
+        try:
+            yield
+        finally:
+            self.release(priority)
+
+    @asynccontextmanager
+    async def slot_async(self, priority: str = INTERACTIVE):
+        await self.acquire_async(priority)
+        try:
+            yield
+        finally:
+            self.release(priority)
+
+    def stats(self) -> Dict[str, Union[int, Dict[str, int]]]:
+        with self._lock:
+            return {
+                "max_concurrency": self.max_concurrency,
+                "running": dict(self._running),
+                "queued": {priority: len(queue) for priority, queue in self._queues.items()},
+                "max_queue_depth_seen": dict(self._max_depth),
+                "rejected": dict(self._rejected),
+            }
+
+llm_scheduler = PriorityScheduler(
+    max_concurrency=settings.LLM_MAX_CONCURRENCY,
+    class_limits={
+        INTERACTIVE: settings.LLM_MAX_CONCURRENCY,
+        BATCH: settings.LLM_BATCH_MAX_CONCURRENCY,
+    },
+    max_queue_depth=settings.LLM_MAX_QUEUE_DEPTH,
+    queue_timeout=settings.LLM_QUEUE_TIMEOUT_SECONDS or None
+)
@@ -0,0 +1,133 @@
+import logging
+import threading
+from abc import ABC, abstractmethod
+from typing import List, Optional
+from backend.app.core.config import get_settings
+from backend.app.core.http import get_http_session, http_timeout
+
+settings = get_settings()
+logger = logging.getLogger("ai_study_pal")
+
+class EmbeddingBackend(ABC):
+    """
+    Base class for embedding backends. `embed` raises on failure; EmbeddingService decides what to do about it.
+    """
+    name = "base"
+    # Whether EmbeddingService may substitute zero vectors when this backend fails
+    fallback_to_mock = False
+    # Whether EmbeddingService may send several sub-batches at once
+    concurrent_requests = False
+
+    @abstractmethod
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        """Embed `texts`, returning one vector per text in the same order."""
+
+class HuggingFaceAPIBackend(EmbeddingBackend):
+    """
+    Generates embeddings via the Hugging Face Inference API.
+    """
+    name = "api"
+    fallback_to_mock = True
+    concurrent_requests = True
+
+    def _get_api_url(self) -> str:
+        return f"{settings.HF_API_BASE_URL.rstrip('/')}/pipeline/feature-extraction/{settings.EMBEDDING_MODEL}"
+
+    def _get_headers(self) -> dict:
+        if not settings.HF_API_KEY:
+            return {}
+        return {"Authorization": f"Bearer {settings.HF_API_KEY}"}
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        response = get_http_session().post(
+            self._get_api_url(),
+            headers=self._get_headers(),
+            json={"inputs": texts, "options": {"wait_for_model": True}},
+            timeout=http_timeout(settings.EMBEDDING_TIMEOUT_SECONDS)
+        )
+        response.raise_for_status()
+        return response.json()
+
+class LocalEmbeddingBackend(EmbeddingBackend):
+    """
+    Runs settings.EMBEDDING_MODEL in-process on CPU with sentence-transformers, using either the
+    PyTorch or the ONNX Runtime engine (EMBEDDING_LOCAL_RUNTIME). The model is loaded once per process.
+    """
+    name = "local"
+    # Sub-batches run one at a time: the model already uses every core it is given
+
+    def __init__(self):
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError as e:
+            raise ImportError(
+                "EMBEDDING_BACKEND=local requires the 'sentence-transformers' package "
+                "(and 'onnxruntime' for EMBEDDING_LOCAL_RUNTIME=onnx)."
+            ) from e
+
+        model_kwargs = {}
+        if settings.EMBEDDING_LOCAL_RUNTIME == "onnx":
+            model_kwargs = self._onnx_model_kwargs()
+        elif settings.EMBEDDING_NUM_THREADS:
+            import torch
+            torch.set_num_threads(settings.EMBEDDING_NUM_THREADS)
+
+        logger.info(f"Loading local embedding model {settings.EMBEDDING_MODEL} ({settings.EMBEDDING_LOCAL_RUNTIME}).")
+        self.model = SentenceTransformer(
+            settings.EMBEDDING_MODEL,
+            device="cpu",
+            backend=settings.EMBEDDING_LOCAL_RUNTIME,
+            model_kwargs=model_kwargs or None
+        )
+
+        # A mismatch would otherwise only surface later as a FAISS assertion on the first add or search
+        dimension = self.model.get_sentence_embedding_dimension()
+        if dimension is not None and dimension != settings.EMBEDDING_DIMENSION:
+            raise ValueError(
+                f"Embedding model {settings.EMBEDDING_MODEL} produces {dimension}-dimensional vectors, "
+                f"but EMBEDDING_DIMENSION is {settings.EMBEDDING_DIMENSION}."
+            )
+
+    def _onnx_model_kwargs(self) -> dict:
+        """ONNX Runtime session settings; torch.set_num_threads does not reach the ONNX engine."""
+        import onnxruntime as ort
+        session_options = ort.SessionOptions()
+        if settings.EMBEDDING_NUM_THREADS:
+            session_options.intra_op_num_threads = settings.EMBEDDING_NUM_THREADS
+            # Sub-batches run one at a time, so there is nothing to run in parallel across operators
+            session_options.inter_op_num_threads = 1
+        return {"session_options": session_options, "provider": "CPUExecutionProvider"}
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        vectors = self.model.encode(
+            texts,
+            batch_size=settings.EMBEDDING_BATCH_SIZE,
+            convert_to_numpy=True,
+            show_progress_bar=False
+        )
+        return vectors.tolist()
+
+BACKENDS = {
+    HuggingFaceAPIBackend.name: HuggingFaceAPIBackend,
+    LocalEmbeddingBackend.name: LocalEmbeddingBackend,
+}
+
+_backend: Optional[EmbeddingBackend] = None
+_backend_lock = threading.Lock()
+
+def get_embedding_backend() -> EmbeddingBackend:
+    """
+    Return the process-wide embedding backend selected by settings.EMBEDDING_BACKEND.
+    The lifespan hook in backend/main.py calls this at startup so a local model is loaded before the first request.
+    """
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                backend_cls = BACKENDS.get(settings.EMBEDDING_BACKEND)
+                if backend_cls is None:
+                    raise ValueError(
+                        f"Unknown embedding backend '{settings.EMBEDDING_BACKEND}'. Expected one of {list(BACKENDS)}."
+                    )
+                _backend = backend_cls()
+    return _backend
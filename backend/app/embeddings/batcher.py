@@ -0,0 +1,139 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Callable, Dict, List, Optional, Tuple
+from backend.app.core.config import get_settings
+
+settings = get_settings()
+logger = logging.getLogger("ai_study_pal")
+
+class EmbeddingBatcher:
+    """
+    Dynamic batching for single-text embedding requests.
+    Callers submit a text and get a Future; a background thread waits up to `max_wait_ms` after the
+    first request for more to arrive, then embeds up to `max_batch_size` texts with one `embed_fn` call.
+    Concurrent queries from /qa/ask and chat therefore share one model/API round trip.
+    `embed` gives up after `result_timeout` seconds, so a wedged backend fails queries instead of hanging them.
+    """
+
+    def __init__(
+        self,
+        embed_fn: Callable[[List[str]], List[List[float]]],
+        max_batch_size: int,
+        max_wait_ms: float,
+        result_timeout: Optional[float] = None
+    ):
+        self.embed_fn = embed_fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000.0
+        self.result_timeout = result_timeout
+        self._queue: "queue.Queue[Optional[Tuple[str, Future]]]" = queue.Queue()
+        self._closed = False
+        self.batches = 0
+        self.requests = 0
+        self._thread = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, text: str) -> Future:
+        if self._closed:
+            raise RuntimeError("Embedding batcher is closed.")
+        future: Future = Future()
+        self._queue.put((text, future))
+        return future
+
+    def embed(self, text: str) -> List[float]:
+        future = self.submit(text)
+        try:
+            return future.result(timeout=self.result_timeout)
+        except FutureTimeoutError:
+            # Drop it from the next batch if the worker has not picked it up yet
+            future.cancel()
+            raise TimeoutError(f"Embedding request timed out after {self.result_timeout} seconds.")
+
+    def close(self) -> None:
+        """Stop the worker after it has drained the requests already queued."""
+        if not self._closed:
+            self._closed = True
+            self._queue.put(None)
+            self._thread.join()
+
+    def _collect(self) -> Tuple[List[Tuple[str, Future]], bool]:
+        """Block for the first request, then gather more until the batch is full or max_wait has passed."""
+        first = self._queue.get()
+        if first is None:
+            return [], True
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _run(self) -> None:
+        stop = False
+        while not stop:
+            batch, stop = self._collect()
+            if not batch:
+                continue
+            batch = [(text, future) for text, future in batch if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            self.batches += 1
+            self.requests += len(batch)
+            try:
+                vectors = self.embed_fn([text for text, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future), vector in zip(batch, vectors):
+                future.set_result(vector)
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "batches": self.batches,
+            "requests": self.requests,
+            "mean_batch_size": self.requests / self.batches if self.batches else 0.0,
+            "queued": self._queue.qsize(),
+        }
+
+_batcher: Optional[EmbeddingBatcher] = None
+_batcher_lock = threading.Lock()
+
+def get_embedding_batcher() -> EmbeddingBatcher:
+    """Return the process-wide batcher in front of EmbeddingService.generate_embeddings."""
+    global _batcher
+    if _batcher is None:
+        with _batcher_lock:
+            if _batcher is None:
+                from backend.app.embeddings.service import EmbeddingService
+                _batcher = EmbeddingBatcher(
+                    EmbeddingService.generate_embeddings,
+                    max_batch_size=settings.EMBEDDING_MICRO_BATCH_MAX_SIZE,
+                    max_wait_ms=settings.EMBEDDING_MICRO_BATCH_MAX_WAIT_MS,
+                    # One request timeout per attempt, plus the retry backoff (doubled on each retry)
+                    result_timeout=(
+                        settings.EMBEDDING_TIMEOUT_SECONDS * (settings.EMBEDDING_MAX_RETRIES + 1)
+                        + settings.EMBEDDING_RETRY_BACKOFF_SECONDS * (2 ** settings.EMBEDDING_MAX_RETRIES - 1)
+                    )
+                )
+    return _batcher
+
+def peek_embedding_batcher() -> Optional[EmbeddingBatcher]:
+    """The process-wide batcher if it has been started, without starting it."""
+    return _batcher
+
+def shutdown_embedding_batcher() -> None:
+    global _batcher
+    with _batcher_lock:
+        if _batcher is not None:
+            _batcher.close()
+            _batcher = None
@@ -0,0 +1,129 @@
+import hashlib
+import logging
+import threading
+import numpy as np
+from typing import Dict, List, Optional
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import SQLAlchemyError
+from backend.app.core.cache import LRUCache
+from backend.app.core.config import get_settings
+from backend.app.database.session import SessionLocal
+from backend.app.models.embedding_cache import EmbeddingCacheEntry
+
+settings = get_settings()
+logger = logging.getLogger("ai_study_pal")
+
+# INSERT ... ON CONFLICT DO NOTHING, per database dialect
+_INSERTS = {"sqlite": sqlite_insert, "postgresql": postgresql_insert}
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+class EmbeddingCache:
+    """
+    Content-addressed cache of embeddings keyed by (model, sha256(text)).
+    An in-process LRU sits in front of the `embedding_cache` table, so identical chunks and repeated
+    queries are embedded once per model and survive restarts. Database problems are logged and
+    treated as misses: the cache never makes embedding fail.
+    """
+
+    def __init__(self, memory_size: int):
+        self.memory = LRUCache(max_size=memory_size)
+        self._stats_lock = threading.Lock()
+        self.db_hits = 0
+        self.misses = 0
+
+    def get_many(self, model: str, texts: List[str]) -> Dict[str, List[float]]:
+        """Return {text: vector} for every text that has a cached embedding."""
+        found: Dict[str, List[float]] = {}
+        pending: Dict[str, str] = {}
+        for text in texts:
+            digest = text_hash(text)
+            vector = self.memory.get((model, digest))
+            if vector is not None:
+                found[text] = vector
+            else:
+                pending[digest] = text
+
+        if pending:
+            loaded = self._load(model, list(pending))
+            for digest, vector in loaded.items():
+                self.memory.set((model, digest), vector)
+                found[pending[digest]] = vector
+            with self._stats_lock:
+                self.db_hits += len(loaded)
+                self.misses += len(pending) - len(loaded)
+        return found
+
+    def set_many(self, model: str, vectors: Dict[str, List[float]]) -> None:
+        """Store freshly computed embeddings in memory and in the database."""
+        rows = {}
+        for text, vector in vectors.items():
+            digest = text_hash(text)
+            self.memory.set((model, digest), vector)
+            rows[digest] = vector
+        if rows:
+            self._store(model, rows)
+
+    def _load(self, model: str, digests: List[str]) -> Dict[str, List[float]]:
+        db = SessionLocal()
+        try:
+            entries = db.query(EmbeddingCacheEntry).filter(
+                EmbeddingCacheEntry.model == model,
+                EmbeddingCacheEntry.text_hash.in_(digests)
+            ).all()
+            return {entry.text_hash: np.frombuffer(entry.vector, dtype='float32').tolist() for entry in entries}
+        except SQLAlchemyError as e:
+            logger.warning(f"Embedding cache lookup failed, treating as miss: {e}")
+            return {}
+        finally:
+            db.close()
+
+    def _store(self, model: str, rows: Dict[str, List[float]]) -> None:
+        db = SessionLocal()
+        try:
+            values = [
+                {"model": model, "text_hash": digest, "vector": np.asarray(vector, dtype='float32').tobytes()}
+                for digest, vector in rows.items()
+            ]
+            # Another worker may store the same texts concurrently; its rows win and ours are skipped
+            insert = _INSERTS.get(db.get_bind().dialect.name)
+            if insert is None:
+                raise SQLAlchemyError(f"Unsupported database dialect: {db.get_bind().dialect.name}")
+            db.execute(insert(EmbeddingCacheEntry).values(values).on_conflict_do_nothing())
+            db.commit()
+        except SQLAlchemyError as e:
+            db.rollback()
+            logger.warning(f"Could not persist embeddings to the cache: {e}")
+        finally:
+            db.close()
+
+    def stats(self) -> Dict[str, float]:
+        memory = self.memory.stats()
+        lookups = memory["hits"] + self.db_hits + self.misses
+        return {
+            "memory_size": memory["size"],
+            "memory_hits": memory["hits"],
+            "db_hits": self.db_hits,
+            "misses": self.misses,
+            "hit_rate": (memory["hits"] + self.db_hits) / lookups if lookups else 0.0,
+        }
+
+    def clear_memory(self) -> None:
+        self.memory.clear()
+        with self._stats_lock:
+            self.db_hits = 0
+            self.misses = 0
+
+_embedding_cache: Optional[EmbeddingCache] = None
+_embedding_cache_lock = threading.Lock()
+
+def get_embedding_cache() -> EmbeddingCache:
+    """Return the process-wide embedding cache."""
+    global _embedding_cache
+    if _embedding_cache is None:
+        with _embedding_cache_lock:
+            if _embedding_cache is None:
+                _embedding_cache = EmbeddingCache(memory_size=settings.EMBEDDING_CACHE_MEMORY_SIZE)
+    return _embedding_cache
@@ -1,53 +1,95 @@
 import logging
-import requests
-from typing import List
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Tuple
 from backend.app.core.config import get_settings
+from backend.app.embeddings.backends import EmbeddingBackend, get_embedding_backend
+from backend.app.embeddings.batcher import get_embedding_batcher
+from backend.app.embeddings.cache import get_embedding_cache
 
 settings = get_settings()
 logger = logging.getLogger("ai_study_pal")
 
 class EmbeddingService:
     """
-    Service responsible for generating text embeddings via Hugging Face Inference API.
-    Gracefully falls back to mock embeddings if the API is unreachable (e.g. offline/sandbox).
+    Service responsible for generating text embeddings.
+    The work is delegated to the backend selected by settings.EMBEDDING_BACKEND: the Hugging Face
+    Inference API ("api") or a model running in-process on CPU ("local").
+    Single-text calls go through a micro-batcher (EMBEDDING_MICRO_BATCHING) that coalesces concurrent queries.
+    Results are cached by (EMBEDDING_MODEL, sha256(text)), so only texts never seen before reach the backend,
+    in bounded sub-batches that are retried individually.
+    The API backend gracefully falls back to mock embeddings if the API is unreachable (e.g. offline/sandbox);
+    the local backend raises instead, so zero vectors are never indexed in offline deployments.
     """
-    
+
     @classmethod
-    def _get_api_url(cls) -> str:
-        return f"https://api-inference.huggingface.co/pipeline/feature-extraction/{settings.EMBEDDING_MODEL}"
+    def generate_embedding(cls, text: str) -> List[float]:
+        if settings.EMBEDDING_MICRO_BATCHING:
+            return get_embedding_batcher().embed(text)
+        return cls.generate_embeddings([text])[0]
 
     @classmethod
-    def _get_headers(cls) -> dict:
-        if not settings.HF_API_KEY:
-            return {}
-        return {"Authorization": f"Bearer {settings.HF_API_KEY}"}
+    def generate_embeddings(cls, texts: List[str]) -> List[List[float]]:
+        if not settings.EMBEDDING_CACHE_ENABLED:
+            return cls._embed(texts, cache=False)
+
+        cache = get_embedding_cache()
+        unique_texts = list(dict.fromkeys(texts))
+        vectors = cache.get_many(settings.EMBEDDING_MODEL, unique_texts)
+        missing = [text for text in unique_texts if text not in vectors]
+        if missing:
+            vectors.update(zip(missing, cls._embed(missing, cache=True)))
+        return [vectors[text] for text in texts]
 
     @classmethod
-    def generate_embedding(cls, text: str) -> List[float]:
-        try:
-            response = requests.post(
-                cls._get_api_url(),
-                headers=cls._get_headers(),
-                json={"inputs": text, "options": {"wait_for_model": True}},
-                timeout=10
-            )
-            response.raise_for_status()
-            return response.json()
-        except Exception as e:
-            logger.warning("Returning mock embedding due to API/Network failure")
-            return [0.0] * 384
+    def _embed(cls, texts: List[str], cache: bool) -> List[List[float]]:
+        """
+        Embed `texts` in sub-batches of EMBEDDING_REQUEST_BATCH_SIZE, running up to EMBEDDING_MAX_CONCURRENCY
+        of them at once when the backend allows it. A failing sub-batch is retried on its own, so one bad
+        request never turns a whole document into mock vectors.
+        """
+        backend = get_embedding_backend()
+        size = max(1, settings.EMBEDDING_REQUEST_BATCH_SIZE)
+        batches = [texts[i:i + size] for i in range(0, len(texts), size)]
+        workers = min(len(batches), settings.EMBEDDING_MAX_CONCURRENCY) if backend.concurrent_requests else 1
+
+        jobs = [(backend, batch, number, len(batches)) for number, batch in enumerate(batches, start=1)]
+        if workers > 1:
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="embed") as pool:
+                results = list(pool.map(lambda job: cls._embed_batch(*job), jobs))
+        else:
+            results = [cls._embed_batch(*job) for job in jobs]
+
+        embeddings: List[List[float]] = []
+        fresh = {}
+        for batch, (vectors, ok) in zip(batches, results):
+            embeddings.extend(vectors)
+            # Mock vectors are never cached
+            if ok:
+                fresh.update(zip(batch, vectors))
+        if cache and fresh:
+            get_embedding_cache().set_many(settings.EMBEDDING_MODEL, fresh)
+        return embeddings
 
     @classmethod
-    def generate_embeddings(cls, texts: List[str]) -> List[List[float]]:
-        try:
-            response = requests.post(
-                cls._get_api_url(),
-                headers=cls._get_headers(),
-                json={"inputs": texts, "options": {"wait_for_model": True}},
-                timeout=10
-            )
-            response.raise_for_status()
-            return response.json()
-        except Exception as e:
-            logger.warning("Returning mock embeddings due to API/Network failure")
-            return [[0.0] * 384 for _ in texts]
+    def _embed_batch(cls, backend: EmbeddingBackend, batch: List[str], number: int, total: int) -> Tuple[List[List[float]], bool]:
+        """Embed one sub-batch with retries. Returns the vectors and whether they are real (not mock)."""
+        attempts = settings.EMBEDDING_MAX_RETRIES + 1
+        for attempt in range(1, attempts + 1):
+            start = time.perf_counter()
+            try:
+                vectors = backend.embed(batch)
+                if len(vectors) != len(batch):
+                    raise ValueError(f"Backend returned {len(vectors)} embeddings for {len(batch)} texts")
+            except Exception as e:
+                if attempt < attempts:
+                    delay = settings.EMBEDDING_RETRY_BACKOFF_SECONDS * 2 ** (attempt - 1)
+                    logger.warning(f"Embedding batch {number}/{total} failed (attempt {attempt}/{attempts}), retrying in {delay:.1f}s: {e}")
+                    time.sleep(delay)
+                    continue
+                if not backend.fallback_to_mock:
+                    raise
+                logger.warning(f"Returning mock embeddings for batch {number}/{total} due to API/Network failure: {e}")
+                return [[0.0] * settings.EMBEDDING_DIMENSION for _ in batch], False
+            logger.info(f"Embedded batch {number}/{total} ({len(batch)} texts) in {(time.perf_counter() - start) * 1000:.0f} ms")
+            return vectors, True
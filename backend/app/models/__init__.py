@@ -6,3 +6,5 @@ from backend.app.models.quiz import Quiz, Question
 from backend.app.models.flashcard import FlashcardDeck, Flashcard
 from backend.app.models.study_plan import StudyPlan, StudyMilestone
 from backend.app.models.insight import LearningInsight
+from backend.app.models.embedding_cache import EmbeddingCacheEntry
+from backend.app.models.indexing_job import IndexingJob
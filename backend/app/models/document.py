@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from backend.app.database.base import Base
@@ -28,6 +28,12 @@ class DocumentChunk(Base):
     Represents a chunk of text from a Document, embedded for RAG.
     """
     __tablename__ = "document_chunks"
+    __table_args__ = (
+        # Bulk indexing reads new chunk IDs back by (document_id, chunk_index)
+        Index("ix_document_chunks_document_id_chunk_index", "document_id", "chunk_index"),
+        # IDs key the vectors in FAISS, so a deleted chunk's ID must never be handed out again
+        {"sqlite_autoincrement": True},
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     document_id = Column(Integer, ForeignKey("documents.id"), nullable=False)
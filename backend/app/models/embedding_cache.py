@@ -0,0 +1,15 @@
+from sqlalchemy import Column, String, LargeBinary, DateTime
+from sqlalchemy.sql import func
+from backend.app.database.base import Base
+
+class EmbeddingCacheEntry(Base):
+    """
+    A previously computed embedding, keyed by the embedding model and the SHA-256 of the embedded text.
+    The vector is stored as raw float32 bytes.
+    """
+    __tablename__ = "embedding_cache"
+
+    model = Column(String, primary_key=True)
+    text_hash = Column(String(64), primary_key=True)
+    vector = Column(LargeBinary, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -0,0 +1,29 @@
+from sqlalchemy import Column, Integer, String, Text, DateTime, JSON
+from sqlalchemy.sql import func
+from backend.app.database.base import Base
+
+class IndexingJob(Base):
+    """
+    Progress of a background run that indexes all unindexed documents.
+    Documents are processed in ID order, a page at a time. Every document with an ID up to
+    `checkpoint_document_id` has been handled. `page_document_ids` lists the page in progress,
+    whose documents may be partially indexed. A job that did not complete is resumed by the next run.
+    While a job is queued or running, `worker_id` holds it and renews `heartbeat_at`; other workers
+    leave it alone until the heartbeat is older than INDEX_JOB_LEASE_SECONDS.
+    """
+    __tablename__ = "indexing_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    status = Column(String, nullable=False, default="queued")  # queued, running, completed, failed
+    total_documents = Column(Integer, nullable=False, default=0)
+    indexed_documents = Column(Integer, nullable=False, default=0)
+    failed_documents = Column(Integer, nullable=False, default=0)
+    checkpoint_document_id = Column(Integer, nullable=False, default=0)
+    page_document_ids = Column(JSON, nullable=True)
+    error = Column(Text, nullable=True)
+    worker_id = Column(String, nullable=True)
+    heartbeat_at = Column(DateTime(timezone=True), nullable=True)
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    finished_at = Column(DateTime(timezone=True), nullable=True)
@@ -0,0 +1,175 @@
+import os
+import re
+import logging
+import threading
+from collections import deque
+from typing import Callable, Deque, Iterator, Optional, Tuple
+from backend.app.core.config import get_settings
+
+settings = get_settings()
+logger = logging.getLogger("ai_study_pal")
+
+TokenCounter = Callable[[str], int]
+
+STRATEGIES = ("fixed", "sentence", "paragraph")
+# CHUNK_STRATEGY=auto picks by file extension; anything else (e.g. CSV imports) uses DEFAULT_STRATEGY
+STRATEGY_BY_EXTENSION = {
+    ".pdf": "sentence",  # PDF line breaks are layout, not structure
+    ".docx": "paragraph",
+    ".txt": "paragraph",
+    ".md": "paragraph",
+}
+DEFAULT_STRATEGY = "sentence"
+
+# A sentence runs to terminal punctuation (plus closing quotes/brackets) and its trailing whitespace
+_SENTENCE = re.compile(r'\S.*?(?:[.!?]+["\')\]]*(?=\s|$)|$)\s*', re.DOTALL)
+# A paragraph runs to a blank line, which stays attached to it
+_PARAGRAPH = re.compile(r'\S.*?(?:\n[ \t]*\n\s*|$)', re.DOTALL)
+_WORD = re.compile(r'\S+\s*')
+_REGEX_TOKEN = re.compile(r'\w+|[^\w\s]')
+# Units longer than max_tokens * this many characters are certainly over budget and are split
+# before counting, so a document without sentence or paragraph breaks is never tokenized whole
+MAX_CHARS_PER_TOKEN = 8
+
+def regex_token_count(text: str) -> int:
+    """Tokenizer-free approximation: words and punctuation marks. Subword tokenizers count somewhat more."""
+    return len(_REGEX_TOKEN.findall(text))
+
+_token_counter: Optional[TokenCounter] = None
+_token_counter_lock = threading.Lock()
+
+def get_token_counter() -> TokenCounter:
+    """
+    Token counter of the embedding model's own tokenizer (CHUNK_TOKENIZER=model), so chunk budgets match
+    what the model actually sees. Falls back to `regex_token_count` when `tokenizers` or the model's
+    tokenizer.json are unavailable, or when CHUNK_TOKENIZER=regex. Loaded at startup (see backend/main.py).
+    """
+    global _token_counter
+    if _token_counter is None:
+        with _token_counter_lock:
+            if _token_counter is None:
+                _token_counter = _load_token_counter()
+    return _token_counter
+
+def _load_token_counter() -> TokenCounter:
+    if settings.CHUNK_TOKENIZER != "model":
+        return regex_token_count
+    try:
+        from tokenizers import Tokenizer
+        tokenizer = Tokenizer.from_pretrained(settings.EMBEDDING_MODEL)
+    except Exception as e:
+        logger.warning(f"Tokenizer for {settings.EMBEDDING_MODEL} unavailable, approximating token counts: {e}")
+        return regex_token_count
+    # tokenizer.json may truncate to the model's input length; chunk budgets need the full count
+    tokenizer.no_truncation()
+    tokenizer.no_padding()
+    return lambda text: len(tokenizer.encode(text, add_special_tokens=False).ids)
+
+def strategy_for(filename: Optional[str]) -> str:
+    """The chunking strategy for a document, from CHUNK_STRATEGY or (for 'auto') its file extension."""
+    if settings.CHUNK_STRATEGY != "auto":
+        return settings.CHUNK_STRATEGY
+    extension = os.path.splitext(filename or "")[1].lower()
+    return STRATEGY_BY_EXTENSION.get(extension, DEFAULT_STRATEGY)
+
+def iter_chunks(
+    text: str,
+    strategy: str = DEFAULT_STRATEGY,
+    max_tokens: int = settings.CHUNK_MAX_TOKENS,
+    overlap_tokens: int = settings.CHUNK_OVERLAP_TOKENS,
+    count_tokens: Optional[TokenCounter] = None
+) -> Iterator[str]:
+    """
+    Lazily split `text` into chunks of at most `max_tokens` tokens that end on sentence (or paragraph)
+    boundaries. Consecutive chunks share up to `overlap_tokens` tokens of whole sentences. A single
+    sentence longer than the budget is split between words. The 'fixed' strategy keeps the legacy
+    character windows (CHUNK_SIZE / CHUNK_OVERLAP).
+    """
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown chunking strategy '{strategy}'. Expected one of {list(STRATEGIES)}.")
+    if not text:
+        return
+    if strategy == "fixed":
+        yield from _fixed_windows(text, settings.CHUNK_SIZE, settings.CHUNK_OVERLAP)
+        return
+
+    count_tokens = count_tokens or get_token_counter()
+    if strategy == "paragraph":
+        units = _paragraph_units(text, max_tokens, count_tokens)
+    else:
+        units = _sentence_units(text, max_tokens, count_tokens)
+    yield from _pack(units, max_tokens, overlap_tokens)
+
+def _fixed_windows(text: str, chunk_size: int, overlap: int) -> Iterator[str]:
+    start = 0
+    while start < len(text):
+        end = start + chunk_size
+        yield text[start:end]
+        if end >= len(text):
+            break
+        start = end - overlap
+
+def _sentence_units(text: str, max_tokens: int, count_tokens: TokenCounter) -> Iterator[Tuple[str, int]]:
+    for match in _SENTENCE.finditer(text):
+        sentence = match.group(0)
+        if len(sentence) > max_tokens * MAX_CHARS_PER_TOKEN:
+            yield from _word_units(sentence, max_tokens, count_tokens)
+            continue
+        tokens = count_tokens(sentence)
+        if tokens <= max_tokens:
+            yield sentence, tokens
+        else:
+            yield from _word_units(sentence, max_tokens, count_tokens)
+
+def _paragraph_units(text: str, max_tokens: int, count_tokens: TokenCounter) -> Iterator[Tuple[str, int]]:
+    for match in _PARAGRAPH.finditer(text):
+        paragraph = match.group(0)
+        if len(paragraph) > max_tokens * MAX_CHARS_PER_TOKEN:
+            yield from _sentence_units(paragraph, max_tokens, count_tokens)
+            continue
+        tokens = count_tokens(paragraph)
+        if tokens <= max_tokens:
+            yield paragraph, tokens
+        else:
+            yield from _sentence_units(paragraph, max_tokens, count_tokens)
+
+def _word_units(sentence: str, max_tokens: int, count_tokens: TokenCounter) -> Iterator[Tuple[str, int]]:
+    """Split an over-long sentence into word runs that fit the budget."""
+    piece, piece_tokens = "", 0
+    for match in _WORD.finditer(sentence):
+        for word in _split_long_word(match.group(0), max_tokens):
+            tokens = count_tokens(word)
+            if piece and piece_tokens + tokens > max_tokens:
+                yield piece, piece_tokens
+                piece, piece_tokens = "", 0
+            piece += word
+            piece_tokens += tokens
+    if piece:
+        yield piece, piece_tokens
+
+def _split_long_word(word: str, max_tokens: int) -> Iterator[str]:
+    """Cut a run without whitespace (URLs, base64, tables) into max_tokens-character pieces; no piece has more tokens than characters."""
+    if len(word) <= max_tokens * MAX_CHARS_PER_TOKEN:
+        yield word
+        return
+    for start in range(0, len(word), max_tokens):
+        yield word[start:start + max_tokens]
+
+def _pack(units: Iterator[Tuple[str, int]], max_tokens: int, overlap_tokens: int) -> Iterator[str]:
+    """Greedily pack units into chunks, carrying trailing units (up to overlap_tokens) into the next chunk."""
+    window: Deque[Tuple[str, int]] = deque()
+    window_tokens = 0
+    fresh = False  # whether the window holds units not emitted yet
+    for unit, tokens in units:
+        if window and window_tokens + tokens > max_tokens:
+            if fresh:
+                yield "".join(text for text, _ in window).strip()
+            # Keep the tail as overlap, but always leave room for the incoming unit
+            while window and (window_tokens > overlap_tokens or window_tokens + tokens > max_tokens):
+                window_tokens -= window.popleft()[1]
+            fresh = False
+        window.append((unit, tokens))
+        window_tokens += tokens
+        fresh = True
+    if fresh:
+        yield "".join(text for text, _ in window).strip()
@@ -0,0 +1,52 @@
+import logging
+import threading
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+from backend.app.rag.vector_store import get_vector_store
+
+logger = logging.getLogger("ai_study_pal")
+
+class IndexTrainingService:
+    """
+    Trains the vector index (see FAISSStore.train_index) in a background thread, so the HTTP request
+    that starts it returns at once. Searches keep running on the old index until the trained one is
+    swapped in. Only one training runs per process; its progress lives in memory.
+    """
+    _lock = threading.Lock()
+    _thread: Optional[threading.Thread] = None
+    _state: Dict[str, Any] = {"status": "idle"}
+
+    @classmethod
+    def start(cls, index_type: Optional[str] = None) -> Dict[str, Any]:
+        """Start training in a background thread, or return the training that is already running."""
+        with cls._lock:
+            if cls._thread is not None and cls._thread.is_alive():
+                return dict(cls._state)
+            store = get_vector_store()
+            store.ensure_writable()
+            cls._state = {
+                "status": "running",
+                "index_type": index_type or store.index_type,
+                "started_at": datetime.now(timezone.utc),
+            }
+            cls._thread = threading.Thread(target=cls.run, args=(index_type,), name="index-training", daemon=True)
+            cls._thread.start()
+            return dict(cls._state)
+
+    @classmethod
+    def get(cls) -> Dict[str, Any]:
+        with cls._lock:
+            return dict(cls._state)
+
+    @classmethod
+    def run(cls, index_type: Optional[str] = None) -> None:
+        """Train the index in the calling thread and record the outcome."""
+        store = get_vector_store()
+        try:
+            store.train_index(index_type)
+            outcome = {"status": "completed", "vectors": store.ntotal}
+        except Exception as e:
+            logger.error(f"Training the vector index failed: {e}")
+            outcome = {"status": "failed", "error": str(e)}
+        with cls._lock:
+            cls._state = {**cls._state, **outcome, "finished_at": datetime.now(timezone.utc)}
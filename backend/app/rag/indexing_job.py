@@ -0,0 +1,256 @@
+import logging
+import os
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import func
+from backend.app.core.config import get_settings
+from backend.app.database.session import SessionLocal
+from backend.app.models.document import DocumentChunk
+from backend.app.models.indexing_job import IndexingJob
+from backend.app.rag.pipeline import RAGPipeline
+
+settings = get_settings()
+logger = logging.getLogger("ai_study_pal")
+
+# A job in one of these states belongs to the worker that claimed it
+ACTIVE_STATUSES = ("queued", "running")
+
+class IndexingJobService:
+    """
+    Indexes every unindexed document in the background.
+    Unindexed documents are selected with an anti-join and read in keyset pages of
+    INDEX_JOB_PAGE_SIZE IDs. Each page is spread over INDEX_JOB_WORKERS threads, so one document's
+    chunking, another's embedding requests and a third's FAISS insert overlap. After each page the
+    vector index is flushed and the checkpoint is committed. A job that was interrupted or failed
+    is resumed by the next `start`: the unfinished page is cleaned up and every document that is
+    still unindexed, including earlier failures, is picked up.
+    Workers claim a job in the database and renew the claim with a heartbeat, so only one worker
+    runs it at a time; a job whose heartbeat stops is taken over after INDEX_JOB_LEASE_SECONDS.
+    """
+    _lock = threading.Lock()
+    _thread: Optional[threading.Thread] = None
+    _job_id: Optional[int] = None
+
+    @classmethod
+    def start(cls, db: Session) -> IndexingJob:
+        """
+        Start (or resume) the indexing job in a background thread. If this or another worker is
+        already running one, that job is returned instead of starting another.
+        """
+        with cls._lock:
+            if cls._thread is not None and cls._thread.is_alive():
+                return db.get(IndexingJob, cls._job_id)
+            job = cls.create_or_resume(db)
+            if job.worker_id != cls.worker_id():
+                return job
+            cls._job_id = job.id
+            cls._thread = threading.Thread(target=cls.run, args=(job.id,), name=f"indexing-job-{job.id}", daemon=True)
+            cls._thread.start()
+            return job
+
+    @classmethod
+    def create_or_resume(cls, db: Session) -> IndexingJob:
+        """
+        Claim the most recent job if it never completed, otherwise create and claim a new one. A resumed
+        job scans again from the first document, so documents that failed before are retried; indexed
+        documents drop out of the anti-join and cost nothing. If another worker holds the job, it is
+        returned unclaimed: check `worker_id` against `worker_id()` before running it.
+        """
+        now = cls._now()
+        claim = {"status": "queued", "worker_id": cls.worker_id(), "heartbeat_at": now}
+        job = db.query(IndexingJob).order_by(IndexingJob.id.desc()).first()
+        if job is not None and job.status != "completed":
+            # The WHERE clause makes the claim atomic: of two workers resuming at once, one updates the row
+            claimed = db.query(IndexingJob).filter(IndexingJob.id == job.id, cls._claimable(now)).update(
+                {**claim, "error": None, "finished_at": None}, synchronize_session=False
+            )
+            db.commit()
+            db.refresh(job)
+            if claimed:
+                logger.info(f"Resuming indexing job {job.id}.")
+            else:
+                logger.info(f"Indexing job {job.id} is being run by worker {job.worker_id}.")
+            return job
+
+        job = IndexingJob(total_documents=RAGPipeline(db).count_unindexed_documents(), **claim)
+        db.add(job)
+        db.commit()
+        # Two workers may have created a job at once; the older one is kept
+        older = db.query(IndexingJob).filter(
+            IndexingJob.id < job.id,
+            IndexingJob.status.in_(ACTIVE_STATUSES),
+            IndexingJob.heartbeat_at >= now - cls._lease()
+        ).order_by(IndexingJob.id).first()
+        if older is not None:
+            db.delete(job)
+            db.commit()
+            logger.info(f"Indexing job {older.id} is being run by worker {older.worker_id}.")
+            return older
+        db.refresh(job)
+        return job
+
+    @classmethod
+    def worker_id(cls) -> str:
+        """Identifies this process in the claims it holds on job rows."""
+        return f"{socket.gethostname()}:{os.getpid()}"
+
+    @staticmethod
+    def _now() -> datetime:
+        return datetime.now(timezone.utc)
+
+    @staticmethod
+    def _lease() -> timedelta:
+        return timedelta(seconds=settings.INDEX_JOB_LEASE_SECONDS)
+
+    @classmethod
+    def _claimable(cls, now: datetime):
+        """Jobs this worker may claim: not held, already its own, or held by a worker that stopped renewing."""
+        return or_(
+            IndexingJob.status.notin_(ACTIVE_STATUSES),
+            IndexingJob.worker_id == cls.worker_id(),
+            IndexingJob.heartbeat_at.is_(None),
+            IndexingJob.heartbeat_at < now - cls._lease()
+        )
+
+    @classmethod
+    def get(cls, db: Session, job_id: int) -> Optional[IndexingJob]:
+        return db.get(IndexingJob, job_id)
+
+    @classmethod
+    def run(cls, job_id: int) -> None:
+        """Run a job claimed by this worker to completion in the calling thread."""
+        stop, lost = threading.Event(), threading.Event()
+        heartbeat = threading.Thread(
+            target=cls._heartbeat, args=(job_id, stop, lost), name=f"indexing-job-{job_id}-heartbeat", daemon=True
+        )
+        heartbeat.start()
+        db = SessionLocal()
+        try:
+            job = db.get(IndexingJob, job_id)
+            if job is None:
+                logger.error(f"Indexing job {job_id} not found.")
+                return
+            try:
+                if not cls._run(db, job, lost):
+                    db.rollback()
+                    logger.warning(f"Indexing job {job_id} was taken over by another worker. Stopping.")
+                    return
+                job.status = "completed"
+            except Exception as e:
+                db.rollback()
+                logger.error(f"Indexing job {job_id} failed: {e}")
+                job.status = "failed"
+                job.error = str(e)
+            job.finished_at = func.now()
+            db.commit()
+        except Exception as e:
+            # The job row could not be updated; it still reads 'running' and is resumed by the next start
+            db.rollback()
+            logger.error(f"Indexing job {job_id} could not record its final status: {e}")
+        finally:
+            db.close()
+            stop.set()
+            heartbeat.join()
+
+    @classmethod
+    def _heartbeat(cls, job_id: int, stop: threading.Event, lost: threading.Event) -> None:
+        """Renew this worker's claim on the job until `stop` is set. Sets `lost` if another worker took it over."""
+        while not stop.wait(settings.INDEX_JOB_LEASE_SECONDS / 3):
+            db = SessionLocal()
+            try:
+                renewed = db.query(IndexingJob).filter(
+                    IndexingJob.id == job_id, IndexingJob.worker_id == cls.worker_id()
+                ).update({"heartbeat_at": cls._now()}, synchronize_session=False)
+                db.commit()
+                if not renewed:
+                    lost.set()
+                    return
+            except Exception as e:
+                # A missed beat is retried; the lease outlasts several of them
+                db.rollback()
+                logger.warning(f"Indexing job {job_id} could not renew its claim: {e}")
+            finally:
+                db.close()
+
+    @classmethod
+    def _run(cls, db: Session, job: IndexingJob, lost: threading.Event) -> bool:
+        """Index every unindexed document. Returns False if another worker took the job over meanwhile."""
+        pipeline = RAGPipeline(db)
+        pipeline.vector_store.ensure_writable()
+        cls._discard_partial_page(pipeline, job)
+        # Start over from the first document: failures of an earlier run are retried and recounted
+        job.status = "running"
+        job.checkpoint_document_id = 0
+        job.failed_documents = 0
+        job.total_documents = job.indexed_documents + pipeline.count_unindexed_documents()
+        db.commit()
+
+        with ThreadPoolExecutor(max_workers=max(1, settings.INDEX_JOB_WORKERS), thread_name_prefix=f"indexing-job-{job.id}") as executor:
+            while True:
+                if lost.is_set():
+                    return False
+                document_ids = pipeline.unindexed_document_ids(after_id=job.checkpoint_document_id, limit=settings.INDEX_JOB_PAGE_SIZE)
+                if not document_ids:
+                    break
+                # Record the page first, so a crash mid-page can be cleaned up on resume
+                job.page_document_ids = document_ids
+                db.commit()
+
+                with pipeline.vector_store.deferred_writes():
+                    results = list(executor.map(cls._index_document, document_ids))
+                # Vectors must be on disk before the checkpoint says their documents are done
+                pipeline.vector_store.flush()
+                if lost.is_set():
+                    return False
+
+                job.indexed_documents += sum(results)
+                job.failed_documents += len(results) - sum(results)
+                job.checkpoint_document_id = document_ids[-1]
+                job.page_document_ids = None
+                db.commit()
+                logger.info(f"Indexing job {job.id}: {job.indexed_documents + job.failed_documents}/{job.total_documents} documents.")
+
+        job.total_documents = max(job.total_documents, job.indexed_documents + job.failed_documents)
+        return True
+
+    @classmethod
+    def _discard_partial_page(cls, pipeline: RAGPipeline, job: IndexingJob) -> None:
+        """Remove chunks of the documents the job was indexing when it stopped, so they are indexed again."""
+        if not job.page_document_ids:
+            return
+        document_ids = [document_id for (document_id,) in pipeline.db.query(DocumentChunk.document_id).filter(
+            DocumentChunk.document_id.in_(job.page_document_ids)
+        ).distinct()]
+        for document_id in document_ids:
+            pipeline.remove_document_chunks(document_id)
+        job.page_document_ids = None
+        pipeline.db.commit()
+        if document_ids:
+            logger.info(f"Indexing job {job.id}: re-indexing {len(document_ids)} documents from the interrupted page.")
+
+    @classmethod
+    def _index_document(cls, document_id: int) -> bool:
+        """Index one document in its own session. A failed document is left unindexed for the next job."""
+        db = SessionLocal()
+        try:
+            pipeline = RAGPipeline(db)
+            try:
+                pipeline.index_document(document_id)
+                return True
+            except Exception as e:
+                db.rollback()
+                logger.error(f"Failed to index Document {document_id}: {e}")
+                try:
+                    # index_document commits chunk batches as it goes; don't leave the document half indexed
+                    pipeline.remove_document_chunks(document_id)
+                except Exception as cleanup_error:
+                    db.rollback()
+                    logger.error(f"Failed to remove partial chunks of Document {document_id}: {cleanup_error}")
+                return False
+        finally:
+            db.close()
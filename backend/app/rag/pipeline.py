@@ -1,40 +1,48 @@
 import logging
-from typing import List
+import math
+import numpy as np
+from itertools import islice
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
+from sqlalchemy import exists, insert
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from backend.app.core.cache import LRUCache
 from backend.app.core.config import get_settings
 from backend.app.embeddings.service import EmbeddingService
 from backend.app.ai.llm_service import LLMService
-from backend.app.rag.vector_store import FAISSStore
+from backend.app.database.session import SessionLocal
+from backend.app.rag.chunking import iter_chunks, strategy_for
+from backend.app.rag.vector_store import get_vector_store
 from backend.app.models.document import Document, DocumentChunk
 
 settings = get_settings()
 logger = logging.getLogger("ai_study_pal")
 
+NO_CONTEXT_ANSWER = "I couldn't find any relevant information in your study materials."
+
+# (document_id, text) of retrieved chunks by chunk ID. Chunk rows are never updated, only deleted.
+chunk_cache = LRUCache(max_size=settings.CHUNK_CACHE_MAX_SIZE, ttl_seconds=settings.CHUNK_CACHE_TTL_SECONDS)
+
 class RAGPipeline:
     def __init__(self, db: Session):
         self.db = db
-        self.vector_store = FAISSStore()
+        self.vector_store = get_vector_store()
         self.embedding_service = EmbeddingService()
         self.llm_service = LLMService()
 
-    def _chunk_text(self, text: str, chunk_size: int = settings.CHUNK_SIZE, overlap: int = settings.CHUNK_OVERLAP) -> List[str]:
-        """Simple overlap chunking mechanism."""
-        if not text:
-            return []
-        chunks = []
-        start = 0
-        while start < len(text):
-            end = start + chunk_size
-            chunks.append(text[start:end])
-            if end >= len(text):
-                break
-            start = end - overlap
-        return chunks
+    def _chunk_text(self, text: str, filename: Optional[str] = None) -> Iterator[str]:
+        """Lazily split text into sentence/paragraph-aligned chunks, using the strategy for the document's file type."""
+        return iter_chunks(text, strategy_for(filename))
 
     def index_document(self, document_id: int):
         """
         Chunks a document, saves chunks to DB, and indexes them in FAISS.
+        Chunks are produced lazily and handled CHUNK_INDEX_BATCH_SIZE at a time, so large documents
+        never hold all chunk texts and embeddings in memory at once.
         """
+        # Fail before writing chunk rows, or the document would look indexed without any vectors.
+        self.vector_store.ensure_writable()
+
         doc = self.db.query(Document).filter(Document.id == document_id).first()
         if not doc or not doc.content:
             logger.warning(f"Document {document_id} not found or empty.")
@@ -46,67 +54,322 @@ class RAGPipeline:
             logger.info(f"Document {document_id} is already chunked. Skipping indexing.")
             return
 
-        # 1. Chunk text
-        texts = self._chunk_text(doc.content)
-        if not texts:
-            return
+        shard_key = self._shard_key(doc.id, doc.subject or "")
+        chunks = self._chunk_text(doc.content, doc.title)
+        total = 0
+        while True:
+            texts = list(islice(chunks, max(1, settings.CHUNK_INDEX_BATCH_SIZE)))
+            if not texts:
+                break
+
+            # 1. Save chunks to DB
+            chunk_ids = self._insert_chunks(document_id, texts, start_index=total)
+            self.db.commit()
+
+            # 2. Generate embeddings
+            embeddings = self.embedding_service.generate_embeddings(texts)
+
+            # 3. Add to Vector Store
+            self.vector_store.add_embeddings(embeddings, chunk_ids, shard_key=shard_key)
+            total += len(texts)
+
+        if total:
+            logger.info(f"Successfully indexed Document {document_id} in FAISS ({total} chunks).")
+
+    def _insert_chunks(self, document_id: int, texts: List[str], start_index: int = 0) -> List[int]:
+        """
+        Bulk insert chunk rows and return their IDs in the order of `texts`, in two statements:
+        one executemany INSERT and one SELECT of the new IDs by (document_id, chunk_index).
+        This replaces an add + refresh round trip per chunk. INSERT ... RETURNING is not used
+        because SQLite cannot order its returned IDs and SQLAlchemy then inserts row by row.
+        """
+        rows = [
+            {"document_id": document_id, "chunk_index": i, "text": text}
+            for i, text in enumerate(texts, start=start_index)
+        ]
+        self.db.execute(insert(DocumentChunk), rows)
+        chunk_ids = [chunk_id for (chunk_id,) in self.db.query(DocumentChunk.id).filter(
+            DocumentChunk.document_id == document_id,
+            DocumentChunk.chunk_index >= start_index,
+            DocumentChunk.chunk_index < start_index + len(texts)
+        ).order_by(DocumentChunk.chunk_index)]
+        if len(chunk_ids) != len(texts):
+            # Another process indexed the same document concurrently
+            raise RuntimeError(f"Document {document_id} has duplicate chunks; expected {len(texts)} new rows, found {len(chunk_ids)}.")
+        return chunk_ids
+
+    def remove_document_chunks(self, document_id: int) -> int:
+        """
+        Remove a document's chunks from the vector index and the database.
+        Returns the number of chunks removed.
+        """
+        chunk_ids = [chunk_id for (chunk_id,) in
+                     self.db.query(DocumentChunk.id).filter(DocumentChunk.document_id == document_id)]
+        if not chunk_ids:
+            return 0
+
+        # Rows first: if the commit fails the document stays fully indexed. If removing the vectors
+        # fails afterwards, they are orphans that remove_orphaned_vectors() drops.
+        self.db.query(DocumentChunk).filter(DocumentChunk.document_id == document_id).delete(synchronize_session=False)
+        self.db.commit()
+        for chunk_id in chunk_ids:
+            chunk_cache.discard(chunk_id)
+        if self.vector_store.read_only:
+            # Chunk IDs are never reused, so the writer process can drop these later with remove_orphaned_vectors().
+            logger.info(f"Vector index is read-only here; leaving {len(chunk_ids)} vectors for the writer to remove.")
+        else:
+            self.vector_store.remove_ids(chunk_ids)
+        logger.info(f"Removed {len(chunk_ids)} chunks of Document {document_id} from the index.")
+        return len(chunk_ids)
+
+    def remove_orphaned_vectors(self) -> int:
+        """
+        Remove vectors whose chunks no longer exist in the database, e.g. documents deleted by a read-only
+        worker, or a process that stopped between deleting chunk rows and removing their vectors.
+        Returns the number of vectors removed.
+        """
+        chunk_ids = np.array([chunk_id for (chunk_id,) in self.db.query(DocumentChunk.id)], dtype='int64')
+        orphans = np.setdiff1d(self.vector_store.stored_ids(), chunk_ids)
+        if len(orphans):
+            self.vector_store.remove_ids(orphans.tolist())
+            logger.info(f"Removed {len(orphans)} orphaned vectors from the index.")
+        return len(orphans)
+
+    def restore_missing_vectors(self) -> int:
+        """
+        Re-embed chunks that have a database row but no vector, the inverse of remove_orphaned_vectors().
+        Rebuilds the index after a legacy index file was discarded or VECTOR_NUM_SHARDS changed, which
+        the anti-join cannot notice because the documents still have their chunk rows.
+        Returns the number of vectors restored.
+        """
+        self.vector_store.ensure_writable()
+        chunk_ids = np.array([chunk_id for (chunk_id,) in self.db.query(DocumentChunk.id)], dtype='int64')
+        missing = np.setdiff1d(chunk_ids, self.vector_store.stored_ids())
+        if not len(missing):
+            return 0
+        logger.info(f"Restoring {len(missing)} vectors missing from the index.")
+
+        restored = 0
+        batch_size = max(1, settings.CHUNK_INDEX_BATCH_SIZE)
+        page_size = max(batch_size, settings.VECTOR_FLUSH_MAX_PENDING)
+        for page_start in range(0, len(missing), page_size):
+            # One index write per page rather than per batch
+            with self.vector_store.deferred_writes():
+                for start in range(page_start, min(page_start + page_size, len(missing)), batch_size):
+                    restored += self._restore_vectors(missing[start:start + batch_size].tolist())
+        logger.info(f"Restored {restored} vectors.")
+        return restored
+
+    def _restore_vectors(self, chunk_ids: List[int]) -> int:
+        rows = self.db.query(DocumentChunk.id, DocumentChunk.document_id, DocumentChunk.text, Document.subject).join(
+            Document, DocumentChunk.document_id == Document.id
+        ).filter(DocumentChunk.id.in_(chunk_ids)).all()
+        if not rows:
+            return 0
+        embeddings = self.embedding_service.generate_embeddings([text for _, _, text, _ in rows])
+        by_shard: Dict[Any, Tuple[List[List[float]], List[int]]] = {}
+        for (chunk_id, document_id, _, subject), embedding in zip(rows, embeddings):
+            vectors, ids = by_shard.setdefault(self._shard_key(document_id, subject or ""), ([], []))
+            vectors.append(embedding)
+            ids.append(chunk_id)
+        for shard_key, (vectors, ids) in by_shard.items():
+            # Upsert: another worker may be restoring the same chunks
+            self.vector_store.upsert_embeddings(vectors, ids, shard_key=shard_key)
+        return len(rows)
+
+    def reindex_document(self, document_id: int):
+        """Replace a document's chunks and vectors after its content changed."""
+        self.remove_document_chunks(document_id)
+        self.index_document(document_id)
 
-        logger.info(f"Chunked Document {document_id} into {len(texts)} chunks.")
-
-        # 2. Save chunks to DB
-        db_chunks = []
-        for i, chunk_text in enumerate(texts):
-            db_chunk = DocumentChunk(
-                document_id=document_id,
-                chunk_index=i,
-                text=chunk_text
-            )
-            self.db.add(db_chunk)
-            db_chunks.append(db_chunk)
-            
+    def delete_document(self, document_id: int) -> bool:
+        """Delete a document together with its chunks and their vectors."""
+        doc = self.db.query(Document).filter(Document.id == document_id).first()
+        if not doc:
+            return False
+        self.remove_document_chunks(document_id)
+        self.db.delete(doc)
         self.db.commit()
-        for chunk in db_chunks:
-            self.db.refresh(chunk)
+        return True
+
+    def _unindexed_documents(self):
+        # Anti-join: documents without any chunk row
+        return self.db.query(Document.id).filter(~exists().where(DocumentChunk.document_id == Document.id))
 
-        # 3. Generate embeddings
-        # Batch generation can be done, but for safety with public APIs, we'll do smaller batches or all at once if small
-        logger.info(f"Generating embeddings for Document {document_id}")
-        embeddings = self.embedding_service.generate_embeddings(texts)
+    def unindexed_document_ids(self, after_id: int = 0, limit: int = settings.INDEX_JOB_PAGE_SIZE) -> List[int]:
+        """One keyset page of unindexed document IDs greater than `after_id`, in ascending order."""
+        query = self._unindexed_documents().filter(Document.id > after_id).order_by(Document.id).limit(limit)
+        return [document_id for (document_id,) in query]
 
-        # 4. Add to Vector Store
-        chunk_ids = [c.id for c in db_chunks]
-        self.vector_store.add_embeddings(embeddings, chunk_ids)
-        logger.info(f"Successfully indexed Document {document_id} in FAISS.")
+    def count_unindexed_documents(self, after_id: int = 0) -> int:
+        return self._unindexed_documents().filter(Document.id > after_id).count()
 
     def index_all_unindexed_documents(self):
-        """Index all documents that don't have chunks yet."""
-        docs = self.db.query(Document).all()
-        for doc in docs:
-            self.index_document(doc.id)
+        """
+        Index all documents that don't have chunks yet, serially in this session.
+        The API runs the parallel, resumable IndexingJobService instead.
+        """
+        after_id = 0
+        # Write the index once at the end instead of once per document
+        with self.vector_store.deferred_writes():
+            while True:
+                document_ids = self.unindexed_document_ids(after_id)
+                if not document_ids:
+                    break
+                for document_id in document_ids:
+                    self.index_document(document_id)
+                after_id = document_ids[-1]
+
+    def _shard_key(self, document_id: Optional[int], subject: Optional[str]):
+        """The key the vector store shards by (see VECTOR_SHARD_BY), or None if it is not known."""
+        if settings.VECTOR_SHARD_BY == "subject":
+            return subject
+        return document_id
+
+    def _filtered_chunks(self, document_id: Optional[int], subject: Optional[str]):
+        query = self.db.query(DocumentChunk.id)
+        if document_id is not None:
+            query = query.filter(DocumentChunk.document_id == document_id)
+        if subject is not None:
+            query = query.join(Document, DocumentChunk.document_id == Document.id).filter(Document.subject == subject)
+        return query
+
+    def _allowed_chunk_ids(self, document_id: Optional[int] = None, subject: Optional[str] = None) -> Optional[List[int]]:
+        """
+        Resolve retrieval filters to the chunk IDs they allow, or None when the search is unfiltered or
+        the filter matches more than RETRIEVAL_FILTER_MAX_IDS chunks. Such broad filters are applied
+        to the hits of a wider search instead (see _search).
+        """
+        if document_id is None and subject is None:
+            return None
+        limit = settings.RETRIEVAL_FILTER_MAX_IDS
+        chunk_ids = [chunk_id for (chunk_id,) in self._filtered_chunks(document_id, subject).limit(limit + 1)]
+        return None if len(chunk_ids) > limit else chunk_ids
 
-    def answer_question(self, query: str) -> str:
+    def _search(
+        self,
+        query_embeddings: np.ndarray,
+        top_k: int,
+        document_id: Optional[int],
+        subject: Optional[str],
+        allowed_ids: Optional[List[int]]
+    ) -> Tuple[np.ndarray, np.ndarray]:
         """
-        Answer a question using RAG.
+        Search the vector store for the top_k chunks of each query that pass the filters. Returns
+        (chunk_ids, distances) like the store's search_batch.
         """
+        shard_key = self._shard_key(document_id, subject)
+        if allowed_ids is not None or (document_id is None and subject is None):
+            return self.vector_store.search_batch(query_embeddings, top_k=top_k, allowed_ids=allowed_ids, shard_key=shard_key)
+
+        # Too many chunks to pass as IDs: over-fetch by the share of the index the filter keeps
+        total = self.vector_store.ntotal
+        matching = max(1, self._filtered_chunks(document_id, subject).count())
+        fetch_k = max(top_k, min(total, math.ceil(2 * top_k * total / matching)))
+        chunk_ids, distances = self.vector_store.search_batch(query_embeddings, top_k=fetch_k, shard_key=shard_key)
+
+        documents = self.db.query(Document.id)
+        if document_id is not None:
+            documents = documents.filter(Document.id == document_id)
+        if subject is not None:
+            documents = documents.filter(Document.subject == subject)
+        documents = {doc_id for (doc_id,) in documents}
+        chunks = self._fetch_chunks(np.unique(chunk_ids[chunk_ids != -1]).tolist())
+        keep = np.array([
+            [chunk_id in chunks and chunks[chunk_id][0] in documents for chunk_id in row]
+            for row in chunk_ids.tolist()
+        ], dtype=bool).reshape(chunk_ids.shape)
+        # Kept hits first, in rank order
+        order = np.argsort(~keep, axis=1, kind="stable")[:, :top_k]
+        return (
+            np.take_along_axis(np.where(keep, chunk_ids, -1), order, axis=1),
+            np.take_along_axis(np.where(keep, distances, np.inf), order, axis=1)
+        )
+
+    def _fetch_chunks(self, chunk_ids: List[int]) -> Dict[int, Tuple[int, str]]:
+        """
+        Look up (document_id, text) for chunk IDs: from chunk_cache, then one IN query for the rest.
+        IDs whose chunks no longer exist are left out.
+        """
+        chunks = {}
+        missing = []
+        for chunk_id in dict.fromkeys(chunk_ids):
+            cached = chunk_cache.get(chunk_id)
+            if cached is not None:
+                chunks[chunk_id] = cached
+            else:
+                missing.append(chunk_id)
+        if missing:
+            rows = self.db.query(DocumentChunk.id, DocumentChunk.document_id, DocumentChunk.text).filter(DocumentChunk.id.in_(missing))
+            for chunk_id, document_id, text in rows:
+                chunks[chunk_id] = (document_id, text)
+                chunk_cache.set(chunk_id, (document_id, text))
+        return chunks
+
+    def retrieve_batch(
+        self,
+        queries: List[str],
+        top_k: int = settings.TOP_K_RETRIEVAL,
+        document_id: Optional[int] = None,
+        subject: Optional[str] = None
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Retrieval-only search for many queries at once: one embedding request, one FAISS search
+        and one chunk lookup for the whole batch. Returns the ranked hits for each query.
+        """
+        if not queries:
+            return []
+
+        allowed_ids = self._allowed_chunk_ids(document_id, subject)
+        query_embeddings = np.array(self.embedding_service.generate_embeddings(queries), dtype='float32')
+        chunk_ids, distances = self._search(query_embeddings, top_k, document_id, subject, allowed_ids)
+
+        chunks = self._fetch_chunks(np.unique(chunk_ids[chunk_ids != -1]).tolist())
+
+        results = []
+        for row_ids, row_distances in zip(chunk_ids.tolist(), distances.tolist()):
+            hits = []
+            for chunk_id, distance in zip(row_ids, row_distances):
+                chunk = chunks.get(chunk_id)
+                if chunk is not None:
+                    hits.append({
+                        "chunk_id": chunk_id,
+                        "document_id": chunk[0],
+                        "score": distance,
+                        "text": chunk[1]
+                    })
+            results.append(hits)
+        return results
+
+    def retrieve_context(
+        self,
+        query: str,
+        top_k: int = settings.TOP_K_RETRIEVAL,
+        document_id: Optional[int] = None,
+        subject: Optional[str] = None
+    ) -> List[str]:
+        """
+        Retrieve the texts of the top_k chunks most relevant to the query, optionally restricted
+        to one document and/or one subject.
+        """
+        allowed_ids = self._allowed_chunk_ids(document_id, subject)
+        if allowed_ids is not None and not allowed_ids:
+            return []
+
         # 1. Embed query
         query_embedding = self.embedding_service.generate_embedding(query)
-        
+
         # 2. Retrieve top-k chunks from FAISS
-        results = self.vector_store.search(query_embedding, top_k=settings.TOP_K_RETRIEVAL)
-        if not results:
-            return "I couldn't find any relevant information in your study materials."
-            
-        # 3. Fetch context text from DB
-        context_texts = []
-        for chunk_id, score in results:
-            db_chunk = self.db.query(DocumentChunk).filter(DocumentChunk.id == chunk_id).first()
-            if db_chunk:
-                context_texts.append(db_chunk.text)
-            
+        chunk_ids, _ = self._search(np.array([query_embedding], dtype='float32'), top_k, document_id, subject, allowed_ids)
+        chunk_ids = [chunk_id for chunk_id in chunk_ids[0].tolist() if chunk_id != -1]
+
+        # 3. Fetch context texts (one query at most), keeping FAISS rank order
+        chunks = self._fetch_chunks(chunk_ids)
+        return [chunks[chunk_id][1] for chunk_id in chunk_ids if chunk_id in chunks]
+
+    def _answer_prompt(self, query: str, context_texts: List[str]) -> str:
         context_str = "\n\n---\n\n".join(context_texts)
-        
-        # 4. Build prompt and generate answer
-        prompt = (
+        return (
             f"You are AI Study Pal, an intelligent tutor.\n"
             f"Use the following pieces of retrieved context to answer the question.\n"
             f"If you don't know the answer, just say that you don't know. Don't make up information.\n\n"
@@ -114,7 +377,63 @@ class RAGPipeline:
             f"Question: {query}\n\n"
             f"Answer:"
         )
-        
+
+    def answer_question(self, query: str, document_id: Optional[int] = None, subject: Optional[str] = None) -> str:
+        """
+        Answer a question using RAG, optionally only over one document and/or one subject.
+        """
+        context_texts = self.retrieve_context(query, document_id=document_id, subject=subject)
+        if not context_texts:
+            return NO_CONTEXT_ANSWER
+
+        logger.info(f"Generating answer for query: {query}")
+        return self.llm_service.generate(self._answer_prompt(query, context_texts))
+
+    async def answer_question_async(self, query: str, document_id: Optional[int] = None, subject: Optional[str] = None) -> str:
+        """
+        Same as `answer_question` for async routes. Retrieval (embedding + vector search) is blocking
+        and runs in the threadpool; the LLM call is awaited.
+        """
+        context_texts = await run_in_threadpool(self.retrieve_context, query, document_id=document_id, subject=subject)
+        if not context_texts:
+            return NO_CONTEXT_ANSWER
+
         logger.info(f"Generating answer for query: {query}")
-        answer = self.llm_service.generate(prompt)
-        return answer
+        return await self.llm_service.generate_async(self._answer_prompt(query, context_texts))
+
+    async def stream_answer_async(
+        self,
+        query: str,
+        document_id: Optional[int] = None,
+        subject: Optional[str] = None
+    ) -> AsyncIterator[str]:
+        """
+        Streaming variant of `answer_question_async`: yields the answer token by token.
+        """
+        context_texts = await run_in_threadpool(self.retrieve_context, query, document_id=document_id, subject=subject)
+        if not context_texts:
+            yield NO_CONTEXT_ANSWER
+            return
+
+        logger.info(f"Streaming answer for query: {query}")
+        async for token in self.llm_service.stream_async(self._answer_prompt(query, context_texts)):
+            yield token
+
+def restore_vectors_if_index_empty() -> int:
+    """
+    Startup check for the writer: if the vector index is empty but chunk rows exist, re-embed them.
+    Returns the number of vectors restored.
+    """
+    db = SessionLocal()
+    try:
+        pipeline = RAGPipeline(db)
+        if pipeline.vector_store.read_only or pipeline.vector_store.ntotal:
+            return 0
+        if db.query(DocumentChunk.id).first() is None:
+            return 0
+        return pipeline.restore_missing_vectors()
+    except Exception as e:
+        logger.error(f"Failed to restore vectors missing from the index: {e}")
+        return 0
+    finally:
+        db.close()
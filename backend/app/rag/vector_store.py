@@ -1,79 +1,893 @@
 import os
+import math
+import atexit
 import faiss
 import numpy as np
 import logging
-from typing import List, Tuple
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, contextmanager
+from typing import List, Optional, Sequence, Set, Tuple, Union
+from backend.app.core.config import get_settings
+from backend.app.core.locks import ReadWriteLock
 
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process locking, run a single writer process
+    fcntl = None
+
+settings = get_settings()
 logger = logging.getLogger("ai_study_pal")
 
+# Supported values for Settings.VECTOR_INDEX_TYPE
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "hnsw", "sq8", "sq_fp16", "ivf_sq8")
+
+# Document ID or subject used to route vectors to a shard
+ShardKey = Optional[Union[int, str]]
+
 class FAISSStore:
     """
     Wrapper around FAISS for efficient similarity search of document chunks.
+    Vectors are stored in an ID-mapped index keyed directly on DocumentChunk.id,
+    so the chunk mapping is persisted inside the index file itself.
+
+    A store is safe to share across threads: searches run concurrently under a read lock,
+    while additions and reloads take the write lock.
+
+    Several processes may write the same index file. Each save takes an exclusive lock on
+    `<index>.lock`; if another process replaced the file since this store last read it, the file is
+    reloaded and this store's unsaved changes are replayed onto it before it is written back.
+
+    With write-behind enabled, additions are kept in memory and written to disk once
+    VECTOR_FLUSH_MAX_PENDING vectors accumulate, VECTOR_FLUSH_INTERVAL_SECONDS pass, or flush() is called.
+
+    Removed chunk IDs are tombstoned rather than deleted in place: searches exclude them through an
+    ID selector, and the index is compacted in the background once the dead fraction reaches
+    VECTOR_COMPACTION_THRESHOLD. Tombstones are persisted next to the index file.
+
+    With `mmap` enabled (VECTOR_INDEX_MMAP) the index file is opened read-only and memory-mapped, so
+    several worker processes share its pages through the OS page cache. Such a store rejects writes;
+    a single writer process owns the file and readers pick up its changes through hot reload.
     """
-    def __init__(self, dimension: int = 384, index_path: str = "faiss_index.bin"):
+    def __init__(
+        self,
+        dimension: int = 384,
+        index_path: str = "faiss_index.bin",
+        index_type: Optional[str] = None,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None,
+        write_behind: Optional[bool] = None,
+        mmap: Optional[bool] = None
+    ):
         self.dimension = dimension
         self.index_path = index_path
-        self.index = self._load_or_create_index()
-        # Mapping from FAISS ID (integer) to Document/Chunk ID
-        self.id_mapping = {} 
+        self.index_type = index_type or settings.VECTOR_INDEX_TYPE
+        if self.index_type not in INDEX_TYPES:
+            raise ValueError(f"Unknown vector index type '{self.index_type}'. Expected one of {INDEX_TYPES}.")
+        self.nprobe = nprobe or settings.VECTOR_IVF_NPROBE
+        self.ef_search = ef_search or settings.VECTOR_HNSW_EF_SEARCH
+        self.write_behind = settings.VECTOR_WRITE_BEHIND if write_behind is None else write_behind
+        self.mmap = settings.VECTOR_INDEX_MMAP if mmap is None else mmap
+        self._lock = ReadWriteLock()
+        self._file_signature = None
+        self._pending = 0
+        self._deferrals = 0
+        self._flush_timer: Optional[threading.Timer] = None
+        self._tombstones: Set[int] = set()
+        self._tombstone_selector = None
+        # Changes not yet written to the file, replayed if another process replaces it:
+        # ("add", vectors, ids, replace_existing) or ("remove", ids)
+        self._journal: List[tuple] = []
+        # Bumped whenever stored vectors change position, so an in-flight compaction knows to give up.
+        self._generation = 0
+        # Empty, trained copy of the inner index that rebuilds start from (see _empty_copy)
+        self._template = None
+        self._compaction_lock = threading.Lock()
+        if os.path.exists(self.index_path):
+            # Shared: read the index and its tombstones as one pair, not across another writer's save.
+            with self._file_locked(exclusive=False):
+                self.index = self._load_or_create_index()
+        else:
+            self.index = self._load_or_create_index()
+
+    def _factory_string(self, index_type: str) -> str:
+        # IDMap2 stores the 64-bit chunk IDs next to the vectors and supports reconstruct() by ID.
+        if index_type == "ivf_flat":
+            return f"IDMap2,IVF{settings.VECTOR_IVF_NLIST},Flat"
+        if index_type == "ivf_pq":
+            return f"IDMap2,IVF{settings.VECTOR_IVF_NLIST},PQ{settings.VECTOR_PQ_M}"
+        if index_type == "hnsw":
+            return f"IDMap2,HNSW{settings.VECTOR_HNSW_M}"
+        # Scalar quantizers store each dimension as 1 byte (SQ8) or 2 bytes (fp16) instead of 4.
+        if index_type == "sq8":
+            return "IDMap2,SQ8"
+        if index_type == "sq_fp16":
+            return "IDMap2,SQfp16"
+        if index_type == "ivf_sq8":
+            return f"IDMap2,IVF{settings.VECTOR_IVF_NLIST},SQ8"
+        return "IDMap2,Flat"
+
+    def _build_index(self, index_type: str):
+        # L2 distance (Euclidean). For cosine similarity, vectors should be normalized before adding.
+        return faiss.index_factory(self.dimension, self._factory_string(index_type))
+
+    def _create_index(self):
+        index = self._build_index(self.index_type)
+        if not index.is_trained:
+            # IVF and SQ8 quantizers are learned from data, so collect vectors in a flat index until train_index() runs.
+            logger.info(f"Index type '{self.index_type}' needs training. Starting with a flat index.")
+            index = self._build_index("flat")
+        return index
+
+    def _index_kind(self) -> str:
+        """Classify the wrapped index as 'ivf', 'hnsw' or 'flat' to pick its query-time parameters."""
+        inner = faiss.downcast_index(self.index.index)
+        if isinstance(inner, faiss.IndexIVF):
+            return "ivf"
+        if isinstance(inner, faiss.IndexHNSW):
+            return "hnsw"
+        return "flat"
+
+    def _search_params(
+        self,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None,
+        allowed_ids: Optional[Sequence[int]] = None
+    ):
+        # Tombstoned IDs are skipped inside FAISS, so they never take up top-k slots.
+        sel = self._tombstone_selector[1] if self._tombstone_selector else None
+        if allowed_ids is not None:
+            # Restrict the search to a subset (e.g. one document's chunks) inside FAISS itself.
+            allowed = faiss.IDSelectorBatch(np.asarray(allowed_ids, dtype='int64'))
+            sel = allowed if sel is None else faiss.IDSelectorAnd(allowed, sel)
+        kind = self._index_kind()
+        # A filter keeps only some of the vectors the probed lists / visited nodes hold, so widen the
+        # search by the share it filters out, or a small subset would come back with too few hits.
+        scale = 1.0
+        if allowed_ids is not None:
+            scale = max(1.0, self.index.ntotal / max(1, len(allowed_ids)))
+        if kind == "ivf":
+            nprobe = nprobe or self.nprobe
+            nlist = faiss.extract_index_ivf(self.index.index).nlist
+            return faiss.SearchParametersIVF(sel=sel, nprobe=max(nprobe, min(nlist, math.ceil(nprobe * scale))))
+        if kind == "hnsw":
+            ef_search = ef_search or self.ef_search
+            return faiss.SearchParametersHNSW(sel=sel, efSearch=max(ef_search, min(self.index.ntotal, math.ceil(ef_search * scale))))
+        if sel is not None:
+            return faiss.SearchParameters(sel=sel)
+        return None
+
+    def _export_vectors(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Read every stored vector and its chunk ID back out of the index."""
+        ids = faiss.vector_to_array(self.index.id_map).astype('int64')
+        if self.index.ntotal == 0:
+            return np.empty((0, self.dimension), dtype='float32'), ids
+        if self._index_kind() == "ivf":
+            ivf = faiss.extract_index_ivf(self.index.index)
+            if ivf.direct_map.no():
+                ivf.make_direct_map()
+        vectors = self.index.index.reconstruct_n(0, self.index.ntotal)
+        return vectors, ids
+
+    def train_index(self, index_type: Optional[str] = None):
+        """
+        Rebuild the index as `index_type` (default: the configured type), training it on the vectors
+        already stored. For lossy types (PQ, SQ) the training data is itself the reconstructed approximation.
+        Like compaction, training runs against a snapshot while searches continue and only the swap takes
+        the write lock. Raises RuntimeError if the index was rebuilt or reloaded in the meantime.
+        """
+        index_type = index_type or self.index_type
+        self.ensure_writable()
+        self.reload_if_changed()
+        with self._compaction_lock:
+            with self._lock.read_locked():
+                snapshot = self._snapshot()
+            index, template = self._build_trained_index(index_type, snapshot)
+            with self._lock.write_locked(), self._file_locked():
+                self._swap_index(index, template, index_type, snapshot)
+
+    def _snapshot(self) -> Tuple[int, np.ndarray, np.ndarray, np.ndarray]:
+        """(generation, tombstoned IDs, vectors, IDs) of everything stored. Caller holds a lock."""
+        vectors, ids = self._export_vectors()
+        return self._generation, self._tombstone_array(), vectors, ids
+
+    def _build_trained_index(self, index_type: str, snapshot: Tuple[int, np.ndarray, np.ndarray, np.ndarray]):
+        """
+        Build and fill a trained `index_type` index from the live vectors of a snapshot.
+        Returns the index and an empty copy of its trained inner index for later rebuilds.
+        """
+        _, dead, vectors, ids = snapshot
+        if len(dead):
+            live = ~np.isin(ids, dead)
+            vectors, ids = vectors[live], ids[live]
+        index = self._build_index(index_type)
+        if not index.is_trained:
+            min_vectors = self._min_training_vectors(index_type)
+            if len(vectors) < min_vectors:
+                raise ValueError(
+                    f"Index type '{index_type}' needs at least {min_vectors} vectors to train, "
+                    f"but only {len(vectors)} are stored."
+                )
+            sample = vectors
+            if len(vectors) > settings.VECTOR_TRAIN_SAMPLE_SIZE:
+                rng = np.random.default_rng(0)
+                sample = vectors[rng.choice(len(vectors), settings.VECTOR_TRAIN_SAMPLE_SIZE, replace=False)]
+            logger.info(f"Training '{index_type}' index on {len(sample)} vectors.")
+            index.train(sample)
+        if index_type.startswith("ivf"):
+            # Keep vectors reconstructable so later compactions and retrains can read them back.
+            faiss.extract_index_ivf(index.index).make_direct_map()
+        template = faiss.clone_index(index.index)
+        if len(vectors):
+            index.add_with_ids(vectors, ids)
+        return index, template
+
+    def _swap_index(self, index, template, index_type: str, snapshot: Tuple[int, np.ndarray, np.ndarray, np.ndarray]):
+        """Swap in an index trained from `snapshot`. Caller holds the write lock and the file lock."""
+        generation, dead, _, ids = snapshot
+        if not self._swap_rebuilt(index, generation, len(ids), dead):
+            raise RuntimeError(f"The FAISS index {self.index_path} changed while it was being trained. Please retry.")
+        self.index_type = index_type
+        self._template = template
+        logger.info(f"Rebuilt FAISS index as '{index_type}' with {self.index.ntotal} vectors.")
+
+    def _swap_rebuilt(self, index, generation: int, snapshot_size: int, dead: np.ndarray) -> bool:
+        """
+        Replace the index with one rebuilt from a snapshot, carrying over the vectors added since, and
+        persist it. Returns False, leaving the index alone, if it changed in any other way.
+        Caller holds the write lock and the file lock.
+        """
+        # A reload (another process saved) also bumps the generation
+        self._sync()
+        if self._generation != generation:
+            return False
+        added = self.index.ntotal - snapshot_size
+        if added:
+            # Additions append to the end of the index, after the snapshot.
+            new_ids = faiss.vector_to_array(self.index.id_map)[snapshot_size:].astype('int64')
+            index.add_with_ids(self.index.index.reconstruct_n(snapshot_size, added), new_ids)
+        self.index = index
+        self._set_tombstones(self._tombstones - set(dead.tolist()))
+        self._generation += 1
+        self._write()
+        return True
+
+    def _min_training_vectors(self, index_type: str) -> int:
+        if index_type == "sq8":
+            # SQ8 only learns a value range per dimension.
+            return settings.VECTOR_SQ_MIN_TRAINING_VECTORS
+        if index_type == "ivf_pq":
+            # Each PQ sub-quantizer learns 256 centroids.
+            return max(settings.VECTOR_IVF_NLIST, 256)
+        return settings.VECTOR_IVF_NLIST
+
+    def _read_file_signature(self) -> Optional[Tuple[int, int, int]]:
+        """Identify the on-disk index version; the atomic rename in save() always changes it."""
+        try:
+            stat = os.stat(self.index_path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+    @property
+    def tombstones_path(self) -> str:
+        return f"{self.index_path}.tombstones.npy"
+
+    def _tombstone_array(self) -> np.ndarray:
+        return np.fromiter(self._tombstones, dtype='int64', count=len(self._tombstones))
+
+    def _set_tombstones(self, tombstones: Set[int]):
+        self._tombstones = set(tombstones)
+        if self._tombstones:
+            dead = faiss.IDSelectorBatch(self._tombstone_array())
+            # Keep the inner selector referenced for as long as the negation that points at it
+            self._tombstone_selector = (dead, faiss.IDSelectorNot(dead))
+        else:
+            self._tombstone_selector = None
+
+    def _load_tombstones(self) -> Set[int]:
+        if not os.path.exists(self.tombstones_path):
+            return set()
+        return set(np.load(self.tombstones_path).tolist())
 
     def _load_or_create_index(self):
         if os.path.exists(self.index_path):
             try:
-                index = faiss.read_index(self.index_path)
-                logger.info(f"Loaded existing FAISS index with {index.ntotal} vectors.")
-                return index
+                signature = self._read_file_signature()
+                index = faiss.read_index(self.index_path, self._io_flags())
+                self._file_signature = signature
+                if isinstance(index, faiss.IndexIDMap):
+                    if self.mmap and not isinstance(faiss.downcast_index(index.index), faiss.IndexIVF):
+                        # FAISS only maps IVF inverted lists; other index types are read into process memory.
+                        logger.warning(
+                            f"Memory-mapped loading only shares pages for IVF indexes; "
+                            f"the '{self.index_type}' index at {self.index_path} was loaded into memory."
+                        )
+                    self._set_tombstones(self._load_tombstones())
+                    logger.info(
+                        f"Loaded existing FAISS index with {index.ntotal} vectors "
+                        f"({len(self._tombstones)} tombstoned)."
+                    )
+                    return index
+                # Indexes written before IDs were stored natively have no chunk mapping.
+                logger.warning(
+                    f"FAISS index at {self.index_path} has no chunk ID mapping "
+                    f"({index.ntotal} vectors discarded). It is rebuilt from the stored chunks at startup "
+                    f"or by `scripts/vector_index_writer.py restore-vectors`."
+                )
             except Exception as e:
                 logger.warning(f"Failed to load FAISS index: {e}. Creating new one.")
-        
-        # L2 distance (Euclidean). For cosine similarity, vectors should be normalized before adding.
-        index = faiss.IndexFlatL2(self.dimension)
-        return index
+
+        self._set_tombstones(set())
+        return self._create_index()
+
+    def _io_flags(self) -> int:
+        if self.mmap:
+            return faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY
+        return 0
+
+    @property
+    def read_only(self) -> bool:
+        return self.mmap
+
+    def ensure_writable(self):
+        if self.read_only:
+            raise RuntimeError(
+                f"The vector index {self.index_path} is memory-mapped read-only in this process. "
+                f"Run indexing in the writer process (VECTOR_INDEX_MMAP=false)."
+            )
+
+    @property
+    def ntotal(self) -> int:
+        return self.index.ntotal
+
+    def stored_ids(self) -> np.ndarray:
+        """Chunk IDs of all live (non-tombstoned) vectors."""
+        with self._lock.read_locked():
+            ids = faiss.vector_to_array(self.index.id_map).astype('int64')
+            if self._tombstones:
+                ids = ids[~np.isin(ids, self._tombstone_array())]
+        return ids
+
+    @property
+    def dead_fraction(self) -> float:
+        """Share of stored vectors that are tombstoned and waiting for compaction."""
+        if self.index.ntotal == 0:
+            return 0.0
+        return len(self._tombstones) / self.index.ntotal
+
+    def reload_if_changed(self) -> bool:
+        """
+        Reload the index if another process has replaced the file since we last read or wrote it.
+        Returns True if a reload happened.
+        """
+        signature = self._read_file_signature()
+        if signature is None or signature == self._file_signature:
+            return False
+
+        with self._lock.write_locked():
+            # Shared: no writer is halfway between replacing the tombstones and the index file.
+            # Unflushed changes are replayed onto the reloaded index, so none are lost.
+            with self._file_locked(exclusive=False):
+                return self._sync()
+
+    def _sync(self) -> bool:
+        """
+        Reload the file if another process replaced it and replay this store's unsaved changes onto it.
+        Caller holds the write lock and the file lock. Returns True if a reload happened.
+        """
+        signature = self._read_file_signature()
+        # Another thread may have reloaded while we were waiting for the lock.
+        if signature is None or signature == self._file_signature:
+            return False
+        logger.info(f"FAISS index file {self.index_path} changed on disk. Reloading.")
+        self.index = self._load_or_create_index()
+        self._template = None
+        self._generation += 1
+        for change in self._journal:
+            if change[0] == "add":
+                self._apply_add(*change[1:])
+            else:
+                self._apply_remove(change[1])
+        if self._journal:
+            logger.info(f"Replayed {len(self._journal)} unsaved changes onto the reloaded index.")
+        return True
+
+    @property
+    def lock_path(self) -> str:
+        return f"{self.index_path}.lock"
+
+    @contextmanager
+    def _file_locked(self, exclusive: bool = True):
+        """Lock the index files against other processes. Caller holds the write lock, or is still constructing the store."""
+        if fcntl is None:
+            yield
+            return
+        with open(self.lock_path, "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
 
     def save(self):
-        """Persist index to disk."""
-        faiss.write_index(self.index, self.index_path)
+        """
+        Persist the index, merging in whatever other processes saved since this store last read the
+        file. Caller holds the write lock.
+        """
+        with self._file_locked():
+            self._sync()
+            self._write()
+
+    def _write(self):
+        """Write the index to disk atomically (temp file, then rename). Caller holds the write lock and the file lock."""
+        # Tombstones go first: the index rename is what other workers watch for before reloading both.
+        tmp_tombstones = f"{self.tombstones_path}.tmp"
+        with open(tmp_tombstones, "wb") as f:
+            np.save(f, self._tombstone_array())
+        os.replace(tmp_tombstones, self.tombstones_path)
 
-    def add_embeddings(self, embeddings: List[List[float]], chunk_ids: List[int]):
+        tmp_path = f"{self.index_path}.tmp"
+        faiss.write_index(self.index, tmp_path)
+        # Make sure the data is on disk before the rename makes it visible, so a crash never leaves a torn index.
+        with open(tmp_path, "rb+") as f:
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.index_path)
+        self._file_signature = self._read_file_signature()
+        self._pending = 0
+        self._journal = []
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+
+    def flush(self):
+        """Write any changes still held in memory to disk."""
+        with self._lock.write_locked():
+            if self._pending:
+                logger.info(f"Flushing {self._pending} pending vector changes to {self.index_path}.")
+                self.save()
+
+    @contextmanager
+    def deferred_writes(self):
         """
-        Add new embeddings to the index.
+        Hold all additions in memory for the duration of the block and write the index once at the end.
+        Used by bulk ingestion so a backlog of N documents costs one index write instead of N.
+        Other processes may save meanwhile; their changes are reloaded and this block's are replayed on top.
         """
-        if not embeddings:
+        with self._lock.write_locked():
+            self._deferrals += 1
+        try:
+            yield self
+        finally:
+            with self._lock.write_locked():
+                self._deferrals -= 1
+                if not self._deferrals and self._pending:
+                    self.save()
+
+    def _after_write(self, count: int):
+        """Persist or schedule persistence of `count` changed vectors. Caller holds the write lock."""
+        self._pending += count
+        if self._deferrals:
             return
-            
+        if not self.write_behind or self._pending >= settings.VECTOR_FLUSH_MAX_PENDING:
+            self.save()
+        elif self._flush_timer is None:
+            self._flush_timer = threading.Timer(settings.VECTOR_FLUSH_INTERVAL_SECONDS, self.flush)
+            self._flush_timer.daemon = True
+            self._flush_timer.start()
+
+    def add_embeddings(self, embeddings: List[List[float]], chunk_ids: List[int], shard_key: ShardKey = None):
+        """
+        Add new embeddings to the index, keyed by chunk ID.
+        `shard_key` only matters for ShardedFAISSStore; it is accepted here so callers can treat both alike.
+        """
+        self._add(embeddings, chunk_ids, replace_existing=False)
+
+    def upsert_embeddings(self, embeddings: List[List[float]], chunk_ids: List[int], shard_key: ShardKey = None):
+        """
+        Add embeddings, replacing any vectors already stored under the same chunk IDs.
+        """
+        self._add(embeddings, chunk_ids, replace_existing=True)
+
+    def _add(self, embeddings: List[List[float]], chunk_ids: List[int], replace_existing: bool):
+        if len(embeddings) == 0:
+            return
+
         if len(embeddings) != len(chunk_ids):
             raise ValueError("Mismatched length between embeddings and IDs")
+        self.ensure_writable()
 
         vectors = np.array(embeddings).astype('float32')
         # Normalize for cosine similarity simulation with L2
         faiss.normalize_L2(vectors)
 
-        start_idx = self.index.ntotal
-        self.index.add(vectors)
-        
-        # Update mappings
-        for i, chunk_id in enumerate(chunk_ids):
-            self.id_mapping[start_idx + i] = chunk_id
-            
-        self.save()
+        ids = np.array(chunk_ids, dtype='int64')
+        self.reload_if_changed()
+        with self._lock.write_locked():
+            self._apply_add(vectors, ids, replace_existing)
+            self._journal.append(("add", vectors, ids, replace_existing))
+            self._after_write(len(ids))
+
+    def _apply_add(self, vectors: np.ndarray, ids: np.ndarray, replace_existing: bool):
+        """Add normalized vectors to the in-memory index. Caller holds the write lock."""
+        # A tombstoned ID (e.g. a restored vector, or a chunk ID from before AUTOINCREMENT) must be purged before it can be live again.
+        if replace_existing:
+            stale = ids[np.isin(ids, faiss.vector_to_array(self.index.id_map))]
+        else:
+            stale = ids[np.isin(ids, self._tombstone_array())]
+        if len(stale):
+            self._purge(stale)
+        self.index.add_with_ids(vectors, ids)
+
+    def _purge(self, ids: np.ndarray):
+        """Physically delete `ids` from the index. Caller holds the write lock."""
+        try:
+            self.index.remove_ids(faiss.IDSelectorBatch(ids))
+            self._set_tombstones(self._tombstones - set(ids.tolist()))
+        except RuntimeError:
+            # IVF and HNSW indexes can't delete in place; rebuild without the purged and tombstoned vectors.
+            vectors, stored_ids = self._export_vectors()
+            self.index = self._rebuild(self._empty_copy(), vectors, stored_ids, np.concatenate([ids, self._tombstone_array()]))
+            self._set_tombstones(set())
+        self._generation += 1
+
+    def _empty_copy(self):
+        """
+        An empty index of the current kind, trained like the current one, for a rebuild to fill.
+        Flat indexes are simply created; other kinds are copied from a template kept since training,
+        or cloned once per loaded index. Caller holds a lock, so no writer is adding to the index.
+        """
+        if self._template is None:
+            inner = faiss.downcast_index(self.index.index)
+            if type(inner) is faiss.IndexFlat:
+                template = faiss.IndexFlat(inner.d, inner.metric_type)
+            else:
+                template = faiss.clone_index(inner)
+                template.reset()
+            self._template = template
+        return faiss.clone_index(self._template)
+
+    def _rebuild(self, inner, vectors: np.ndarray, ids: np.ndarray, dead_ids: np.ndarray):
+        """Return an index wrapping the empty `inner` index and holding only the live vectors."""
+        index = faiss.IndexIDMap2(inner)
+        live = ~np.isin(ids, dead_ids)
+        if live.any():
+            index.add_with_ids(vectors[live], ids[live])
+        return index
+
+    def remove_ids(self, chunk_ids: List[int]) -> int:
+        """
+        Tombstone the vectors stored under `chunk_ids` so searches no longer return them.
+        Starts a background compaction if the dead fraction crosses VECTOR_COMPACTION_THRESHOLD.
+        Returns the number of vectors newly removed.
+        """
+        if len(chunk_ids) == 0:
+            return 0
+        self.ensure_writable()
+
+        ids = np.array(chunk_ids, dtype='int64')
+        self.reload_if_changed()
+        with self._lock.write_locked():
+            dead = self._apply_remove(ids)
+            if not dead:
+                return 0
+            self._journal.append(("remove", ids))
+            self._after_write(len(dead))
+            needs_compaction = self.dead_fraction >= settings.VECTOR_COMPACTION_THRESHOLD
+
+        if needs_compaction:
+            self.compact_in_background()
+        return len(dead)
+
+    def _apply_remove(self, ids: np.ndarray) -> Set[int]:
+        """Tombstone the stored vectors among `ids` and return the newly dead IDs. Caller holds the write lock."""
+        stored = ids[np.isin(ids, faiss.vector_to_array(self.index.id_map))]
+        dead = set(stored.tolist()) - self._tombstones
+        if dead:
+            self._set_tombstones(self._tombstones | dead)
+        return dead
 
-    def search(self, query_embedding: List[float], top_k: int = 3) -> List[Tuple[int, float]]:
+    def compact(self) -> bool:
+        """
+        Rebuild the index without its tombstoned vectors. The rebuild runs against a snapshot while
+        searches continue; only the final swap takes the write lock. Vectors added meanwhile are carried
+        over. Returns False if there was nothing to do or another compaction/rebuild got in the way.
+        """
+        self.ensure_writable()
+        if not self._compaction_lock.acquire(blocking=False):
+            return False
+        try:
+            with self._lock.read_locked():
+                if not self._tombstones:
+                    return False
+                generation, dead, vectors, ids = self._snapshot()
+                inner = self._empty_copy()
+
+            logger.info(f"Compacting FAISS index: dropping {len(dead)} of {len(ids)} vectors.")
+            index = self._rebuild(inner, vectors, ids, dead)
+
+            with self._lock.write_locked(), self._file_locked():
+                if not self._swap_rebuilt(index, generation, len(ids), dead):
+                    logger.info("FAISS index changed during compaction. Skipping this round.")
+                    return False
+            logger.info(f"Compaction finished. FAISS index now holds {index.ntotal} vectors.")
+            return True
+        finally:
+            self._compaction_lock.release()
+
+    def compact_in_background(self) -> threading.Thread:
+        # Not a daemon: interpreter shutdown waits for a running compaction instead of discarding it.
+        thread = threading.Thread(target=self.compact, name="faiss-compaction")
+        thread.start()
+        return thread
+
+    def search(
+        self,
+        query_embedding: List[float],
+        top_k: int = 3,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None,
+        allowed_ids: Optional[Sequence[int]] = None,
+        shard_key: ShardKey = None
+    ) -> List[Tuple[int, float]]:
         """
         Search for the top_k most similar vectors.
+        `nprobe` (IVF) and `ef_search` (HNSW) override the configured accuracy/speed trade-off for this query.
+        If `allowed_ids` is given, only vectors with those chunk IDs are considered.
         Returns a list of (chunk_id, distance) tuples.
         """
-        if self.index.ntotal == 0:
-            return []
+        ids, distances = self.search_batch(np.array([query_embedding]), top_k, nprobe, ef_search, allowed_ids, shard_key)
+        hits = ids[0] != -1 # -1 means no result
+        return list(zip(ids[0][hits].tolist(), distances[0][hits].tolist()))
+
+    def search_batch(
+        self,
+        query_embeddings: np.ndarray,
+        top_k: int = 3,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None,
+        allowed_ids: Optional[Sequence[int]] = None,
+        shard_key: ShardKey = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Search for the top_k most similar vectors of each row of an (n, d) query matrix in one FAISS call.
+        If `allowed_ids` is given, only vectors with those chunk IDs are considered.
+        Returns (chunk_ids, distances), both of shape (n, top_k); missing results have chunk ID -1.
+        """
+        self.reload_if_changed()
+
+        query_vectors = np.array(query_embeddings, dtype='float32', order='C', ndmin=2)
+        if query_vectors.shape[1] != self.dimension:
+            raise ValueError(f"Expected query vectors of dimension {self.dimension}, got {query_vectors.shape[1]}")
+        faiss.normalize_L2(query_vectors)
+
+        with self._lock.read_locked():
+            if self.index.ntotal == 0 or (allowed_ids is not None and len(allowed_ids) == 0):
+                n = len(query_vectors)
+                return np.full((n, top_k), -1, dtype='int64'), np.full((n, top_k), np.inf, dtype='float32')
+            if allowed_ids is not None and self._scores_exactly(allowed_ids):
+                return self._search_exact(query_vectors, top_k, allowed_ids)
+            params = self._search_params(nprobe, ef_search, allowed_ids)
+            distances, ids = self.index.search(query_vectors, top_k, params=params)
+
+        return ids, distances
+
+    def _scores_exactly(self, allowed_ids: Sequence[int]) -> bool:
+        """
+        Whether a filtered search should score the allowed vectors directly: approximate indexes only
+        look at part of the data, which may hold none of a small subset. Caller holds the read lock.
+        """
+        if len(allowed_ids) > settings.VECTOR_EXACT_FILTER_MAX_IDS:
+            return False
+        kind = self._index_kind()
+        if kind == "ivf":
+            # Reconstructing by ID needs the direct map that train_index builds
+            return not faiss.extract_index_ivf(self.index.index).direct_map.no()
+        return kind == "hnsw"
+
+    def _search_exact(self, query_vectors: np.ndarray, top_k: int, allowed_ids: Sequence[int]) -> Tuple[np.ndarray, np.ndarray]:
+        """Brute-force search over the live vectors among `allowed_ids`. Caller holds the read lock."""
+        ids, vectors = [], []
+        for chunk_id in dict.fromkeys(int(chunk_id) for chunk_id in allowed_ids):
+            if chunk_id in self._tombstones:
+                continue
+            try:
+                vectors.append(self.index.reconstruct(chunk_id))
+            except RuntimeError:
+                continue  # Not stored here, e.g. it lives in another shard
+            ids.append(chunk_id)
+
+        n = len(query_vectors)
+        result_ids = np.full((n, top_k), -1, dtype='int64')
+        result_distances = np.full((n, top_k), np.inf, dtype='float32')
+        if ids:
+            distances, positions = faiss.knn(query_vectors, np.array(vectors, dtype='float32'), min(top_k, len(ids)))
+            found = positions.shape[1]
+            result_ids[:, :found] = np.array(ids, dtype='int64')[positions]
+            result_distances[:, :found] = distances
+        return result_ids, result_distances
+
+class ShardedFAISSStore:
+    """
+    Splits the vector index across several FAISSStore shards, each with its own file.
+    Vectors are routed by a shard key (the document ID or subject, see VECTOR_SHARD_BY) so a document's
+    chunks live together; rewrites and compactions only touch one shard. Searches fan out to all shards
+    on a thread pool and the per-shard results are merged by distance.
+    """
+    def __init__(self, num_shards: int, dimension: int = 384, index_path: str = "faiss_index.bin", **store_kwargs):
+        if num_shards < 1:
+            raise ValueError("A sharded store needs at least one shard")
+        self.num_shards = num_shards
+        self.dimension = dimension
+        self.index_path = index_path
+        root, ext = os.path.splitext(index_path)
+        self.shards = [
+            FAISSStore(dimension=dimension, index_path=f"{root}.shard{i}of{num_shards}{ext}", **store_kwargs)
+            for i in range(num_shards)
+        ]
+        self._executor = ThreadPoolExecutor(max_workers=num_shards, thread_name_prefix="faiss-shard")
+
+    def shard_for(self, shard_key: ShardKey) -> FAISSStore:
+        if shard_key is None:
+            raise ValueError("ShardedFAISSStore needs a shard key to place vectors")
+        if isinstance(shard_key, int):
+            return self.shards[shard_key % self.num_shards]
+        # crc32 rather than hash(): string hashes are salted per process, and every worker must agree.
+        return self.shards[zlib.crc32(shard_key.encode("utf-8")) % self.num_shards]
+
+    @property
+    def index_type(self) -> str:
+        return self.shards[0].index_type
+
+    @property
+    def read_only(self) -> bool:
+        return self.shards[0].read_only
+
+    def ensure_writable(self):
+        self.shards[0].ensure_writable()
+
+    def stored_ids(self) -> np.ndarray:
+        return np.concatenate(self._map(lambda shard: shard.stored_ids()))
+
+    @property
+    def ntotal(self) -> int:
+        return sum(shard.ntotal for shard in self.shards)
+
+    @property
+    def dead_fraction(self) -> float:
+        total = self.ntotal
+        if total == 0:
+            return 0.0
+        return sum(shard.dead_fraction * shard.ntotal for shard in self.shards) / total
+
+    def _map(self, fn, shards=None):
+        return list(self._executor.map(fn, shards or self.shards))
+
+    def reload_if_changed(self) -> bool:
+        return any(self._map(lambda shard: shard.reload_if_changed()))
+
+    def train_index(self, index_type: Optional[str] = None):
+        """
+        Rebuild every shard as `index_type`. All shards are trained from snapshots while searches
+        continue, then swapped in together, so a failure (e.g. a shard with too few vectors) or a shard
+        that changed meanwhile leaves every shard on its old index.
+        """
+        index_type = index_type or self.index_type
+        self.ensure_writable()
+        self.reload_if_changed()
+        with ExitStack() as stack:
+            for shard in self.shards:
+                stack.enter_context(shard._compaction_lock)
+            snapshots = []
+            for shard in self.shards:
+                with shard._lock.read_locked():
+                    snapshots.append(shard._snapshot())
+            built = [shard._build_trained_index(index_type, snapshot) for shard, snapshot in zip(self.shards, snapshots)]
+
+            for shard in self.shards:
+                stack.enter_context(shard._lock.write_locked())
+                stack.enter_context(shard._file_locked())
+                shard._sync()
+            if any(shard._generation != snapshot[0] for shard, snapshot in zip(self.shards, snapshots)):
+                raise RuntimeError("The FAISS index changed while it was being trained. Please retry.")
+            for shard, (index, template), snapshot in zip(self.shards, built, snapshots):
+                shard._swap_index(index, template, index_type, snapshot)
+
+    def flush(self):
+        self._map(lambda shard: shard.flush())
+
+    def compact(self) -> bool:
+        return any(self._map(lambda shard: shard.compact()))
+
+    @contextmanager
+    def deferred_writes(self):
+        with ExitStack() as stack:
+            for shard in self.shards:
+                stack.enter_context(shard.deferred_writes())
+            yield self
+
+    def add_embeddings(self, embeddings: List[List[float]], chunk_ids: List[int], shard_key: ShardKey = None):
+        self.shard_for(shard_key).add_embeddings(embeddings, chunk_ids)
+
+    def upsert_embeddings(self, embeddings: List[List[float]], chunk_ids: List[int], shard_key: ShardKey = None):
+        target = self.shard_for(shard_key)
+        # The chunks may have lived in another shard before, e.g. if the document's subject changed.
+        for shard in self.shards:
+            if shard is not target:
+                shard.remove_ids(chunk_ids)
+        target.upsert_embeddings(embeddings, chunk_ids)
+
+    def remove_ids(self, chunk_ids: List[int]) -> int:
+        return sum(self._map(lambda shard: shard.remove_ids(chunk_ids)))
 
-        query_vector = np.array([query_embedding]).astype('float32')
-        faiss.normalize_L2(query_vector)
+    def search(
+        self,
+        query_embedding: List[float],
+        top_k: int = 3,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None,
+        allowed_ids: Optional[Sequence[int]] = None,
+        shard_key: ShardKey = None
+    ) -> List[Tuple[int, float]]:
+        ids, distances = self.search_batch(np.array([query_embedding]), top_k, nprobe, ef_search, allowed_ids, shard_key)
+        hits = ids[0] != -1 # -1 means no result
+        return list(zip(ids[0][hits].tolist(), distances[0][hits].tolist()))
 
-        distances, indices = self.index.search(query_vector, top_k)
-        
-        results = []
-        for i in range(len(indices[0])):
-            idx = indices[0][i]
-            if idx != -1 and idx in self.id_mapping: # -1 means no result
-                results.append((self.id_mapping[idx], float(distances[0][i])))
+    def search_batch(
+        self,
+        query_embeddings: np.ndarray,
+        top_k: int = 3,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None,
+        allowed_ids: Optional[Sequence[int]] = None,
+        shard_key: ShardKey = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Search every shard in parallel (or only the shard owning `shard_key`) and merge the results.
+        Returns (chunk_ids, distances) of shape (n, top_k), like FAISSStore.search_batch.
+        """
+        if shard_key is not None:
+            return self.shard_for(shard_key).search_batch(query_embeddings, top_k, nprobe, ef_search, allowed_ids)
+
+        results = self._map(lambda shard: shard.search_batch(query_embeddings, top_k, nprobe, ef_search, allowed_ids))
+        ids = np.concatenate([shard_ids for shard_ids, _ in results], axis=1)
+        distances = np.concatenate([shard_distances for _, shard_distances in results], axis=1)
+        order = np.argsort(distances, axis=1, kind="stable")[:, :top_k]
+        return np.take_along_axis(ids, order, axis=1), np.take_along_axis(distances, order, axis=1)
+
+VectorStore = Union[FAISSStore, ShardedFAISSStore]
+
+# Process-wide store shared by all requests
+_vector_store: Optional[VectorStore] = None
+_vector_store_lock = threading.Lock()
+
+def get_vector_store() -> VectorStore:
+    """
+    Return the shared vector store, loading the index from disk on first use.
+    The lifespan hook in backend/main.py calls this at startup so requests never pay for the load.
+    """
+    global _vector_store
+    if _vector_store is None:
+        with _vector_store_lock:
+            if _vector_store is None:
+                store_kwargs = dict(
+                    dimension=settings.EMBEDDING_DIMENSION,
+                    index_path=settings.VECTOR_INDEX_PATH,
+                    index_type=settings.VECTOR_INDEX_TYPE
+                )
+                if settings.VECTOR_NUM_SHARDS > 1:
+                    _vector_store = ShardedFAISSStore(settings.VECTOR_NUM_SHARDS, **store_kwargs)
+                else:
+                    _vector_store = FAISSStore(**store_kwargs)
+                # Scripts don't run the lifespan hook; make sure write-behind additions still reach disk.
+                atexit.register(_vector_store.flush)
+    return _vector_store
 
-        return results
+def reset_vector_store() -> None:
+    """Flush and drop the shared store so the next get_vector_store() call reloads it."""
+    global _vector_store
+    with _vector_store_lock:
+        if _vector_store is not None:
+            _vector_store.flush()
+        _vector_store = None
@@ -50,7 +50,7 @@ class DocumentParserService:
         """Extract text from DOCX bytes using python-docx."""
         try:
             doc = docx.Document(io.BytesIO(content))
-            return "\n".join([paragraph.text for paragraph in doc.paragraphs if paragraph.text])
+            return "\n\n".join([paragraph.text for paragraph in doc.paragraphs if paragraph.text])
         except Exception as e:
             raise ValueError(f"Error parsing DOCX: {e}")
 
@@ -58,7 +58,9 @@ class DocumentParserService:
     def clean_text(text: str) -> str:
         """
         Clean and normalize extracted text (remove excessive whitespace, etc).
+        Blank lines are kept as paragraph breaks for the paragraph chunking strategy.
         """
         import re
-        text = re.sub(r'\s+', ' ', text)
-        return text.strip()
+        paragraphs = re.split(r'\n\s*\n', text)
+        paragraphs = [re.sub(r'\s+', ' ', paragraph).strip() for paragraph in paragraphs]
+        return "\n\n".join(paragraph for paragraph in paragraphs if paragraph)
@@ -0,0 +1,22 @@
+import json
+from typing import Any, AsyncIterator, Optional
+
+def sse_event(data: Any, event: Optional[str] = None) -> str:
+    """Format one Server-Sent Event with a JSON payload."""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+async def sse_token_stream(tokens: AsyncIterator[str]) -> AsyncIterator[str]:
+    """
+    Relay generated tokens as `data: {"token": ...}` events, then a final `done` event
+    carrying the full answer. A failure mid-stream is reported as an `error` event.
+    """
+    parts = []
+    try:
+        async for token in tokens:
+            parts.append(token)
+            yield sse_event({"token": token})
+    except Exception as e:
+        yield sse_event({"detail": str(e)}, event="error")
+        return
+    yield sse_event({"answer": "".join(parts).strip()}, event="done")
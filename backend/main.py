@@ -2,10 +2,17 @@ import uvicorn
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
+import threading
 
 from backend.app.core.config import get_settings
+from backend.app.core.http import close_async_http_client, close_http_session
 from backend.app.utils.logger import logger
 from backend.app.api.health import router as health_router
+from backend.app.rag.chunking import get_token_counter
+from backend.app.rag.pipeline import restore_vectors_if_index_empty
+from backend.app.rag.vector_store import get_vector_store
+from backend.app.embeddings.backends import get_embedding_backend
+from backend.app.embeddings.batcher import shutdown_embedding_batcher
 
 settings = get_settings()
 
@@ -16,9 +23,19 @@ async def lifespan(app: FastAPI):
     """
     logger.info(f"Starting {settings.PROJECT_NAME} backend...")
     # Add startup initialization here (e.g. DB connection pooling, ML models loading)
+    get_vector_store()
+    get_embedding_backend()
+    # Fetch the chunking tokenizer now rather than in the middle of the first indexing job
+    get_token_counter()
+    # An empty index next to existing chunk rows (legacy index file, new shard count) is rebuilt while serving
+    threading.Thread(target=restore_vectors_if_index_empty, name="vector-restore", daemon=True).start()
     yield
     logger.info(f"Shutting down {settings.PROJECT_NAME} backend...")
     # Add shutdown cleanup here
+    shutdown_embedding_batcher()
+    get_vector_store().flush()
+    close_http_session()
+    await close_async_http_client()
 
 def create_app() -> FastAPI:
     """
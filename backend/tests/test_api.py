@@ -15,3 +15,16 @@ def test_openapi_schema():
     response = client.get("/api/v1/openapi.json")
     assert response.status_code == 200
     assert "openapi" in response.json()
+
+def test_retrieve_batch_rejects_empty_questions():
+    response = client.post("/api/v1/qa/retrieve-batch", json={"questions": []})
+    assert response.status_code == 400
+
+@pytest.mark.parametrize("body", [
+    {"questions": ["q"], "top_k": 10**8},
+    {"questions": ["q"], "top_k": 0},
+    {"questions": ["q"] * 10**4},
+])
+def test_retrieve_batch_rejects_oversized_requests(body):
+    response = client.post("/api/v1/qa/retrieve-batch", json=body)
+    assert response.status_code == 400
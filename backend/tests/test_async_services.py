@@ -0,0 +1,56 @@
+import asyncio
+import time
+from types import SimpleNamespace
+from backend.app.ai.chat_agent import ChatAgent
+from backend.app.ai.quiz_service import QuizService
+
+def _run_with_ticker(coroutine_fn):
+    """Run a coroutine while counting how often a 10 ms ticker gets to run on the same loop."""
+    async def main():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        task = asyncio.create_task(ticker())
+        try:
+            result = await coroutine_fn()
+        finally:
+            task.cancel()
+        return result, ticks
+
+    return asyncio.run(main())
+
+def _slow(result, seconds=0.3):
+    def call(*args, **kwargs):
+        time.sleep(seconds)
+        return result
+    return call
+
+async def _answer(*args, **kwargs):
+    return "[]"
+
+def test_slow_quiz_save_does_not_block_the_event_loop(monkeypatch):
+    service = QuizService(db=None)
+    monkeypatch.setattr(service, "_build_prompt", _slow((SimpleNamespace(id=1), "prompt")))
+    monkeypatch.setattr(service.llm, "generate_async", _answer)
+    monkeypatch.setattr(service, "_save_quiz", _slow(SimpleNamespace(id=7)))
+    monkeypatch.setattr(service, "get_quiz", lambda quiz_id: quiz_id)
+
+    result, ticks = _run_with_ticker(lambda: service.generate_quiz_async(1, 5, "Loop test"))
+    assert result == 7
+    # Blocking the loop for the 0.6 s of database work would leave the ticker at ~0
+    assert ticks >= 20
+
+def test_slow_chat_save_does_not_block_the_event_loop(monkeypatch):
+    agent = ChatAgent.__new__(ChatAgent)
+    agent.llm = SimpleNamespace(generate_async=_answer)
+    monkeypatch.setattr(agent, "_prepare_prompt", _slow("prompt"))
+    monkeypatch.setattr(agent, "_save_message", _slow(None))
+
+    result, ticks = _run_with_ticker(lambda: agent.send_message_async(1, "hello"))
+    assert result == "[]"
+    assert ticks >= 20
@@ -0,0 +1,103 @@
+import types
+import pytest
+from backend.app.rag import chunking
+from backend.app.rag.chunking import iter_chunks, regex_token_count, strategy_for
+from backend.app.services.document_parser import DocumentParserService
+
+def chunks(text, strategy="sentence", max_tokens=12, overlap_tokens=0):
+    return list(iter_chunks(text, strategy, max_tokens, overlap_tokens, count_tokens=regex_token_count))
+
+SENTENCES = "Cells store energy. Mitochondria release it! Is ATP the currency? Yes, it is."
+
+def test_sentence_chunks_end_on_sentence_boundaries():
+    result = chunks(SENTENCES, max_tokens=10)
+    assert result == ["Cells store energy. Mitochondria release it!", "Is ATP the currency? Yes, it is."]
+    assert all(regex_token_count(chunk) <= 10 for chunk in result)
+
+def test_overlap_repeats_whole_trailing_sentences():
+    result = chunks(SENTENCES, max_tokens=10, overlap_tokens=5)
+    assert result == [
+        "Cells store energy. Mitochondria release it!",
+        "Mitochondria release it! Is ATP the currency?",
+        "Is ATP the currency? Yes, it is.",
+    ]
+
+def test_overlong_sentence_is_split_between_words():
+    text = " ".join(f"word{i}" for i in range(25)) + "."
+    result = chunks(text, max_tokens=10)
+    assert all(regex_token_count(chunk) <= 10 for chunk in result)
+    assert " ".join(result) == text
+
+def test_paragraph_chunks_keep_paragraphs_together():
+    text = "First paragraph here. Still first.\n\nSecond paragraph.\n\nThird one."
+    assert chunks(text, "paragraph", max_tokens=9) == [
+        "First paragraph here. Still first.",
+        "Second paragraph.\n\nThird one.",
+    ]
+
+def test_oversized_paragraph_falls_back_to_sentences():
+    text = SENTENCES + "\n\nShort."
+    result = chunks(text, "paragraph", max_tokens=10)
+    assert result == ["Cells store energy. Mitochondria release it!", "Is ATP the currency? Yes, it is.", "Short."]
+
+def test_chunks_are_generated_lazily():
+    consumed = []
+
+    def counting(text):
+        consumed.append(text)
+        return regex_token_count(text)
+
+    generator = iter_chunks(SENTENCES * 1000, "sentence", 9, 0, count_tokens=counting)
+    assert next(generator) == "Cells store energy. Mitochondria release it!"
+    assert len(consumed) < 10
+
+@pytest.mark.parametrize("text", [
+    "no breaks at all " * 20000,  # one paragraph, one sentence
+    "x" * 200000,  # not even whitespace
+])
+def test_boundary_free_text_is_never_tokenized_whole(text):
+    longest = 0
+
+    def counting(piece):
+        nonlocal longest
+        longest = max(longest, len(piece))
+        return regex_token_count(piece)
+
+    generator = iter_chunks(text, "paragraph", 50, 10, count_tokens=counting)
+    first = next(generator)
+    assert regex_token_count(first) <= 50
+    assert longest <= 50 * chunking.MAX_CHARS_PER_TOKEN
+    assert all(regex_token_count(chunk) <= 50 for chunk in generator)
+    assert longest <= 50 * chunking.MAX_CHARS_PER_TOKEN
+
+def test_fixed_strategy_keeps_character_windows(monkeypatch):
+    monkeypatch.setattr(chunking, "settings", types.SimpleNamespace(CHUNK_SIZE=10, CHUNK_OVERLAP=2))
+    assert list(iter_chunks("abcdefghijklmnopqrst", "fixed")) == ["abcdefghij", "ijklmnopqr", "qrst"]
+
+def test_unknown_strategy_is_rejected():
+    with pytest.raises(ValueError):
+        chunks("text", "words")
+
+def test_strategy_follows_file_type(monkeypatch):
+    monkeypatch.setattr(chunking.settings, "CHUNK_STRATEGY", "auto")
+    assert strategy_for("notes.PDF") == "sentence"
+    assert strategy_for("notes.docx") == "paragraph"
+    assert strategy_for("Biology - Cells are...") == "sentence"
+    assert strategy_for(None) == "sentence"
+    monkeypatch.setattr(chunking.settings, "CHUNK_STRATEGY", "fixed")
+    assert strategy_for("notes.docx") == "fixed"
+
+def test_model_token_counts_are_not_truncated(monkeypatch):
+    from tokenizers import Tokenizer, models, pre_tokenizers
+    tokenizer = Tokenizer(models.WordLevel({"[UNK]": 0, "cell": 1}, unk_token="[UNK]"))
+    tokenizer.pre_tokenizer = pre_tokenizers.Whitespace()
+    # Model tokenizers usually ship truncating to the model's input length
+    tokenizer.enable_truncation(max_length=4)
+    monkeypatch.setattr(Tokenizer, "from_pretrained", staticmethod(lambda name: tokenizer))
+    monkeypatch.setattr(chunking.settings, "CHUNK_TOKENIZER", "model")
+
+    assert chunking._load_token_counter()("cell " * 10) == 10
+
+def test_clean_text_keeps_paragraph_breaks():
+    raw = "  Line one\nstill one.  \n \n\n Two\tparts.\n"
+    assert DocumentParserService.clean_text(raw) == "Line one still one.\n\nTwo parts."
@@ -0,0 +1,176 @@
+import threading
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from backend.app.database.base import Base
+from backend.app.embeddings import cache
+from backend.app.embeddings import service
+from backend.app.embeddings import backends
+from backend.app.embeddings.backends import EmbeddingBackend, LocalEmbeddingBackend
+from backend.app.embeddings.batcher import EmbeddingBatcher
+from backend.app.embeddings.cache import EmbeddingCache
+from backend.app.embeddings.service import EmbeddingService
+from backend.app.models.embedding_cache import EmbeddingCacheEntry
+
+@pytest.fixture(autouse=True)
+def memory_only_cache(monkeypatch):
+    monkeypatch.setattr(service.settings, "EMBEDDING_RETRY_BACKOFF_SECONDS", 0)
+    embedding_cache = EmbeddingCache(memory_size=100)
+    monkeypatch.setattr(embedding_cache, "_load", lambda model, digests: {})
+    monkeypatch.setattr(embedding_cache, "_store", lambda model, rows: None)
+    monkeypatch.setattr(service, "get_embedding_cache", lambda: embedding_cache)
+    return embedding_cache
+
+class FailingBackend(EmbeddingBackend):
+    def __init__(self, fallback_to_mock):
+        self.fallback_to_mock = fallback_to_mock
+
+    def embed(self, texts):
+        raise ConnectionError("unreachable")
+
+def test_api_backend_failure_falls_back_to_mock(monkeypatch):
+    monkeypatch.setattr(service, "get_embedding_backend", lambda: FailingBackend(fallback_to_mock=True))
+    assert EmbeddingService.generate_embeddings(["a", "b"]) == [[0.0] * 384, [0.0] * 384]
+
+def test_local_backend_failure_is_raised(monkeypatch):
+    monkeypatch.setattr(service, "get_embedding_backend", lambda: FailingBackend(fallback_to_mock=False))
+    with pytest.raises(ConnectionError):
+        EmbeddingService.generate_embedding("a")
+
+class CountingBackend(EmbeddingBackend):
+    def __init__(self):
+        self.calls = []
+
+    def embed(self, texts):
+        self.calls.append(list(texts))
+        return [[float(len(text))] * 384 for text in texts]
+
+def test_cached_texts_are_embedded_once(monkeypatch, memory_only_cache):
+    backend = CountingBackend()
+    monkeypatch.setattr(service, "get_embedding_backend", lambda: backend)
+
+    assert EmbeddingService.generate_embeddings(["ab", "abc", "ab"])[2][0] == 2.0
+    assert EmbeddingService.generate_embeddings(["abc", "abcd"])[0][0] == 3.0
+    assert backend.calls == [["ab", "abc"], ["abcd"]]
+    assert memory_only_cache.stats()["memory_hits"] == 1
+
+def test_mock_embeddings_are_not_cached(monkeypatch, memory_only_cache):
+    monkeypatch.setattr(service, "get_embedding_backend", lambda: FailingBackend(fallback_to_mock=True))
+    EmbeddingService.generate_embedding("a")
+    assert len(memory_only_cache.memory) == 0
+
+def test_storing_rows_another_worker_stored_keeps_the_rest(monkeypatch, tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'cache.db'}")
+    Base.metadata.create_all(engine)
+    sessions = sessionmaker(bind=engine)
+    monkeypatch.setattr(cache, "SessionLocal", sessions)
+    ours, theirs = EmbeddingCache(memory_size=10), EmbeddingCache(memory_size=10)
+
+    theirs.set_many("model", {"a": [1.0, 1.0]})
+    ours.set_many("model", {"a": [2.0, 2.0], "b": [3.0, 3.0]})
+
+    with sessions() as db:
+        assert db.query(EmbeddingCacheEntry).count() == 2
+    assert EmbeddingCache(memory_size=10).get_many("model", ["a", "b"]) == {"a": [1.0, 1.0], "b": [3.0, 3.0]}
+
+def test_batcher_coalesces_concurrent_requests():
+    calls = []
+    release = threading.Event()
+
+    def embed(texts):
+        release.wait(1)
+        calls.append(list(texts))
+        return [[float(len(text))] for text in texts]
+
+    batcher = EmbeddingBatcher(embed, max_batch_size=8, max_wait_ms=50)
+    try:
+        futures = [batcher.submit("x" * n) for n in range(1, 5)]
+        release.set()
+        assert [future.result(timeout=1) for future in futures] == [[1.0], [2.0], [3.0], [4.0]]
+        assert calls == [["x", "xx", "xxx", "xxxx"]]
+    finally:
+        batcher.close()
+
+def test_batcher_propagates_backend_errors():
+    def embed(texts):
+        raise ConnectionError("unreachable")
+
+    batcher = EmbeddingBatcher(embed, max_batch_size=8, max_wait_ms=0)
+    try:
+        with pytest.raises(ConnectionError):
+            batcher.embed("a")
+    finally:
+        batcher.close()
+
+def test_batcher_times_out_on_wedged_backend():
+    release = threading.Event()
+
+    def embed(texts):
+        release.wait(5)
+        return [[0.0]] * len(texts)
+
+    batcher = EmbeddingBatcher(embed, max_batch_size=8, max_wait_ms=0, result_timeout=0.05)
+    try:
+        with pytest.raises(TimeoutError):
+            batcher.embed("a")
+    finally:
+        release.set()
+        batcher.close()
+
+def test_metrics_do_not_start_the_batcher(monkeypatch):
+    from backend.app.api import health
+    from backend.app.embeddings import batcher as batcher_module
+    monkeypatch.setattr(batcher_module, "_batcher", None)
+    assert health.metrics()["embedding_batcher"] is None
+    assert batcher_module.peek_embedding_batcher() is None
+
+class FlakyBackend(EmbeddingBackend):
+    concurrent_requests = True
+
+    def __init__(self):
+        self.failed = set()
+        self.lock = threading.Lock()
+
+    def embed(self, texts):
+        with self.lock:
+            if texts[0] == "c" and "c" not in self.failed:
+                self.failed.add("c")
+                raise ConnectionError("timeout")
+        return [[float(ord(text))] for text in texts]
+
+def test_large_inputs_are_sub_batched_and_retried(monkeypatch):
+    monkeypatch.setattr(service.settings, "EMBEDDING_REQUEST_BATCH_SIZE", 2)
+    backend = FlakyBackend()
+    monkeypatch.setattr(service, "get_embedding_backend", lambda: backend)
+
+    vectors = EmbeddingService.generate_embeddings(["a", "b", "c", "d", "e"])
+    assert vectors == [[97.0], [98.0], [99.0], [100.0], [101.0]]
+    assert backend.failed == {"c"}
+
+class FakeSentenceTransformer:
+    def __init__(self, model, device=None, backend=None, model_kwargs=None):
+        self.model_kwargs = model_kwargs
+
+    def get_sentence_embedding_dimension(self):
+        return 768
+
+def test_backend_without_embed_cannot_be_created():
+    class Incomplete(EmbeddingBackend):
+        pass
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+def test_local_backend_rejects_model_with_wrong_dimension(monkeypatch):
+    import sentence_transformers
+    monkeypatch.setattr(sentence_transformers, "SentenceTransformer", FakeSentenceTransformer)
+    monkeypatch.setattr(backends.settings, "EMBEDDING_LOCAL_RUNTIME", "torch")
+    monkeypatch.setattr(backends.settings, "EMBEDDING_NUM_THREADS", 0)
+    with pytest.raises(ValueError, match="768-dimensional"):
+        LocalEmbeddingBackend()
+
+def test_onnx_runtime_gets_the_thread_count(monkeypatch):
+    pytest.importorskip("onnxruntime")
+    monkeypatch.setattr(backends.settings, "EMBEDDING_NUM_THREADS", 3)
+    options = LocalEmbeddingBackend._onnx_model_kwargs(None)["session_options"]
+    assert options.intra_op_num_threads == 3
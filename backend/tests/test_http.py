@@ -0,0 +1,56 @@
+import pytest
+from backend.app.ai import llm_service
+from backend.app.ai.llm_service import LLMService
+from backend.app.core import http
+from backend.app.embeddings import backends
+from backend.app.embeddings.backends import HuggingFaceAPIBackend
+
+class FakeResponse:
+    def __init__(self, payload):
+        self.payload = payload
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.payload
+
+class RecordingSession:
+    def __init__(self, payload):
+        self.payload = payload
+        self.timeouts = []
+
+    def post(self, url, headers=None, json=None, timeout=None):
+        self.timeouts.append(timeout)
+        return FakeResponse(self.payload)
+
+@pytest.fixture
+def fresh_session(monkeypatch):
+    monkeypatch.setattr(http, "_session", None)
+    yield
+    http.close_http_session()
+
+def test_session_is_shared_and_pooled_as_configured(monkeypatch, fresh_session):
+    monkeypatch.setattr(http.settings, "HTTP_POOL_MAXSIZE", 7)
+    monkeypatch.setattr(http.settings, "HTTP_POOL_BLOCK", True)
+
+    session = http.get_http_session()
+    assert http.get_http_session() is session
+    for prefix in ("https://", "http://"):
+        adapter = session.get_adapter(f"{prefix}example.com")
+        assert adapter._pool_maxsize == 7
+        assert adapter._pool_block is True
+
+def test_llm_calls_pass_connect_and_read_timeouts(monkeypatch):
+    session = RecordingSession([{"generated_text": "an answer"}])
+    monkeypatch.setattr(llm_service, "get_http_session", lambda: session)
+
+    LLMService.generate("a question", use_cache=False)
+    assert session.timeouts == [(http.settings.HTTP_CONNECT_TIMEOUT_SECONDS, http.settings.LLM_TIMEOUT_SECONDS)]
+
+def test_embedding_calls_pass_connect_and_read_timeouts(monkeypatch):
+    session = RecordingSession([[0.0] * 384])
+    monkeypatch.setattr(backends, "get_http_session", lambda: session)
+
+    HuggingFaceAPIBackend().embed(["a text"])
+    assert session.timeouts == [(http.settings.HTTP_CONNECT_TIMEOUT_SECONDS, http.settings.EMBEDDING_TIMEOUT_SECONDS)]
@@ -0,0 +1,70 @@
+import asyncio
+import json
+import httpx
+import pytest
+from backend.app.ai import llm_service
+from backend.app.ai.llm_service import LLMService, OFFLINE_ANSWER, response_cache
+
+@pytest.fixture(autouse=True)
+def empty_response_cache():
+    response_cache.clear()
+    yield
+    response_cache.clear()
+
+def _client(handler):
+    return lambda: httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+def test_generate_async_parses_generated_text(monkeypatch):
+    def handler(request):
+        assert request.url.path.endswith(llm_service.settings.LLM_MODEL)
+        return httpx.Response(200, json=[{"generated_text": " Photosynthesis. "}])
+
+    monkeypatch.setattr(llm_service, "get_async_http_client", _client(handler))
+    assert asyncio.run(LLMService.generate_async("What do plants do?")) == "Photosynthesis."
+
+def test_generate_async_falls_back_when_unreachable(monkeypatch):
+    def handler(request):
+        return httpx.Response(503, json={"error": "loading"})
+
+    monkeypatch.setattr(llm_service, "get_async_http_client", _client(handler))
+    assert asyncio.run(LLMService.generate_async("What do plants do?")) == OFFLINE_ANSWER
+
+def test_stream_async_yields_tokens(monkeypatch):
+    body = (
+        'data:{"token": {"text": "Photo", "special": false}}\n\n'
+        'data:{"token": {"text": "synthesis", "special": false}}\n\n'
+        'data:{"token": {"text": "</s>", "special": true}, "generated_text": "Photosynthesis"}\n\n'
+    )
+
+    def handler(request):
+        assert json.loads(request.read())["stream"] is True
+        return httpx.Response(200, text=body, headers={"content-type": "text/event-stream"})
+
+    monkeypatch.setattr(llm_service, "get_async_http_client", _client(handler))
+
+    async def collect():
+        return [token async for token in LLMService.stream_async("What do plants do?")]
+
+    assert asyncio.run(collect()) == ["Photo", "synthesis"]
+
+def test_responses_are_cached_per_prompt_and_parameters(monkeypatch):
+    calls = []
+
+    def handler(request):
+        calls.append(json.loads(request.read()))
+        return httpx.Response(200, json=[{"generated_text": f"answer {len(calls)}"}])
+
+    monkeypatch.setattr(llm_service, "get_async_http_client", _client(handler))
+    assert asyncio.run(LLMService.generate_async("Q", temperature=0.3)) == "answer 1"
+    assert asyncio.run(LLMService.generate_async("Q", temperature=0.3)) == "answer 1"
+    assert asyncio.run(LLMService.generate_async("Q", max_new_tokens=50, temperature=0.3)) == "answer 2"
+    assert asyncio.run(LLMService.generate_async("Q", temperature=1.2)) == "answer 3"
+    assert asyncio.run(LLMService.generate_async("Q", temperature=1.2)) == "answer 4"
+    assert response_cache.stats()["hits"] == 1
+
+def test_fallback_answer_is_not_cached(monkeypatch):
+    responses = [httpx.Response(503), httpx.Response(200, json=[{"generated_text": "ok"}])]
+    monkeypatch.setattr(llm_service, "get_async_http_client", _client(lambda request: responses.pop(0)))
+
+    assert asyncio.run(LLMService.generate_async("Q")) == OFFLINE_ANSWER
+    assert asyncio.run(LLMService.generate_async("Q")) == "ok"
@@ -0,0 +1,396 @@
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+import numpy as np
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from backend.app.database.base import Base
+from backend.app.models.document import Document, DocumentChunk
+from backend.app.models.indexing_job import IndexingJob
+from backend.app.rag import indexing_job, pipeline
+from backend.app.rag.indexing_job import IndexingJobService
+from backend.app.rag.pipeline import RAGPipeline
+
+class FakeVectorStore:
+    read_only = False
+
+    def __init__(self):
+        self.added = {}
+        self.hits = []
+        self.flushes = 0
+        self._lock = threading.Lock()
+
+    def ensure_writable(self):
+        if self.read_only:
+            raise RuntimeError("read-only")
+
+    def add_embeddings(self, embeddings, chunk_ids, shard_key=None):
+        assert len(embeddings) == len(chunk_ids)
+        with self._lock:
+            self.added.update(zip(chunk_ids, embeddings))
+
+    upsert_embeddings = add_embeddings
+
+    @property
+    def ntotal(self):
+        return len(self.added)
+
+    def stored_ids(self):
+        return np.array(sorted(self.added), dtype='int64')
+
+    @contextmanager
+    def deferred_writes(self):
+        yield self
+
+    def flush(self):
+        self.flushes += 1
+
+    def remove_ids(self, chunk_ids):
+        for chunk_id in chunk_ids:
+            self.added.pop(chunk_id, None)
+
+    def search_batch(self, query_embeddings, top_k=3, allowed_ids=None, shard_key=None):
+        hits = [(chunk_id, distance) for chunk_id, distance in self.hits if allowed_ids is None or chunk_id in allowed_ids][:top_k]
+        ids = np.full((len(query_embeddings), top_k), -1, dtype='int64')
+        distances = np.full((len(query_embeddings), top_k), np.inf, dtype='float32')
+        for i, (chunk_id, distance) in enumerate(hits):
+            ids[:, i] = chunk_id
+            distances[:, i] = distance
+        return ids, distances
+
+class FakeEmbeddingService:
+    def generate_embeddings(self, texts):
+        return [[float(len(text))] for text in texts]
+
+    def generate_embedding(self, text):
+        return [float(len(text))]
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine)
+    return engine
+
+@pytest.fixture
+def db(engine):
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+
+@pytest.fixture(autouse=True)
+def empty_chunk_cache():
+    pipeline.chunk_cache.clear()
+
+@pytest.fixture
+def rag(db, monkeypatch):
+    monkeypatch.setattr(pipeline, "get_vector_store", FakeVectorStore)
+    monkeypatch.setattr(pipeline.settings, "CHUNK_STRATEGY", "sentence")
+    monkeypatch.setattr(pipeline.settings, "CHUNK_TOKENIZER", "regex")
+    rag = RAGPipeline(db)
+    rag.embedding_service = FakeEmbeddingService()
+    return rag
+
+def _count_statements(engine):
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+    return statements
+
+def test_index_document_bulk_inserts_chunks(rag, db, engine, monkeypatch):
+    monkeypatch.setattr(pipeline.settings, "CHUNK_INDEX_BATCH_SIZE", 1000)
+    monkeypatch.setattr(pipeline, "iter_chunks", lambda text, strategy: iter(text.split("|")))
+    doc = Document(title="notes.txt", content="|".join(f"chunk {i}" for i in range(300)))
+    db.add(doc)
+    db.commit()
+
+    statements = _count_statements(engine)
+    rag.index_document(doc.id)
+
+    inserts = [s for s in statements if s.lstrip().upper().startswith("INSERT")]
+    assert len(inserts) == 1
+    assert len(statements) < 10
+
+    chunks = db.query(DocumentChunk).order_by(DocumentChunk.chunk_index).all()
+    assert [c.text for c in chunks] == [f"chunk {i}" for i in range(300)]
+    # Every vector is stored under the ID of the row holding its text
+    assert all(rag.vector_store.added[c.id] == [float(len(c.text))] for c in chunks)
+
+def test_index_document_numbers_chunks_across_batches(rag, db, monkeypatch):
+    monkeypatch.setattr(pipeline.settings, "CHUNK_INDEX_BATCH_SIZE", 4)
+    monkeypatch.setattr(pipeline, "iter_chunks", lambda text, strategy: iter(text.split("|")))
+    doc = Document(title="notes.txt", content="|".join(f"chunk {i}" for i in range(10)))
+    db.add(doc)
+    db.commit()
+
+    rag.index_document(doc.id)
+
+    chunks = db.query(DocumentChunk).order_by(DocumentChunk.id).all()
+    assert [c.chunk_index for c in chunks] == list(range(10))
+    assert sorted(rag.vector_store.added) == [c.id for c in chunks]
+
+def _indexed(rag, db, texts):
+    doc = Document(title="notes.txt", content="|".join(texts))
+    db.add(doc)
+    db.commit()
+    rag.index_document(doc.id)
+    return doc, {c.text: c.id for c in db.query(DocumentChunk).filter(DocumentChunk.document_id == doc.id)}
+
+def test_retrieve_context_keeps_rank_order_in_one_query(rag, db, engine, monkeypatch):
+    monkeypatch.setattr(pipeline, "iter_chunks", lambda text, strategy: iter(text.split("|")))
+    _, ids = _indexed(rag, db, ["alpha", "beta", "gamma", "delta"])
+    rag.vector_store.hits = [(ids["gamma"], 0.9), (ids["alpha"], 0.8), (ids["delta"], 0.7), (ids["beta"], 0.6)]
+
+    statements = _count_statements(engine)
+    assert rag.retrieve_context("question", top_k=4) == ["gamma", "alpha", "delta", "beta"]
+    assert len(statements) == 1
+
+    # Served from the chunk cache the second time
+    statements.clear()
+    assert rag.retrieve_context("question", top_k=4) == ["gamma", "alpha", "delta", "beta"]
+    assert statements == []
+
+def test_broad_filters_are_applied_to_the_hits(rag, db, monkeypatch):
+    monkeypatch.setattr(pipeline, "iter_chunks", lambda text, strategy: iter(text.split("|")))
+    biology, bio_ids = _indexed(rag, db, ["cells", "genes"])
+    chemistry, chem_ids = _indexed(rag, db, ["atoms", "bonds"])
+    biology.subject, chemistry.subject = "biology", "chemistry"
+    db.commit()
+    rag.vector_store.hits = [(chem_ids["atoms"], 0.1), (bio_ids["genes"], 0.2), (chem_ids["bonds"], 0.3), (bio_ids["cells"], 0.4)]
+
+    monkeypatch.setattr(pipeline.settings, "RETRIEVAL_FILTER_MAX_IDS", 1)
+    assert rag._allowed_chunk_ids(subject="biology") is None
+    assert rag.retrieve_context("question", top_k=2, subject="biology") == ["genes", "cells"]
+    assert [[hit["text"] for hit in hits] for hits in rag.retrieve_batch(["q"], top_k=1, subject="biology")] == [["genes"]]
+
+    monkeypatch.setattr(pipeline.settings, "RETRIEVAL_FILTER_MAX_IDS", 100)
+    assert rag.retrieve_context("question", top_k=2, subject="chemistry") == ["atoms", "bonds"]
+
+def test_removed_chunks_leave_the_cache(rag, db, monkeypatch):
+    monkeypatch.setattr(pipeline, "iter_chunks", lambda text, strategy: iter(text.split("|")))
+    doc, ids = _indexed(rag, db, ["alpha", "beta"])
+    rag.vector_store.hits = [(ids["alpha"], 0.9), (ids["beta"], 0.8)]
+    assert rag.retrieve_context("question") == ["alpha", "beta"]
+
+    rag.remove_document_chunks(doc.id)
+    assert rag.retrieve_context("question") == []
+
+def test_read_only_worker_leaves_vectors_for_the_writer(rag, db, monkeypatch):
+    monkeypatch.setattr(pipeline, "iter_chunks", lambda text, strategy: iter(text.split("|")))
+    doc, ids = _indexed(rag, db, ["alpha", "beta"])
+    rag.vector_store.read_only = True
+    assert rag.delete_document(doc.id)
+    assert sorted(rag.vector_store.added) == sorted(ids.values())
+
+    rag.vector_store.read_only = False
+    _, new_ids = _indexed(rag, db, ["gamma", "delta"])
+    # Deleted chunk IDs are never handed out again, so the sweep finds exactly the old vectors
+    assert min(new_ids.values()) > max(ids.values())
+    assert rag.remove_orphaned_vectors() == 2
+    assert sorted(rag.vector_store.added) == sorted(new_ids.values())
+
+def test_failed_chunk_delete_keeps_vectors(rag, db, monkeypatch):
+    monkeypatch.setattr(pipeline, "iter_chunks", lambda text, strategy: iter(text.split("|")))
+    doc, ids = _indexed(rag, db, ["alpha", "beta"])
+
+    def failing_commit():
+        raise RuntimeError("database is locked")
+
+    monkeypatch.setattr(db, "commit", failing_commit)
+    with pytest.raises(RuntimeError):
+        rag.remove_document_chunks(doc.id)
+    # The chunks still look indexed, so their vectors must still be there
+    assert sorted(rag.vector_store.added) == sorted(ids.values())
+
+def test_missing_vectors_are_restored_from_chunk_rows(rag, db, monkeypatch):
+    monkeypatch.setattr(pipeline.settings, "CHUNK_INDEX_BATCH_SIZE", 2)
+    monkeypatch.setattr(pipeline, "iter_chunks", lambda text, strategy: iter(text.split("|")))
+    _, ids = _indexed(rag, db, ["alpha", "beta", "gamma"])
+    _indexed(rag, db, ["delta"])
+    # A discarded index file: the rows are there, the vectors are not
+    del rag.vector_store.added[ids["alpha"]]
+    del rag.vector_store.added[ids["gamma"]]
+
+    assert rag.restore_missing_vectors() == 2
+    assert rag.vector_store.added[ids["alpha"]] == [5.0]
+    assert rag.vector_store.added[ids["gamma"]] == [5.0]
+    assert rag.restore_missing_vectors() == 0
+
+def test_empty_index_is_restored_at_startup(rag, db, engine, monkeypatch):
+    monkeypatch.setattr(pipeline, "iter_chunks", lambda text, strategy: iter(text.split("|")))
+    _indexed(rag, db, ["alpha", "beta"])
+    store = FakeVectorStore()
+    monkeypatch.setattr(pipeline, "get_vector_store", lambda: store)
+    monkeypatch.setattr(pipeline, "EmbeddingService", FakeEmbeddingService)
+    monkeypatch.setattr(pipeline, "SessionLocal", sessionmaker(bind=engine))
+
+    assert pipeline.restore_vectors_if_index_empty() == 2
+    assert store.ntotal == 2
+    # A populated index is left alone
+    assert pipeline.restore_vectors_if_index_empty() == 0
+
+@pytest.fixture
+def job_db(engine, rag, monkeypatch):
+    store = FakeVectorStore()
+    monkeypatch.setattr(pipeline, "get_vector_store", lambda: store)
+    monkeypatch.setattr(pipeline, "EmbeddingService", FakeEmbeddingService)
+    monkeypatch.setattr(pipeline, "iter_chunks", lambda text, strategy: iter(text.split("|")))
+    monkeypatch.setattr(indexing_job, "SessionLocal", sessionmaker(bind=engine))
+    monkeypatch.setattr(indexing_job.settings, "INDEX_JOB_PAGE_SIZE", 2)
+    monkeypatch.setattr(indexing_job.settings, "INDEX_JOB_WORKERS", 3)
+    return store
+
+def _documents(db, count):
+    docs = [Document(title=f"doc{i}.txt", content=f"doc {i} a|doc {i} b") for i in range(count)]
+    db.add_all(docs)
+    db.commit()
+    return [doc.id for doc in docs]
+
+def test_unindexed_documents_are_paged_by_id(rag, db, monkeypatch):
+    monkeypatch.setattr(pipeline, "iter_chunks", lambda text, strategy: iter(text.split("|")))
+    ids = _documents(db, 5)
+    rag.index_document(ids[1])
+
+    assert rag.count_unindexed_documents() == 4
+    assert rag.unindexed_document_ids(limit=2) == [ids[0], ids[2]]
+    assert rag.unindexed_document_ids(after_id=ids[2], limit=2) == [ids[3], ids[4]]
+
+def test_indexing_job_indexes_every_unindexed_document(job_db, db):
+    ids = _documents(db, 5)
+    job = IndexingJobService.create_or_resume(db)
+    assert job.total_documents == 5
+
+    IndexingJobService.run(job.id)
+
+    db.refresh(job)
+    assert (job.status, job.indexed_documents, job.failed_documents) == ("completed", 5, 0)
+    assert job.checkpoint_document_id == ids[-1] and job.page_document_ids is None
+    assert job.finished_at is not None
+    assert db.query(DocumentChunk).count() == 10 == len(job_db.added)
+    # Flushed once per page of two documents
+    assert job_db.flushes == 3
+
+def test_indexing_job_cleans_up_failed_documents(job_db, db, monkeypatch):
+    ids = _documents(db, 3)
+    failing = FakeEmbeddingService()
+    original = failing.generate_embeddings
+    failing.generate_embeddings = lambda texts: (_ for _ in ()).throw(ConnectionError("down")) if "doc 1 a" in texts else original(texts)
+    monkeypatch.setattr(pipeline, "EmbeddingService", lambda: failing)
+    job = IndexingJobService.create_or_resume(db)
+
+    IndexingJobService.run(job.id)
+
+    db.refresh(job)
+    assert (job.status, job.indexed_documents, job.failed_documents) == ("completed", 2, 1)
+    assert db.query(DocumentChunk).filter(DocumentChunk.document_id == ids[1]).count() == 0
+    assert RAGPipeline(db).unindexed_document_ids() == [ids[1]]
+
+def test_interrupted_job_redoes_only_its_unfinished_page(job_db, db, monkeypatch):
+    ids = _documents(db, 5)
+    rag = RAGPipeline(db)
+    rag.index_document(ids[0])
+    # Indexed outside the job, inside the ID range of the interrupted page
+    rag.index_document(ids[2])
+    # Crashed while indexing the page [ids[1], ids[3]]: ids[1] is only half done
+    db.add(DocumentChunk(document_id=ids[1], chunk_index=0, text="doc 1 a"))
+    db.add(IndexingJob(status="running", total_documents=4, indexed_documents=1, checkpoint_document_id=ids[0], page_document_ids=[ids[1], ids[3]]))
+    db.commit()
+    outside_chunks = {c.id for c in db.query(DocumentChunk).filter(DocumentChunk.document_id == ids[2])}
+    job_db.added.clear()
+
+    job = IndexingJobService.create_or_resume(db)
+    IndexingJobService.run(job.id)
+
+    db.refresh(job)
+    assert (job.status, job.indexed_documents, job.total_documents) == ("completed", 4, 4)
+    assert db.query(DocumentChunk).filter(DocumentChunk.document_id == ids[1]).count() == 2
+    assert {c.id for c in db.query(DocumentChunk).filter(DocumentChunk.document_id == ids[2])} == outside_chunks
+    # Only ids[1], ids[3] and ids[4] were (re)indexed
+    assert len(job_db.added) == 6
+    assert db.query(IndexingJob).count() == 1
+
+def test_resumed_job_retries_documents_that_failed(job_db, db):
+    ids = _documents(db, 3)
+    # Failed on ids[0] and then stopped, with the checkpoint already past it
+    db.add(IndexingJob(status="failed", total_documents=3, indexed_documents=0, failed_documents=1, checkpoint_document_id=ids[0], error="boom"))
+    db.commit()
+
+    job = IndexingJobService.create_or_resume(db)
+    IndexingJobService.run(job.id)
+
+    db.refresh(job)
+    assert (job.status, job.indexed_documents, job.failed_documents, job.error) == ("completed", 3, 0, None)
+    assert RAGPipeline(db).unindexed_document_ids() == []
+
+def test_unknown_indexing_job_is_ignored(job_db):
+    IndexingJobService.run(12345)
+
+def _others_job(age_seconds=0.0, **fields):
+    heartbeat_at = datetime.now(timezone.utc) - timedelta(seconds=age_seconds)
+    return IndexingJob(status="running", worker_id="other-host:1", heartbeat_at=heartbeat_at, **fields)
+
+def test_job_held_by_another_worker_is_not_resumed(job_db, db, monkeypatch):
+    _documents(db, 1)
+    db.add(_others_job(page_document_ids=[1]))
+    db.commit()
+    monkeypatch.setattr(IndexingJobService, "_thread", None)
+
+    job = IndexingJobService.start(db)
+
+    assert (job.status, job.worker_id, job.page_document_ids) == ("running", "other-host:1", [1])
+    assert IndexingJobService._thread is None
+
+def test_job_whose_worker_stopped_renewing_is_taken_over(job_db, db):
+    _documents(db, 2)
+    db.add(_others_job(age_seconds=indexing_job.settings.INDEX_JOB_LEASE_SECONDS + 1))
+    db.commit()
+
+    job = IndexingJobService.create_or_resume(db)
+    assert (job.status, job.worker_id) == ("queued", IndexingJobService.worker_id())
+    IndexingJobService.run(job.id)
+
+    db.refresh(job)
+    assert (job.status, job.indexed_documents) == ("completed", 2)
+
+def test_concurrently_created_jobs_keep_the_older_one(job_db, db, engine, monkeypatch):
+    _documents(db, 1)
+    db.add(IndexingJob(status="completed"))
+    db.commit()
+
+    def another_worker_creates_a_job(self):
+        with sessionmaker(bind=engine)() as other:
+            other.add(_others_job())
+            other.commit()
+        return 1
+
+    monkeypatch.setattr(RAGPipeline, "count_unindexed_documents", another_worker_creates_a_job)
+    job = IndexingJobService.create_or_resume(db)
+
+    assert job.worker_id == "other-host:1"
+    assert db.query(IndexingJob).count() == 2
+
+def test_heartbeat_notices_a_takeover(job_db, db, monkeypatch):
+    _documents(db, 1)
+    job = IndexingJobService.create_or_resume(db)
+    job.worker_id = "other-host:1"
+    db.commit()
+    monkeypatch.setattr(indexing_job.settings, "INDEX_JOB_LEASE_SECONDS", 0.03)
+    stop, lost = threading.Event(), threading.Event()
+
+    IndexingJobService._heartbeat(job.id, stop, lost)
+    assert lost.is_set()
+
+def test_job_status_write_failure_does_not_escape(job_db, db, engine, monkeypatch):
+    _documents(db, 1)
+    job = IndexingJobService.create_or_resume(db)
+    sessions = sessionmaker(bind=engine)
+
+    class FailingCommitSession(sessions.class_):
+        def commit(self):
+            raise RuntimeError("database is locked")
+
+    monkeypatch.setattr(indexing_job, "SessionLocal", sessionmaker(bind=engine, class_=FailingCommitSession))
+    IndexingJobService.run(job.id)
+
+    db.refresh(job)
+    # Still resumable by the next start
+    assert job.status == "queued"
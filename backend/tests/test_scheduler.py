@@ -0,0 +1,64 @@
+import asyncio
+import threading
+import time
+import pytest
+from backend.app.core.scheduler import BATCH, INTERACTIVE, PriorityScheduler, SchedulerBusyError
+
+def _scheduler(**kwargs):
+    options = dict(max_concurrency=1, class_limits={INTERACTIVE: 1, BATCH: 1}, max_queue_depth=10, queue_timeout=1)
+    options.update(kwargs)
+    return PriorityScheduler(**options)
+
+def test_interactive_waiters_overtake_batch_waiters():
+    scheduler = _scheduler()
+    order = []
+
+    async def job(name, priority):
+        async with scheduler.slot_async(priority):
+            order.append(name)
+            await asyncio.sleep(0)
+
+    async def main():
+        scheduler.acquire(BATCH)  # hold the only slot
+        tasks = [asyncio.create_task(job("batch", BATCH))]
+        await asyncio.sleep(0)
+        tasks.append(asyncio.create_task(job("chat", INTERACTIVE)))
+        await asyncio.sleep(0)
+        assert scheduler.stats()["queued"] == {INTERACTIVE: 1, BATCH: 1}
+        scheduler.release(BATCH)
+        await asyncio.gather(*tasks)
+
+    asyncio.run(main())
+    assert order == ["chat", "batch"]
+
+def test_batch_class_is_capped():
+    scheduler = _scheduler(max_concurrency=2, class_limits={INTERACTIVE: 2, BATCH: 1}, queue_timeout=0.05)
+    scheduler.acquire(BATCH)
+    with pytest.raises(SchedulerBusyError):
+        scheduler.acquire(BATCH)
+    scheduler.acquire(INTERACTIVE)
+    assert scheduler.stats()["running"] == {INTERACTIVE: 1, BATCH: 1}
+
+def test_full_queue_is_rejected_immediately():
+    scheduler = _scheduler(max_queue_depth=1)
+    scheduler.acquire(INTERACTIVE)
+    waiter = threading.Thread(target=scheduler.acquire, args=(INTERACTIVE,))
+    waiter.start()
+    deadline = time.monotonic() + 1
+    while scheduler.stats()["queued"][INTERACTIVE] < 1 and time.monotonic() < deadline:
+        time.sleep(0.005)
+    with pytest.raises(SchedulerBusyError):
+        scheduler.acquire(INTERACTIVE)
+    assert scheduler.stats()["rejected"][INTERACTIVE] == 1
+    scheduler.release(INTERACTIVE)
+    waiter.join(1)
+
+def test_free_slot_is_granted_even_without_queue_room():
+    scheduler = _scheduler(max_concurrency=2, class_limits={INTERACTIVE: 2, BATCH: 1}, max_queue_depth=0)
+    scheduler.acquire(BATCH)
+    scheduler.acquire(INTERACTIVE)
+    assert scheduler.stats()["running"] == {INTERACTIVE: 1, BATCH: 1}
+    with pytest.raises(SchedulerBusyError):
+        scheduler.acquire(INTERACTIVE)
+    assert scheduler.stats()["queued"] == {INTERACTIVE: 0, BATCH: 0}
+    assert scheduler.stats()["rejected"] == {INTERACTIVE: 1, BATCH: 0}
@@ -0,0 +1,55 @@
+import asyncio
+import threading
+import time
+from backend.app.core.singleflight import SingleFlight
+
+def test_concurrent_threads_share_one_call():
+    flights = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def work():
+        calls.append(1)
+        started.set()
+        release.wait(1)
+        return "quiz-7"
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(flights.do("quiz", work)))
+    leader.start()
+    started.wait(1)
+    followers = [threading.Thread(target=lambda: results.append(flights.do("quiz", work))) for _ in range(3)]
+    for thread in followers:
+        thread.start()
+    deadline = time.monotonic() + 1
+    while flights.coalesced < 3 and time.monotonic() < deadline:
+        time.sleep(0.005)
+    release.set()
+    for thread in [leader] + followers:
+        thread.join(1)
+
+    assert results == ["quiz-7"] * 4
+    assert len(calls) == 1
+
+def test_concurrent_tasks_share_one_call_and_its_error():
+    flights = SingleFlight()
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        raise ValueError("bad format")
+
+    async def main():
+        return await asyncio.gather(*[flights.do_async("quiz", work) for _ in range(5)], return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert all(isinstance(result, ValueError) for result in results)
+    assert len(calls) == 1
+    assert flights.stats() == {"in_flight": 0, "leaders": 1, "coalesced": 4}
+
+def test_finished_calls_are_not_reused():
+    flights = SingleFlight()
+    assert flights.do("k", lambda: 1) == 1
+    assert flights.do("k", lambda: 2) == 2
@@ -0,0 +1,289 @@
+import threading
+import numpy as np
+import pytest
+from backend.app.rag import index_training
+from backend.app.rag.index_training import IndexTrainingService
+from backend.app.rag import vector_store
+from backend.app.rag.vector_store import FAISSStore, ShardedFAISSStore, settings
+
+DIM = 8
+
+def _vec(*values):
+    return list(values) + [0.0] * (DIM - len(values))
+
+@pytest.fixture
+def index_path(tmp_path):
+    return str(tmp_path / "faiss_index.bin")
+
+def test_search_returns_chunk_ids(index_path):
+    store = FAISSStore(dimension=DIM, index_path=index_path)
+    store.add_embeddings([_vec(1.0), _vec(0.0, 1.0)], [101, 202])
+
+    results = store.search(_vec(0.9, 0.1), top_k=1)
+    assert results[0][0] == 101
+
+def test_chunk_ids_survive_reload(index_path):
+    store = FAISSStore(dimension=DIM, index_path=index_path)
+    store.add_embeddings([_vec(1.0), _vec(0.0, 1.0)], [101, 202])
+
+    reloaded = FAISSStore(dimension=DIM, index_path=index_path)
+    assert reloaded.ntotal == 2
+    assert reloaded.search(_vec(0.0, 1.0), top_k=1)[0][0] == 202
+
+def test_reloads_when_another_writer_updates_file(index_path):
+    reader = FAISSStore(dimension=DIM, index_path=index_path)
+    writer = FAISSStore(dimension=DIM, index_path=index_path)
+    writer.add_embeddings([_vec(1.0)], [7])
+
+    assert reader.search(_vec(1.0), top_k=1) == [(7, pytest.approx(0.0))]
+
+def test_writers_sharing_a_file_keep_each_others_changes(index_path, monkeypatch):
+    first = FAISSStore(dimension=DIM, index_path=index_path)
+    first.add_embeddings([_vec(1.0)], [1])
+    second = FAISSStore(dimension=DIM, index_path=index_path)
+    # Both workers passed their file-changed check before either wrote
+    monkeypatch.setattr(second, "reload_if_changed", lambda: False)
+
+    first.add_embeddings([_vec(0.0, 1.0)], [2])
+    second.remove_ids([1])
+
+    assert sorted(FAISSStore(dimension=DIM, index_path=index_path).stored_ids().tolist()) == [2]
+    assert sorted(second.stored_ids().tolist()) == [2]
+
+def test_deferred_page_does_not_overwrite_another_workers_save(index_path, monkeypatch):
+    monkeypatch.setattr(settings, "VECTOR_COMPACTION_THRESHOLD", float("inf"))
+    indexer = FAISSStore(dimension=DIM, index_path=index_path)
+    indexer.add_embeddings([_vec(1.0)], [1])
+    deleter = FAISSStore(dimension=DIM, index_path=index_path)
+
+    with indexer.deferred_writes():
+        indexer.add_embeddings([_vec(0.0, 1.0)], [2])
+        deleter.remove_ids([1])
+        # The indexer sees the deletion before its own page is written
+        assert indexer.search(_vec(1.0), top_k=2)[0][0] == 2
+        indexer.add_embeddings([_vec(0.0, 0.0, 1.0)], [3])
+
+    reloaded = FAISSStore(dimension=DIM, index_path=index_path)
+    assert sorted(reloaded.stored_ids().tolist()) == [2, 3]
+    assert reloaded.dead_fraction > 0
+
+def test_train_index_keeps_chunk_ids(index_path, monkeypatch):
+    monkeypatch.setattr(settings, "VECTOR_IVF_NLIST", 4)
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(200, DIM)).astype('float32')
+    store = FAISSStore(dimension=DIM, index_path=index_path, index_type="ivf_flat")
+    store.add_embeddings(vectors, list(range(1000, 1200)))
+
+    store.train_index()
+    reloaded = FAISSStore(dimension=DIM, index_path=index_path, index_type="ivf_flat")
+    assert reloaded.ntotal == 200
+    assert reloaded.search(vectors[42], top_k=1, nprobe=4)[0][0] == 1042
+
+def test_searches_and_additions_continue_while_the_index_trains(index_path, monkeypatch):
+    monkeypatch.setattr(settings, "VECTOR_IVF_NLIST", 4)
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(200, DIM)).astype('float32')
+    store = FAISSStore(dimension=DIM, index_path=index_path, index_type="ivf_flat")
+    store.add_embeddings(vectors, list(range(200)))
+
+    training, release = threading.Event(), threading.Event()
+    build = store._build_trained_index
+
+    def slow_build(*args):
+        training.set()
+        release.wait(5)
+        return build(*args)
+
+    monkeypatch.setattr(store, "_build_trained_index", slow_build)
+    trainer = threading.Thread(target=store.train_index)
+    trainer.start()
+    assert training.wait(5)
+    assert store.search(vectors[3], top_k=1)[0][0] == 3
+    store.add_embeddings([_vec(0.0, 0.0, 1.0)], [900])
+    release.set()
+    trainer.join(5)
+
+    assert store._index_kind() == "ivf"
+    assert store.ntotal == 201
+    assert store.search(_vec(0.0, 0.0, 1.0), top_k=1, nprobe=4)[0][0] == 900
+
+@pytest.mark.parametrize("index_type", ["ivf_flat", "hnsw"])
+def test_filtered_search_finds_a_small_subset(index_path, index_type, monkeypatch):
+    monkeypatch.setattr(settings, "VECTOR_IVF_NLIST", 64)
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(5000, DIM)).astype('float32')
+    store = FAISSStore(dimension=DIM, index_path=index_path, index_type=index_type, nprobe=1, ef_search=16)
+    store.add_embeddings(vectors, list(range(5000)))
+    if index_type == "ivf_flat":
+        store.train_index()
+    subset = rng.choice(5000, 20, replace=False).tolist()
+    queries = rng.normal(size=(50, DIM)).astype('float32')
+
+    ids, _ = store.search_batch(queries, top_k=5, allowed_ids=subset)
+    assert (ids != -1).all()
+    assert set(ids.ravel().tolist()) <= set(subset)
+
+    # Above the exact-scoring cap the search is widened instead
+    monkeypatch.setattr(settings, "VECTOR_EXACT_FILTER_MAX_IDS", 10)
+    ids, _ = store.search_batch(queries, top_k=5, allowed_ids=subset)
+    assert (ids != -1).mean() > 0.9
+
+def test_compaction_never_copies_the_stored_vectors(index_path, monkeypatch):
+    monkeypatch.setattr(settings, "VECTOR_IVF_NLIST", 4)
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(200, DIM)).astype('float32')
+    store = FAISSStore(dimension=DIM, index_path=index_path, index_type="ivf_flat")
+    store.add_embeddings(vectors, list(range(200)))
+    store.train_index()
+    store.remove_ids(list(range(10)))
+
+    cloned = []
+    clone = vector_store.faiss.clone_index
+    monkeypatch.setattr(vector_store.faiss, "clone_index", lambda index: cloned.append(index.ntotal) or clone(index))
+    assert store.compact()
+    assert cloned and set(cloned) == {0}
+    assert store.ntotal == 190
+    assert store.search(vectors[42], top_k=1, nprobe=4)[0][0] == 42
+
+def test_training_runs_in_the_background(index_path, monkeypatch):
+    monkeypatch.setattr(settings, "VECTOR_IVF_NLIST", 4)
+    store = FAISSStore(dimension=DIM, index_path=index_path, index_type="ivf_flat")
+    monkeypatch.setattr(index_training, "get_vector_store", lambda: store)
+
+    assert IndexTrainingService.start()["status"] == "running"
+    IndexTrainingService._thread.join(5)
+    state = IndexTrainingService.get()
+    assert state["status"] == "failed" and "at least 4 vectors" in state["error"]
+
+    store.add_embeddings(np.random.default_rng(0).normal(size=(50, DIM)).astype('float32'), list(range(50)))
+    IndexTrainingService.start()
+    IndexTrainingService._thread.join(5)
+    assert IndexTrainingService.get()["status"] == "completed"
+    assert IndexTrainingService.get()["vectors"] == 50
+
+def test_train_index_requires_enough_vectors(index_path, monkeypatch):
+    monkeypatch.setattr(settings, "VECTOR_IVF_NLIST", 64)
+    store = FAISSStore(dimension=DIM, index_path=index_path, index_type="ivf_flat")
+    store.add_embeddings([_vec(1.0)], [1])
+
+    with pytest.raises(ValueError):
+        store.train_index()
+
+def test_write_behind_defers_save_until_flush(index_path):
+    store = FAISSStore(dimension=DIM, index_path=index_path, write_behind=True)
+    store.add_embeddings([_vec(1.0)], [5])
+    assert FAISSStore(dimension=DIM, index_path=index_path).ntotal == 0
+
+    store.flush()
+    assert FAISSStore(dimension=DIM, index_path=index_path).ntotal == 1
+
+def test_deferred_writes_saves_once_at_end(index_path):
+    store = FAISSStore(dimension=DIM, index_path=index_path)
+    with store.deferred_writes():
+        store.add_embeddings([_vec(1.0)], [1])
+        store.add_embeddings([_vec(0.0, 1.0)], [2])
+        assert FAISSStore(dimension=DIM, index_path=index_path).ntotal == 0
+    assert FAISSStore(dimension=DIM, index_path=index_path).ntotal == 2
+
+def test_search_batch_returns_id_and_distance_matrices(index_path):
+    store = FAISSStore(dimension=DIM, index_path=index_path)
+    store.add_embeddings([_vec(1.0), _vec(0.0, 1.0), _vec(0.0, 0.0, 1.0)], [1, 2, 3])
+
+    queries = np.array([_vec(0.0, 0.0, 1.0), _vec(1.0, 0.1)], dtype='float32')
+    ids, distances = store.search_batch(queries, top_k=2)
+    assert ids.shape == distances.shape == (2, 2)
+    assert ids[:, 0].tolist() == [3, 1]
+    # The caller's matrix is not normalized in place
+    assert queries[1, 1] == pytest.approx(0.1)
+
+def test_removed_ids_are_excluded_and_persisted(index_path, monkeypatch):
+    monkeypatch.setattr(settings, "VECTOR_COMPACTION_THRESHOLD", 1.0)
+    store = FAISSStore(dimension=DIM, index_path=index_path)
+    store.add_embeddings([_vec(1.0), _vec(0.9, 0.1), _vec(0.0, 1.0)], [1, 2, 3])
+
+    assert store.remove_ids([1, 99]) == 1
+    assert [chunk_id for chunk_id, _ in store.search(_vec(1.0), top_k=2)] == [2, 3]
+    reloaded = FAISSStore(dimension=DIM, index_path=index_path)
+    assert [chunk_id for chunk_id, _ in reloaded.search(_vec(1.0), top_k=2)] == [2, 3]
+
+def test_compaction_drops_dead_vectors(index_path, monkeypatch):
+    monkeypatch.setattr(settings, "VECTOR_COMPACTION_THRESHOLD", 1.0)
+    store = FAISSStore(dimension=DIM, index_path=index_path)
+    store.add_embeddings([_vec(1.0), _vec(0.0, 1.0)], [1, 2])
+    store.remove_ids([1])
+    assert store.dead_fraction == 0.5
+
+    assert store.compact()
+    assert store.ntotal == 1
+    assert store.dead_fraction == 0.0
+
+def test_upsert_replaces_existing_vector(index_path):
+    store = FAISSStore(dimension=DIM, index_path=index_path)
+    store.add_embeddings([_vec(1.0), _vec(0.0, 1.0)], [1, 2])
+    store.upsert_embeddings([_vec(0.0, 0.0, 1.0)], [1])
+
+    assert store.ntotal == 2
+    assert store.search(_vec(0.0, 0.0, 1.0), top_k=1)[0][0] == 1
+
+def test_search_restricted_to_allowed_ids(index_path):
+    store = FAISSStore(dimension=DIM, index_path=index_path)
+    store.add_embeddings([_vec(1.0), _vec(0.9, 0.1), _vec(0.0, 1.0)], [1, 2, 3])
+
+    assert [chunk_id for chunk_id, _ in store.search(_vec(1.0), top_k=3, allowed_ids=[2, 3])] == [2, 3]
+    assert store.search(_vec(1.0), top_k=3, allowed_ids=[]) == []
+
+def test_sharded_store_merges_results_across_shards(index_path):
+    store = ShardedFAISSStore(3, dimension=DIM, index_path=index_path)
+    store.add_embeddings([_vec(1.0)], [1], shard_key=10)
+    store.add_embeddings([_vec(0.9, 0.1)], [2], shard_key=11)
+    store.add_embeddings([_vec(0.0, 1.0)], [3], shard_key="biology")
+
+    assert store.ntotal == 3
+    assert sorted(shard.ntotal for shard in store.shards) == [1, 1, 1]
+    assert [chunk_id for chunk_id, _ in store.search(_vec(1.0), top_k=3)] == [1, 2, 3]
+    assert [chunk_id for chunk_id, _ in store.search(_vec(1.0), top_k=3, shard_key=11)] == [2]
+
+    assert store.remove_ids([1]) == 1
+    assert store.search(_vec(1.0), top_k=1)[0][0] == 2
+
+def test_sharded_train_index_is_all_or_nothing(index_path, monkeypatch):
+    monkeypatch.setattr(settings, "VECTOR_IVF_NLIST", 4)
+    rng = np.random.default_rng(0)
+    store = ShardedFAISSStore(2, dimension=DIM, index_path=index_path, index_type="ivf_flat")
+    store.add_embeddings(rng.normal(size=(200, DIM)).astype('float32'), list(range(200)), shard_key=0)
+    store.add_embeddings([_vec(1.0)], [500], shard_key=1)  # too few vectors to train
+
+    with pytest.raises(ValueError):
+        store.train_index()
+    assert [shard._index_kind() for shard in store.shards] == ["flat", "flat"]
+    assert store.ntotal == 201
+    assert store.search(_vec(1.0), top_k=1)[0][0] == 500
+
+def test_mmap_store_serves_writer_updates_read_only(index_path, monkeypatch):
+    monkeypatch.setattr(settings, "VECTOR_IVF_NLIST", 4)
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(200, DIM)).astype('float32')
+    writer = FAISSStore(dimension=DIM, index_path=index_path, index_type="ivf_flat")
+    writer.add_embeddings(vectors, list(range(200)))
+    writer.train_index()
+
+    reader = FAISSStore(dimension=DIM, index_path=index_path, index_type="ivf_flat", mmap=True)
+    assert reader.search(vectors[7], top_k=1, nprobe=4)[0][0] == 7
+    with pytest.raises(RuntimeError):
+        reader.add_embeddings([vectors[0]], [999])
+
+    writer.add_embeddings([vectors[0] * -1], [500])
+    assert reader.search(vectors[0] * -1, top_k=1, nprobe=4)[0][0] == 500
+
+@pytest.mark.parametrize("index_type", ["sq8", "sq_fp16"])
+def test_scalar_quantized_index_types(index_path, index_type, monkeypatch):
+    monkeypatch.setattr(settings, "VECTOR_SQ_MIN_TRAINING_VECTORS", 100)
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(200, DIM)).astype('float32')
+    store = FAISSStore(dimension=DIM, index_path=index_path, index_type=index_type)
+    store.add_embeddings(vectors, list(range(200)))
+    if index_type == "sq8":
+        store.train_index()
+
+    assert store.index_type == index_type
+    assert store.search(vectors[42], top_k=1)[0][0] == 42
@@ -0,0 +1,103 @@
+import sys
+import os
+import time
+import argparse
+import tempfile
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from backend.app.core.config import get_settings
+from backend.app.rag.vector_store import FAISSStore
+
+settings = get_settings()
+
+# Query-time knobs swept for each index type
+SWEEPS = {
+    "flat": [None],
+    "ivf_flat": [1, 4, 16, 64],
+    "ivf_pq": [1, 4, 16, 64],
+    "hnsw": [16, 32, 64, 128],
+    "sq8": [None],
+    "sq_fp16": [None],
+    "ivf_sq8": [4, 16, 64],
+}
+
+def make_dataset(num_vectors: int, num_queries: int, dimension: int, seed: int = 0):
+    """Clustered synthetic embeddings: closer to real text embeddings than uniform noise."""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(max(num_vectors // 100, 1), dimension))
+    base = centers[rng.integers(len(centers), size=num_vectors)] + 0.3 * rng.normal(size=(num_vectors, dimension))
+    queries = base[rng.integers(num_vectors, size=num_queries)] + 0.1 * rng.normal(size=(num_queries, dimension))
+    return base.astype('float32'), queries.astype('float32')
+
+def load_dataset(index_path: str, num_queries: int, dimension: int, seed: int = 0):
+    """Use the vectors of an existing index, with perturbed copies of them as queries."""
+    store = FAISSStore(dimension=dimension, index_path=index_path, index_type="flat")
+    base, _ = store._export_vectors()
+    rng = np.random.default_rng(seed)
+    queries = base[rng.integers(len(base), size=num_queries)] + 0.05 * rng.normal(size=(num_queries, dimension))
+    return base, queries.astype('float32')
+
+def build_store(index_type: str, base: np.ndarray, workdir: str) -> FAISSStore:
+    store = FAISSStore(dimension=base.shape[1], index_path=os.path.join(workdir, f"{index_type}.bin"), index_type="flat")
+    store.add_embeddings(base, list(range(len(base))))
+    if index_type != "flat":
+        start = time.perf_counter()
+        store.train_index(index_type)
+        print(f"  trained {index_type} in {time.perf_counter() - start:.1f}s")
+    return store
+
+def run_queries(store: FAISSStore, queries: np.ndarray, top_k: int, knob):
+    kwargs = {}
+    if store.index_type.startswith("ivf"):
+        kwargs["nprobe"] = knob
+    elif store.index_type == "hnsw":
+        kwargs["ef_search"] = knob
+
+    latencies, results = [], []
+    for query in queries:
+        start = time.perf_counter()
+        hits = store.search(query, top_k=top_k, **kwargs)
+        latencies.append((time.perf_counter() - start) * 1000)
+        results.append({chunk_id for chunk_id, _ in hits})
+    return results, np.array(latencies)
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall vs. latency report for the FAISS index types.")
+    parser.add_argument("--vectors", type=int, default=50000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--top-k", type=int, default=settings.TOP_K_RETRIEVAL)
+    parser.add_argument("--nlist", type=int, default=256, help="IVF lists (overrides VECTOR_IVF_NLIST)")
+    parser.add_argument("--from-index", help="Benchmark the vectors of an existing index file instead of synthetic data")
+    parser.add_argument("--types", nargs="+", default=list(SWEEPS))
+    args = parser.parse_args()
+
+    settings.VECTOR_IVF_NLIST = args.nlist
+    dimension = settings.EMBEDDING_DIMENSION
+    if args.from_index:
+        base, queries = load_dataset(args.from_index, args.queries, dimension)
+    else:
+        base, queries = make_dataset(args.vectors, args.queries, dimension)
+    print(f"Dataset: {len(base)} vectors x {dimension} dims, {len(queries)} queries, top_k={args.top_k}")
+
+    with tempfile.TemporaryDirectory() as workdir:
+        truth = None
+        rows = []
+        for index_type in ["flat"] + [t for t in args.types if t != "flat"]:
+            store = build_store(index_type, base, workdir)
+            size_mb = os.path.getsize(store.index_path) / (1024 * 1024)
+            for knob in SWEEPS[index_type]:
+                results, latencies = run_queries(store, queries, args.top_k, knob)
+                if truth is None:
+                    truth = results
+                recall = np.mean([len(r & t) / max(len(t), 1) for r, t in zip(results, truth)])
+                rows.append((index_type, knob, recall, np.percentile(latencies, 50), np.percentile(latencies, 99), size_mb))
+
+    print(f"\n{'index':<10} {'knob':>6} {'recall@k':>9} {'p50 ms':>8} {'p99 ms':>8} {'size MB':>8}")
+    for index_type, knob, recall, p50, p99, size_mb in rows:
+        knob_str = "-" if knob is None else str(knob)
+        print(f"{index_type:<10} {knob_str:>6} {recall:>9.3f} {p50:>8.3f} {p99:>8.3f} {size_mb:>8.1f}")
+    print("\nknob = nprobe for IVF types, efSearch for HNSW.")
+
+if __name__ == "__main__":
+    main()
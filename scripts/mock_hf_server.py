@@ -0,0 +1,166 @@
+import sys
+import os
+import json
+import random
+import asyncio
+import hashlib
+import argparse
+from dataclasses import dataclass
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from backend.app.core.config import get_settings
+
+settings = get_settings()
+
+WORDS = (
+    "the cell membrane controls what enters and leaves energy is stored in chemical bonds "
+    "photosynthesis converts light into glucose while respiration releases it for work"
+).split()
+
+@dataclass
+class MockConfig:
+    latency_ms: float = 200.0
+    latency_spread_ms: float = 50.0
+    latency_dist: str = "normal"  # fixed, uniform, normal, lognormal
+    tokens_per_second: float = 40.0
+    output_tokens: int = 64
+    error_rate: float = 0.0
+    dimension: int = settings.EMBEDDING_DIMENSION
+    seed: int = 0
+
+def _seed(*parts) -> int:
+    return int.from_bytes(hashlib.sha256("\x00".join(map(str, parts)).encode("utf-8")).digest()[:8], "little")
+
+def embed(text: str, dimension: int, seed: int = 0) -> list:
+    """Deterministic unit vector per text, so repeated runs index and retrieve identically."""
+    rng = np.random.default_rng(_seed(seed, text))
+    vector = rng.normal(size=dimension)
+    return (vector / np.linalg.norm(vector)).astype('float32').tolist()
+
+def generate_text(prompt: str, max_new_tokens: int, config: MockConfig) -> list:
+    """
+    Deterministic tokens for a prompt. Prompts asking for the JSON formats used by the generation
+    services get a matching JSON document, so quiz/flashcard/plan/insight endpoints succeed end to end.
+    """
+    rng = random.Random(_seed(config.seed, prompt))
+    sentence = lambda n: " ".join(rng.choice(WORDS) for _ in range(n)).capitalize()
+    if "'correct_answer'" in prompt:
+        options = [sentence(3) for _ in range(4)]
+        text = json.dumps([{"question": sentence(8) + "?", "options": options, "correct_answer": options[0], "explanation": sentence(10)}])
+    elif "'front'" in prompt:
+        text = json.dumps([{"front": sentence(3), "back": sentence(12)}])
+    elif "'day_number'" in prompt:
+        text = json.dumps([{"day_number": 1, "topic": sentence(3), "description": sentence(10)}])
+    elif "'strong_concepts'" in prompt:
+        text = json.dumps({"strong_concepts": sentence(4), "weak_concepts": sentence(4), "recommendations": sentence(12)})
+    else:
+        return [" " + rng.choice(WORDS) for _ in range(min(max_new_tokens, config.output_tokens))]
+    # Split JSON answers into token-sized pieces for streaming
+    return [text[i:i + 4] for i in range(0, len(text), 4)]
+
+def create_app(config: MockConfig) -> FastAPI:
+    """
+    Stand-in for the Hugging Face Inference API: the same URLs and request/response shapes as
+    api-inference.huggingface.co, with configurable latency, token rate and error rate.
+    """
+    app = FastAPI(title="Mock Hugging Face Inference API")
+    rng = random.Random(config.seed)
+
+    def latency() -> float:
+        mean, spread = config.latency_ms, config.latency_spread_ms
+        if config.latency_dist == "fixed":
+            ms = mean
+        elif config.latency_dist == "uniform":
+            ms = rng.uniform(mean - spread, mean + spread)
+        elif config.latency_dist == "lognormal":
+            sigma = (spread / mean) if mean else 0.0
+            ms = mean * rng.lognormvariate(0, sigma)
+        else:
+            ms = rng.gauss(mean, spread)
+        return max(ms, 0.0) / 1000
+
+    def failure():
+        if rng.random() < config.error_rate:
+            return JSONResponse(status_code=503, content={"error": "Model is currently loading", "estimated_time": 20.0})
+        return None
+
+    @app.post("/pipeline/feature-extraction/{model:path}")
+    async def feature_extraction(model: str, request: Request):
+        body = await request.json()
+        await asyncio.sleep(latency())
+        error = failure()
+        if error:
+            return error
+        inputs = body.get("inputs")
+        if isinstance(inputs, str):
+            return embed(inputs, config.dimension, config.seed)
+        return [embed(text, config.dimension, config.seed) for text in inputs]
+
+    @app.post("/models/{model:path}")
+    async def inference(model: str, request: Request):
+        body = await request.json()
+        prompt = body.get("inputs", "")
+        parameters = body.get("parameters")
+        # Time to first token
+        await asyncio.sleep(latency())
+        error = failure()
+        if error:
+            return error
+
+        if parameters is None:
+            # Summarization requests carry no generation parameters
+            tokens = generate_text(prompt, config.output_tokens, config)
+            await asyncio.sleep(len(tokens) / config.tokens_per_second)
+            return [{"summary_text": "".join(tokens).strip()}]
+
+        tokens = generate_text(prompt, parameters.get("max_new_tokens", config.output_tokens), config)
+        if not body.get("stream"):
+            await asyncio.sleep(len(tokens) / config.tokens_per_second)
+            return [{"generated_text": "".join(tokens)}]
+
+        async def events():
+            for i, token in enumerate(tokens):
+                await asyncio.sleep(1 / config.tokens_per_second)
+                yield "data:" + json.dumps({"token": {"id": i, "text": token, "special": False}, "generated_text": None}) + "\n\n"
+            final = {"token": {"id": len(tokens), "text": "</s>", "special": True}, "generated_text": "".join(tokens)}
+            yield "data:" + json.dumps(final) + "\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return app
+
+def main():
+    """
+    Serve the mock API, then point the backend at it with HF_API_BASE_URL=http://127.0.0.1:8001.
+    """
+    parser = argparse.ArgumentParser(description="Local stand-in for the Hugging Face Inference API (offline load testing).")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency-ms", type=float, default=200.0, help="Mean time to first token / to respond")
+    parser.add_argument("--latency-spread-ms", type=float, default=50.0, help="Std-dev (normal), half-width (uniform) or scale (lognormal)")
+    parser.add_argument("--latency-dist", choices=["fixed", "uniform", "normal", "lognormal"], default="normal")
+    parser.add_argument("--tokens-per-second", type=float, default=40.0)
+    parser.add_argument("--output-tokens", type=int, default=64, help="Tokens per free-text generation (capped by max_new_tokens)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 503")
+    parser.add_argument("--dimension", type=int, default=settings.EMBEDDING_DIMENSION)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    config = MockConfig(
+        latency_ms=args.latency_ms,
+        latency_spread_ms=args.latency_spread_ms,
+        latency_dist=args.latency_dist,
+        tokens_per_second=args.tokens_per_second,
+        output_tokens=args.output_tokens,
+        error_rate=args.error_rate,
+        dimension=args.dimension,
+        seed=args.seed
+    )
+    uvicorn.run(create_app(config), host=args.host, port=args.port)
+
+if __name__ == "__main__":
+    main()
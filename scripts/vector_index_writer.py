@@ -0,0 +1,63 @@
+import sys
+import os
+import argparse
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.app.core.config import get_settings
+from backend.app.database.session import SessionLocal
+from backend.app.rag.indexing_job import IndexingJobService
+from backend.app.rag.pipeline import RAGPipeline
+
+settings = get_settings()
+
+def main():
+    """
+    Single writer for the vector index. API workers can serve the index memory-mapped and read-only
+    (VECTOR_INDEX_MMAP=true); this process owns the index file and they hot-reload its changes.
+    """
+    parser = argparse.ArgumentParser(description="Write operations on the shared FAISS index.")
+    parser.add_argument(
+        "command",
+        choices=["index-all", "reindex", "sweep-orphans", "restore-vectors", "compact", "train"],
+        help="index-all: index unindexed documents (resumable, see INDEX_JOB_WORKERS); reindex: replace one document's vectors; "
+             "sweep-orphans: drop vectors of deleted chunks; restore-vectors: re-embed chunks missing from the index; compact: purge tombstoned vectors; "
+             "train: rebuild as the configured VECTOR_INDEX_TYPE"
+    )
+    parser.add_argument("--document-id", type=int, help="Document to re-index (for 'reindex')")
+    args = parser.parse_args()
+
+    # This process is the writer, whatever the serving workers are configured with.
+    settings.VECTOR_INDEX_MMAP = False
+
+    db = SessionLocal()
+    try:
+        pipeline = RAGPipeline(db)
+        if args.command == "index-all":
+            job = IndexingJobService.create_or_resume(db)
+            if job.worker_id != IndexingJobService.worker_id():
+                print(f"Indexing job {job.id} is already being run by worker {job.worker_id}.")
+                return
+            IndexingJobService.run(job.id)
+            db.refresh(job)
+            print(f"Indexing job {job.id} {job.status}: {job.indexed_documents} indexed, {job.failed_documents} failed.")
+        elif args.command == "reindex":
+            if args.document_id is None:
+                parser.error("reindex needs --document-id")
+            pipeline.reindex_document(args.document_id)
+        elif args.command == "sweep-orphans":
+            removed = pipeline.remove_orphaned_vectors()
+            print(f"Removed {removed} orphaned vectors.")
+        elif args.command == "restore-vectors":
+            restored = pipeline.restore_missing_vectors()
+            print(f"Restored {restored} vectors.")
+        elif args.command == "compact":
+            pipeline.vector_store.compact()
+        elif args.command == "train":
+            pipeline.vector_store.train_index()
+        pipeline.vector_store.flush()
+        print(f"Done. Index holds {pipeline.vector_store.ntotal} vectors.")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()